@@ -0,0 +1,470 @@
+import argparse
+import asyncio
+import base64
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.client import HTTPConnection
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+BENCH_USER = ('bench', 'bench')
+AUTH = {
+    'Authorization': 'Basic '
+    + base64.b64encode(':'.join(BENCH_USER).encode('utf-8')).decode('ascii')
+}
+SUMMARY = Dict[str, float]
+RESULTS = Dict[str, Dict[str, SUMMARY]]
+# Absolute p99 limits in ms, checked whatever the baseline says.
+P99_BUDGETS: Dict[str, float] = {
+    'get_user_ratings': 50.0,
+    'get_user_ratings_deep': 50.0,
+}
+
+
+class Catalog(NamedTuple):
+    movies: int
+    users: int
+    ratings: int
+    # Extra ratings by the bench user, one per movie from the first.
+    heavy_user_ratings: int = 0
+
+
+class Scenario(NamedTuple):
+    name: str
+    method: str
+    path: Callable[[random.Random, int], str]
+    body: Optional[Callable[[random.Random, int], Any]] = None
+    weight: float = 1.0
+    setup: Optional[Callable[[], None]] = None
+
+
+def percentile(values: List[float], q: float) -> float:
+    ordered: List[float] = sorted(values)
+    index: int = max(0, min(len(ordered) - 1, int(round(q * len(ordered))) - 1))
+    return ordered[index]
+
+
+def summarize(latencies: List[float], elapsed: float) -> SUMMARY:
+    return {
+        'requests': len(latencies),
+        'p50': round(percentile(latencies, 0.50) * 1000, 3),
+        'p95': round(percentile(latencies, 0.95) * 1000, 3),
+        'p99': round(percentile(latencies, 0.99) * 1000, 3),
+        'rps': round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+    }
+
+
+def compare(
+    results: RESULTS, baseline: RESULTS, tolerance: float, min_delta: float = 1.0
+) -> List[str]:
+    # min_delta (ms) keeps sub-millisecond jitter from failing the gate.
+    regressions: List[str] = []
+    for mode, scenarios in results.items():
+        for name, summary in scenarios.items():
+            base: Optional[SUMMARY] = baseline.get(mode, {}).get(name)
+            if base is None:
+                regressions.append(f'{mode} {name}: missing from the baseline')
+                continue
+            slower: float = summary['p95'] - base['p95']
+            if slower > base['p95'] * tolerance and slower > min_delta:
+                regressions.append(
+                    f'{mode} {name}: p95 {summary["p95"]}ms > {base["p95"]}ms'
+                )
+            if summary['rps'] < base['rps'] * (1 - tolerance):
+                regressions.append(
+                    f'{mode} {name}: {summary["rps"]} req/s < {base["rps"]} req/s'
+                )
+            if summary.get('errors', 0) > base.get('errors', 0):
+                regressions.append(f'{mode} {name}: {summary["errors"]} errors')
+    return regressions
+
+
+def over_budget(results: RESULTS, budgets: Dict[str, float]) -> List[str]:
+    return [
+        f'{mode} {name}: p99 {summary["p99"]}ms > {budgets[name]}ms budget'
+        for mode, scenarios in results.items()
+        for name, summary in scenarios.items()
+        if name in budgets and summary['p99'] > budgets[name]
+    ]
+
+
+def seed(catalog: Catalog, rnd: random.Random) -> None:
+    # Imported late: MOVIES_DATABASE_URL must be set before movies is loaded.
+    from movies.database import create_session, init_db
+    from movies.models import Movie, MovieRating, User
+    from movies.search import rebuild_search_index
+    from movies.stats import rebuild_movie_stats
+    from passlib.apps import custom_app_context as pwd_context
+
+    init_db()
+    password_hash: str = pwd_context.hash(BENCH_USER[1])
+    with create_session() as session:
+        session.execute(
+            User.__table__.insert(),
+            [{'username': BENCH_USER[0], 'password_hash': password_hash}]
+            + [
+                {'username': f'user_{i}', 'password_hash': password_hash}
+                for i in range(1, catalog.users)
+            ],
+        )
+        session.execute(
+            Movie.__table__.insert(),
+            [
+                {
+                    'name': f'movie {i} {rnd.choice(WORDS)}',
+                    'year': rnd.randint(1950, 2020),
+                }
+                for i in range(catalog.movies)
+            ],
+        )
+        pairs = set()
+        while len(pairs) < min(catalog.ratings, catalog.users * catalog.movies):
+            pairs.add((rnd.randint(1, catalog.users), rnd.randint(1, catalog.movies)))
+        pairs.update(
+            (1, movie_id)
+            for movie_id in range(
+                1, min(catalog.heavy_user_ratings, catalog.movies) + 1
+            )
+        )
+        session.execute(
+            MovieRating.__table__.insert(),
+            [
+                {
+                    'user_id': user_id,
+                    'movie_id': movie_id,
+                    'rating': rnd.randint(0, 10),
+                    'review': rnd.choice([None, 'fine', 'great']),
+                }
+                for user_id, movie_id in pairs
+            ],
+        )
+        rebuild_movie_stats(session)
+        rebuild_search_index(session)
+
+
+WORDS = ['matrix', 'river', 'night', 'story', 'return', 'empire', 'garden', 'storm']
+
+
+def scenarios(catalog: Catalog) -> List[Scenario]:
+    from movies.credentials import credential_cache
+    from movies.pagination import encode_cursor
+
+    def movie(rnd: random.Random, i: int) -> int:
+        return rnd.randint(1, catalog.movies)
+
+    return [
+        Scenario(
+            'new_user',
+            'POST',
+            lambda r, i: '/users',
+            lambda r, i: {
+                'username': f'bench_{time.time_ns()}_{i}',
+                'password': 'secret',
+            },
+            0.05,
+        ),
+        Scenario(
+            'get_user', 'GET', lambda r, i: f'/users/{r.randint(1, catalog.users)}'
+        ),
+        Scenario(
+            'get_user_cold_auth',
+            'GET',
+            lambda r, i: '/users/1',
+            weight=0.05,
+            setup=credential_cache.clear,
+        ),
+        Scenario(
+            'add_movie',
+            'POST',
+            lambda r, i: '/movies',
+            lambda r, i: {'name': f'bench {time.time_ns()} {i}', 'year': 2000},
+            0.2,
+        ),
+        Scenario('get_movie', 'GET', lambda r, i: f'/movies/{movie(r, i)}'),
+        Scenario(
+            'list_movies_page',
+            'GET',
+            lambda r, i: f'/movies?page={r.randint(1, 50)}&size=20',
+        ),
+        Scenario('list_movies_cursor', 'GET', lambda r, i: '/movies?size=20&cursor='),
+        Scenario(
+            'search_movie_filter',
+            'GET',
+            lambda r, i: f'/movies?filter={r.choice(WORDS)}&page=1&size=20',
+        ),
+        Scenario(
+            'search_movie_year',
+            'GET',
+            lambda r, i: f'/movies?year={r.randint(1950, 2020)}',
+        ),
+        Scenario(
+            'search_movie_top', 'GET', lambda r, i: f'/movies?top={r.randint(1, 50)}'
+        ),
+        Scenario(
+            'search_movie_top_page',
+            'GET',
+            lambda r, i: f'/movies?top=1&page={r.randint(1, 20)}&size=20',
+        ),
+        Scenario(
+            'rate_movie',
+            'POST',
+            lambda r, i: f'/movies/{movie(r, i)}/ratings',
+            lambda r, i: {'rating': r.randint(0, 10), 'review': 'bench'},
+        ),
+        Scenario(
+            'get_movie_rating', 'GET', lambda r, i: f'/movies/{movie(r, i)}/ratings'
+        ),
+        Scenario(
+            'get_movie_rating_avg',
+            'GET',
+            lambda r, i: f'/movies/{movie(r, i)}/ratings?avg=1',
+        ),
+        Scenario(
+            'get_user_ratings',
+            'GET',
+            lambda r, i: f'/users/{r.randint(1, catalog.users)}/ratings',
+        ),
+        Scenario(
+            'get_user_ratings_deep',
+            'GET',
+            lambda r, i: '/users/1/ratings?size=50&cursor='
+            + encode_cursor(
+                [r.randint(1, catalog.ratings + catalog.heavy_user_ratings)]
+            ),
+        ),
+        Scenario(
+            'get_rating',
+            'GET',
+            lambda r, i: f'/ratings/{r.randint(1, max(catalog.ratings, 1))}',
+        ),
+        Scenario(
+            'add_movies_bulk',
+            'POST',
+            lambda r, i: '/movies/bulk',
+            lambda r, i: [
+                {'name': f'bulk {time.time_ns()} {i} {j}', 'year': 2001}
+                for j in range(100)
+            ],
+            0.05,
+        ),
+        Scenario(
+            'rate_movies_bulk',
+            'POST',
+            lambda r, i: '/ratings/bulk',
+            lambda r, i: [
+                {'movie_id': movie(r, i), 'rating': r.randint(0, 10)}
+                for _ in range(100)
+            ],
+            0.05,
+        ),
+    ]
+
+
+def create_app(config: Dict[str, Any]) -> Any:
+    from movies.api import create_app as create_flask_app
+
+    return create_flask_app(config)
+
+
+class ClientDriver:
+    name = 'client'
+
+    def __init__(self, config: Dict[str, Any]) -> None:
+        self.client = create_app(config).test_client()
+
+    def request(self, method: str, path: str, body: Any) -> int:
+        return self.client.open(
+            path, method=method, json=body, headers=AUTH
+        ).status_code
+
+    def close(self) -> None:
+        pass
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_request(self, *args: Any, **kwargs: Any) -> None:
+        pass
+
+
+class WsgiDriver:
+    name = 'wsgi'
+
+    def __init__(self, config: Dict[str, Any]) -> None:
+        self.server = make_server(
+            '127.0.0.1',
+            0,
+            create_app(config),
+            threaded=True,
+            request_handler=QuietHandler,
+        )
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def request(self, method: str, path: str, body: Any) -> int:
+        connection = HTTPConnection('127.0.0.1', self.server.server_port)
+        headers: Dict[str, str] = dict(AUTH)
+        data: Optional[bytes] = None
+        if body is not None:
+            data = json.dumps(body).encode('utf-8')
+            headers['Content-Type'] = 'application/json'
+        connection.request(method, path, data, headers)
+        response = connection.getresponse()
+        response.read()
+        connection.close()
+        return response.status
+
+    def close(self) -> None:
+        self.server.shutdown()
+
+
+class AsgiDriver:
+    name = 'asgi'
+
+    def __init__(self, config: Dict[str, Any]) -> None:
+        from movies.asgi import create_asgi_app
+
+        self.app = create_asgi_app(config)
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+
+    def request(self, method: str, path: str, body: Any) -> int:
+        from movies.asgi import asgi_request
+
+        headers: Dict[str, str] = dict(AUTH)
+        data: bytes = b''
+        if body is not None:
+            data = json.dumps(body).encode('utf-8')
+            headers['Content-Type'] = 'application/json'
+        request = asgi_request(self.app, method, path, data, headers)
+        return asyncio.run_coroutine_threadsafe(request, self.loop).result()[0]
+
+    def close(self) -> None:
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.app.shutdown()
+
+
+def run_scenario(
+    driver: Any,
+    scenario: Scenario,
+    requests: int,
+    concurrency: int,
+    seed_value: int,
+    warmup: float = 0.1,
+) -> SUMMARY:
+    count: int = max(1, int(requests * scenario.weight))
+
+    def one(i: int) -> Tuple[float, int]:
+        rnd = random.Random(seed_value * 1_000_003 + i)
+        if scenario.setup is not None:
+            scenario.setup()
+        body: Any = scenario.body(rnd, i) if scenario.body else None
+        path: str = scenario.path(rnd, i)
+        started: float = time.perf_counter()
+        status: int = driver.request(scenario.method, path, body)
+        return time.perf_counter() - started, status
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        # Warm-up requests fill connection pools and caches and are not timed.
+        list(executor.map(one, range(-int(count * warmup), 0)))
+        started: float = time.perf_counter()
+        outcomes: List[Tuple[float, int]] = list(executor.map(one, range(count)))
+        elapsed: float = time.perf_counter() - started
+    summary: SUMMARY = summarize([latency for latency, _ in outcomes], elapsed)
+    summary['errors'] = sum(1 for _, status in outcomes if status >= 400)
+    return summary
+
+
+def parse_args(argv: Optional[List[str]]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Benchmark every movies API route.')
+    parser.add_argument('--movies', type=int, default=10000)
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--ratings', type=int, default=50000)
+    parser.add_argument(
+        '--heavy-user-ratings',
+        type=int,
+        default=0,
+        help='Movies also rated by the bench user, for deep /users/1/ratings pages',
+    )
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=1)
+    parser.add_argument('--warmup', type=float, default=0.1, help='Untimed fraction')
+    parser.add_argument(
+        '--mode', choices=['client', 'wsgi', 'asgi', 'all'], default='all'
+    )
+    parser.add_argument('--only', nargs='*', help='Run only these scenarios')
+    parser.add_argument(
+        '--no-cache', action='store_true', help='Disable response cache'
+    )
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--database', help='SQLAlchemy URL, defaults to a temp file')
+    parser.add_argument('--baseline', help='JSON file to compare against')
+    parser.add_argument('--save-baseline', help='Write results to this JSON file')
+    parser.add_argument('--tolerance', type=float, default=0.25)
+    parser.add_argument(
+        '--min-delta', type=float, default=1.0, help='p95 noise floor in ms'
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    workdir = tempfile.TemporaryDirectory()
+    os.environ['MOVIES_DATABASE_URL'] = args.database or (
+        f'sqlite:///{workdir.name}/bench.db'
+    )
+    catalog = Catalog(args.movies, args.users, args.ratings, args.heavy_user_ratings)
+    started: float = time.perf_counter()
+    seed(catalog, random.Random(args.seed))
+    print(f'Seeded {catalog} in {time.perf_counter() - started:.1f}s', file=sys.stderr)
+
+    config: Dict[str, Any] = {'RESPONSE_CACHE': None} if args.no_cache else {}
+    drivers = {
+        'client': [ClientDriver],
+        'wsgi': [WsgiDriver],
+        'asgi': [AsgiDriver],
+    }.get(args.mode, [ClientDriver, WsgiDriver, AsgiDriver])
+    results: RESULTS = {}
+    for driver_class in drivers:
+        driver = driver_class(config)
+        try:
+            for scenario in scenarios(catalog):
+                if args.only and scenario.name not in args.only:
+                    continue
+                summary = run_scenario(
+                    driver,
+                    scenario,
+                    args.requests,
+                    args.concurrency,
+                    args.seed,
+                    args.warmup,
+                )
+                results.setdefault(driver.name, {})[scenario.name] = summary
+                print(f'{driver.name:6} {scenario.name:24} {summary}', file=sys.stderr)
+        finally:
+            driver.close()
+    print(json.dumps(results, indent=2, sort_keys=True))
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as baseline_file:
+            json.dump(results, baseline_file, indent=2, sort_keys=True)
+    regressions: List[str] = over_budget(results, P99_BUDGETS)
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            regressions += compare(
+                results, json.load(baseline_file), args.tolerance, args.min_delta
+            )
+    for regression in regressions:
+        print(f'REGRESSION {regression}', file=sys.stderr)
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
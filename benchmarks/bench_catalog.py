@@ -0,0 +1,138 @@
+import argparse
+import json
+import random
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Optional
+
+from movies.catalog import MovieCatalog
+from movies.database import Base
+from movies.models import Movie
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session, sessionmaker
+
+from .bench_api import SUMMARY, summarize
+
+
+def allocated(build: Callable[[], Any]) -> int:
+    # Bytes still allocated while the built structure is alive.
+    tracemalloc.start()
+    try:
+        before: int = tracemalloc.get_traced_memory()[0]
+        kept: Any = build()
+        size: int = tracemalloc.get_traced_memory()[0] - before
+        del kept
+        return size
+    finally:
+        tracemalloc.stop()
+
+
+def timed(
+    operation: Callable[[int], Any], requests: int, rnd: random.Random
+) -> SUMMARY:
+    latencies: List[float] = []
+    started: float = time.perf_counter()
+    for i in range(requests):
+        argument: int = rnd.randint(0, 1 << 30)
+        request_started: float = time.perf_counter()
+        operation(argument)
+        latencies.append(time.perf_counter() - request_started)
+    return summarize(latencies, time.perf_counter() - started)
+
+
+def parse_args(argv: Optional[List[str]]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description='Compare the movie catalog snapshot with ORM queries.'
+    )
+    parser.add_argument('--movies', type=int, default=100000)
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=0)
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    rnd = random.Random(args.seed)
+    engine = create_engine('sqlite://')
+    Base.metadata.create_all(bind=engine)
+    make_session = sessionmaker(bind=engine)
+    session: Session = make_session()
+    session.execute(
+        Movie.__table__.insert(),
+        [
+            {'name': f'movie {i}', 'year': rnd.randint(1950, 2020)}
+            for i in range(args.movies)
+        ],
+    )
+    session.commit()
+
+    catalog = MovieCatalog(max_age=None)
+    catalog.rebuild(session)
+
+    def orm_get(value: int) -> Any:
+        with_session: Session = make_session()
+        try:
+            return with_session.query(Movie).get(value % args.movies + 1)
+        finally:
+            with_session.close()
+
+    def orm_list(year: Optional[int]) -> List[Dict[str, Any]]:
+        with_session: Session = make_session()
+        try:
+            query = with_session.query(Movie).order_by(Movie.id)
+            if year is not None:
+                query = query.filter(Movie.year == year)
+            return [
+                {'id': movie.id, 'name': movie.name, 'year': movie.year}
+                for movie in query
+            ]
+        finally:
+            with_session.close()
+
+    def build_catalog() -> MovieCatalog:
+        built = MovieCatalog(max_age=None)
+        built.rebuild(session)
+        return built
+
+    def catalog_list(year: Optional[int]) -> List[Dict[str, Any]]:
+        return [
+            {'id': movie.id, 'name': movie.name, 'year': movie.year}
+            for movie in catalog.movies(session, year)
+        ]
+
+    results: Dict[str, Any] = {
+        'memory_bytes': {
+            'orm': allocated(lambda: make_session().query(Movie).all()),
+            'catalog': allocated(build_catalog),
+            'catalog_stats': catalog.stats()['bytes'],
+        },
+        'get': {
+            'orm': timed(orm_get, args.requests, rnd),
+            'catalog': timed(
+                lambda value: catalog.get(session, value % args.movies + 1),
+                args.requests,
+                rnd,
+            ),
+        },
+        'year': {
+            'orm': timed(lambda value: orm_list(1950 + value % 71), args.requests, rnd),
+            'catalog': timed(
+                lambda value: catalog_list(1950 + value % 71), args.requests, rnd
+            ),
+        },
+        'all': {
+            'orm': timed(
+                lambda value: orm_list(None), max(args.requests // 20, 1), rnd
+            ),
+            'catalog': timed(
+                lambda value: catalog_list(None), max(args.requests // 20, 1), rnd
+            ),
+        },
+    }
+    print(json.dumps(results, indent=2, sort_keys=True))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
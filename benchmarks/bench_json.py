@@ -0,0 +1,85 @@
+import argparse
+import json
+import random
+import sys
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from flask import Flask, jsonify
+from movies.catalog import CatalogMovie
+from movies.serialization import JsonWriter
+
+from .bench_api import SUMMARY, summarize
+
+
+def timed(operation: Callable[[], bytes], requests: int) -> SUMMARY:
+    latencies: List[float] = []
+    started: float = time.perf_counter()
+    for _ in range(requests):
+        request_started: float = time.perf_counter()
+        operation()
+        latencies.append(time.perf_counter() - request_started)
+    return summarize(latencies, time.perf_counter() - started)
+
+
+def parse_args(argv: Optional[List[str]]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description='Compare ways of writing large listing responses.'
+    )
+    parser.add_argument('--movies', type=int, default=10000)
+    parser.add_argument('--requests', type=int, default=50)
+    parser.add_argument('--seed', type=int, default=0)
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    rnd = random.Random(args.seed)
+    # Rows as the handlers get them; every variant builds its own items.
+    movies: List[CatalogMovie] = [
+        CatalogMovie(i, f'movie {i}', rnd.randint(1950, 2020))
+        for i in range(1, args.movies + 1)
+    ]
+
+    def items() -> List[Dict[str, Any]]:
+        return [{'id': m.id, 'name': m.name, 'year': m.year} for m in movies]
+
+    app = Flask(__name__)
+    writers: Dict[str, JsonWriter] = {
+        'json': JsonWriter('json', args.movies),
+        'orjson': JsonWriter('auto', args.movies),
+    }
+
+    def with_jsonify() -> bytes:
+        with app.app_context():
+            return jsonify({'Movies': items()}).get_data()
+
+    def with_writer(writer: JsonWriter) -> Callable[[], bytes]:
+        return lambda: writer.dumps({'Movies': items()}) + b'\n'
+
+    def with_fragments(writer: JsonWriter) -> Callable[[], bytes]:
+        def operation() -> bytes:
+            fragment = writer.fragment_encoder('id', 'name', 'year')
+            fragments: List[bytes] = [fragment(m.id, m.name, m.year) for m in movies]
+            return writer.document({}, 'Movies', fragments) + b'\n'
+
+        return operation
+
+    operations: Dict[str, Callable[[], bytes]] = {'jsonify': with_jsonify}
+    for name, writer in writers.items():
+        operations[writer.provider if name == 'orjson' else name] = with_writer(writer)
+        operations[f'{writer.provider}_fragments'] = with_fragments(writer)
+    expected: bytes = with_jsonify()
+    results: Dict[str, Any] = {}
+    for name, operation in operations.items():
+        if operation() != expected:
+            print(f'{name} output differs from jsonify', file=sys.stderr)
+            return 1
+        results[name] = timed(operation, args.requests)
+        print(f'{name:20} {results[name]}', file=sys.stderr)
+    print(json.dumps(results, indent=2, sort_keys=True))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,109 @@
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from movies.similarity import (
+    build_index,
+    load_similar_movies,
+    refresh_index,
+    save_index,
+)
+
+from .bench_api import summarize
+
+
+def synthetic_ratings(
+    ratings: int, users: int, movies: int, rng: np.random.Generator
+) -> np.ndarray:
+    # Popular movies get most of the ratings, like real catalogs.
+    user_ids: np.ndarray = rng.integers(1, users + 1, ratings)
+    movie_ids: np.ndarray = (movies * rng.random(ratings) ** 2).astype(np.int64) + 1
+    pairs: np.ndarray = np.unique(np.stack([user_ids, movie_ids], 1), axis=0)
+    rng.shuffle(pairs)
+    return np.column_stack(
+        [np.arange(1, len(pairs) + 1), pairs, rng.integers(0, 11, len(pairs))]
+    )
+
+
+def timed(operation: Any) -> float:
+    started: float = time.perf_counter()
+    operation()
+    return round(time.perf_counter() - started, 3)
+
+
+def parse_args(argv: Optional[List[str]]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description='Time building, refreshing and querying the similar movies index.'
+    )
+    parser.add_argument('--ratings', type=int, default=2000000)
+    parser.add_argument('--users', type=int, default=100000)
+    parser.add_argument('--movies', type=int, default=20000)
+    parser.add_argument('--new-users', type=int, default=100, help='For the refresh')
+    parser.add_argument('--k', type=int, default=20)
+    parser.add_argument('--method', default='adjusted_cosine')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--chunk-size', type=int, default=128)
+    parser.add_argument('--requests', type=int, default=10000)
+    parser.add_argument('--seed', type=int, default=0)
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    rng = np.random.default_rng(args.seed)
+    ratings: np.ndarray = synthetic_ratings(args.ratings, args.users, args.movies, rng)
+    print(f'{len(ratings)} ratings', file=sys.stderr)
+    results: Dict[str, Any] = {'ratings': len(ratings), 'build_seconds': {}}
+    built: Dict[int, Any] = {}
+    for workers in sorted({0, args.workers}):
+        results['build_seconds'][f'workers_{workers}'] = timed(
+            lambda: built.__setitem__(
+                workers,
+                build_index(ratings, args.k, args.method, workers, args.chunk_size),
+            )
+        )
+        seconds: float = results['build_seconds'][f'workers_{workers}']
+        print(f'build workers={workers} {seconds}s', file=sys.stderr)
+    index = built[0]
+
+    new_users: np.ndarray = args.users + 1 + np.arange(args.new_users)
+    new: np.ndarray = synthetic_ratings(
+        20 * args.new_users, args.new_users, args.movies, rng
+    )
+    new[:, 0] += len(ratings)
+    new[:, 1] = new_users[new[:, 1] - 1]
+    both: np.ndarray = np.concatenate([ratings, new])
+    results['refresh_seconds'] = timed(
+        lambda: refresh_index(
+            index, both, len(ratings), args.method, args.workers, args.chunk_size
+        )
+    )
+    print(f'refresh {len(new)} ratings {results["refresh_seconds"]}s', file=sys.stderr)
+
+    workdir = tempfile.TemporaryDirectory()
+    meta: Dict[str, Any] = {'k': args.k, 'method': args.method}
+    save_index(workdir.name, index, meta)
+    results['index_bytes'] = sum(
+        entry.stat().st_size
+        for entry in os.scandir(os.path.join(workdir.name, meta['generation']))
+    )
+    similar = load_similar_movies(workdir.name)
+    latencies: List[float] = []
+    started: float = time.perf_counter()
+    for movie_id in rng.integers(1, args.movies + 1, args.requests).tolist():
+        request_started: float = time.perf_counter()
+        similar.similar(movie_id, 10)
+        latencies.append(time.perf_counter() - request_started)
+    results['query'] = summarize(latencies, time.perf_counter() - started)
+    print(f'query {results["query"]}', file=sys.stderr)
+    print(json.dumps(results, indent=2, sort_keys=True))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,94 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from typing import Dict, List, Optional
+
+from .bench_api import RESULTS, compare, summarize
+
+# Runs in a fresh interpreter so nothing is already imported or connected.
+PROBE = '''
+import json, time
+started = time.perf_counter()
+import movies.api
+imported = time.perf_counter()
+app = movies.api.create_app()
+created = time.perf_counter()
+response = app.test_client().get('/movies?size=20&page=1')
+assert response.status_code == 200, response.status_code
+answered = time.perf_counter()
+print(json.dumps({
+    'import': imported - started,
+    'create_app': created - imported,
+    'first_request': answered - created,
+}))
+'''
+
+
+def probe(environ: Dict[str, str]) -> Dict[str, float]:
+    output: str = subprocess.run(
+        [sys.executable, '-c', PROBE],
+        env=environ,
+        check=True,
+        stdout=subprocess.PIPE,
+        universal_newlines=True,
+    ).stdout
+    return json.loads(output)
+
+
+def parse_args(argv: Optional[List[str]]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description='Time importing the app, creating it and its first request.'
+    )
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--baseline', help='JSON file to compare against')
+    parser.add_argument('--save-baseline', help='Write results to this JSON file')
+    parser.add_argument('--tolerance', type=float, default=0.25)
+    parser.add_argument(
+        '--min-delta', type=float, default=20.0, help='p95 noise floor in ms'
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    workdir = tempfile.TemporaryDirectory()
+    environ: Dict[str, str] = {
+        **os.environ,
+        'MOVIES_DATABASE_URL': f'sqlite:///{workdir.name}/startup.db',
+    }
+    subprocess.run(
+        [sys.executable, '-c', 'from movies.database import init_db; init_db()'],
+        env=environ,
+        check=True,
+    )
+    timings: Dict[str, List[float]] = {}
+    for _ in range(args.runs):
+        for phase, seconds in probe(environ).items():
+            timings.setdefault(phase, []).append(seconds)
+    results: RESULTS = {
+        'startup': {
+            phase: summarize(values, sum(values)) for phase, values in timings.items()
+        }
+    }
+    for phase, summary in results['startup'].items():
+        print(f'{phase:14} {summary}', file=sys.stderr)
+    print(json.dumps(results, indent=2, sort_keys=True))
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as baseline_file:
+            json.dump(results, baseline_file, indent=2, sort_keys=True)
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            regressions = compare(
+                results, json.load(baseline_file), args.tolerance, args.min_delta
+            )
+        for regression in regressions:
+            print(f'REGRESSION {regression}', file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,270 @@
+import datetime
+import itertools
+import json
+import os
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import Select, func, select
+
+from .catalog import NO_YEAR
+from .models import Movie, MovieRating, User
+
+SCORES = np.arange(11)
+COLUMNS = Dict[str, np.ndarray]
+META_FILE = 'meta.json'
+
+
+def integer_rows(
+    session: Session, statement: Select, chunk_size: int
+) -> Iterator[np.ndarray]:
+    # Rows of integer columns, chunk_size at a time, as a 2-D int64 array.
+    result = session.execute(statement.execution_options(stream_results=True))
+    try:
+        while True:
+            rows: List[tuple] = result.fetchmany(chunk_size)
+            if not rows:
+                return
+            # Flattened first: numpy probes each result row object otherwise.
+            values = itertools.chain.from_iterable(rows)
+            yield np.fromiter(values, np.int64, len(rows) * len(rows[0])).reshape(
+                len(rows), -1
+            )
+    finally:
+        result.close()
+
+
+def _movies(session: Session, chunk_size: int) -> Tuple[np.ndarray, np.ndarray]:
+    statement: Select = select([Movie.id, func.coalesce(Movie.year, NO_YEAR)]).order_by(
+        Movie.id
+    )
+    chunks: List[np.ndarray] = list(integer_rows(session, statement, chunk_size))
+    if not chunks:
+        return np.zeros(0, np.int64), np.zeros(0, np.int64)
+    columns: np.ndarray = np.concatenate(chunks)
+    return columns[:, 0], columns[:, 1]
+
+
+def _rating_counts(
+    session: Session, ids: np.ndarray, chunk_size: int
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    # Ratings are integers 0-10, so a histogram per movie is all that's needed
+    # for the mean and variance. Rows count every rating row, rated or not.
+    histogram: np.ndarray = np.zeros((len(ids), len(SCORES)), np.int64)
+    rows: np.ndarray = np.zeros(len(ids), np.int64)
+    reviews: np.ndarray = np.zeros(len(ids), np.int64)
+    statement: Select = select(
+        [
+            MovieRating.movie_id,
+            func.coalesce(MovieRating.rating, -1),
+            MovieRating.review.isnot(None),
+        ]
+    )
+    for chunk in integer_rows(session, statement, chunk_size):
+        index: np.ndarray = np.searchsorted(ids, chunk[:, 0])
+        # Movies added since they were read are left out.
+        known: np.ndarray = index < len(ids)
+        known[known] = ids[index[known]] == chunk[known, 0]
+        index, rating, review = index[known], chunk[known, 1], chunk[known, 2] != 0
+        rated: np.ndarray = rating >= 0
+        histogram += np.bincount(
+            index[rated] * len(SCORES) + rating[rated], minlength=histogram.size
+        ).reshape(histogram.shape)
+        rows += np.bincount(index, minlength=len(ids))
+        reviews += np.bincount(index[review], minlength=len(ids))
+    return histogram, rows, reviews
+
+
+def summarize(
+    histogram: np.ndarray,
+    rows: np.ndarray,
+    reviews: np.ndarray,
+    prior_mean: float,
+    prior_votes: float,
+) -> COLUMNS:
+    # NaN where there is nothing to average.
+    count: np.ndarray = histogram.sum(axis=1)
+    total: np.ndarray = histogram @ SCORES
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean: np.ndarray = total / count
+        variance: np.ndarray = np.maximum(
+            (histogram @ SCORES ** 2) / count - mean ** 2, 0.0
+        )
+        # Shrinks averages of movies with few votes towards prior_mean.
+        bayesian: np.ndarray = (total + prior_votes * prior_mean) / (
+            count + prior_votes
+        )
+        review_ratio: np.ndarray = reviews / rows
+    return {
+        'histogram': histogram,
+        'rating_count': count,
+        'review_count': reviews,
+        'mean': mean,
+        'variance': variance,
+        'review_ratio': review_ratio,
+        'bayesian_average': bayesian,
+    }
+
+
+def compute_rating_stats(
+    session: Session, chunk_size: int = 50000, prior_votes: Optional[float] = None
+) -> Tuple[COLUMNS, COLUMNS, Dict[str, Any]]:
+    # Per-movie and per-year columns plus what they were computed with.
+    # prior_votes defaults to the mean number of votes of rated movies.
+    ids, years = _movies(session, chunk_size)
+    histogram, rows, reviews = _rating_counts(session, ids, chunk_size)
+    count: np.ndarray = histogram.sum(axis=1)
+    votes: int = int(count.sum())
+    prior_mean: float = float(histogram.sum(axis=0) @ SCORES / votes) if votes else 0.0
+    if prior_votes is None:
+        prior_votes = votes / max(int(np.count_nonzero(count)), 1)
+    movies: COLUMNS = {
+        'movie_id': ids,
+        'year': years,
+        **summarize(histogram, rows, reviews, prior_mean, prior_votes),
+    }
+    dated: np.ndarray = years != NO_YEAR
+    year_values, inverse = np.unique(years[dated], return_inverse=True)
+    year_histogram: np.ndarray = np.zeros((len(year_values), len(SCORES)), np.int64)
+    np.add.at(year_histogram, inverse, histogram[dated])
+    by_year: COLUMNS = {
+        'year': year_values,
+        'movie_count': np.bincount(inverse, minlength=len(year_values)),
+        **summarize(
+            year_histogram,
+            np.bincount(inverse, rows[dated], len(year_values)).astype(np.int64),
+            np.bincount(inverse, reviews[dated], len(year_values)).astype(np.int64),
+            prior_mean,
+            prior_votes,
+        ),
+    }
+    meta: Dict[str, Any] = {
+        'created_at': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        'movies': len(ids),
+        'years': len(year_values),
+        'ratings': int(rows.sum()),
+        'votes': votes,
+        'users': session.query(func.count(User.id)).scalar(),
+        'raters': session.query(
+            func.count(func.distinct(MovieRating.user_id))
+        ).scalar(),
+        'prior_mean': prior_mean,
+        'prior_votes': prior_votes,
+    }
+    return movies, by_year, meta
+
+
+@contextmanager
+def replacing(path: str) -> Iterator[BinaryIO]:
+    # Readers never see a half-written file.
+    temporary: str = f'{path}.{os.getpid()}.tmp'
+    with open(temporary, 'wb') as output:
+        yield output
+    os.replace(temporary, path)
+
+
+def read_meta(directory: str) -> Dict[str, Any]:
+    with open(os.path.join(directory, META_FILE)) as meta_file:
+        return json.load(meta_file)
+
+
+def new_generation(directory: str) -> str:
+    # A fresh directory for one build's files, which nothing reads until
+    # publish() points meta.json at it.
+    generation: str = os.path.join(
+        directory, f'generation-{time.time_ns()}-{os.getpid()}'
+    )
+    os.makedirs(generation)
+    return generation
+
+
+def publish(directory: str, generation: str, meta: Dict[str, Any]) -> None:
+    # Switches loaders to generation with one rename of meta.json. The
+    # generation it replaces is kept for loaders that have just read the old
+    # meta.json; the one before that is removed.
+    previous: Dict[str, Any] = {}
+    if os.path.exists(os.path.join(directory, META_FILE)):
+        previous = read_meta(directory)
+    meta['generation'] = os.path.basename(generation)
+    meta['previous_generation'] = previous.get('generation')
+    with replacing(os.path.join(directory, META_FILE)) as output:
+        output.write(json.dumps(meta, indent=2).encode())
+    stale: Optional[str] = previous.get('previous_generation')
+    if stale and stale != meta['generation']:
+        shutil.rmtree(os.path.join(directory, stale), ignore_errors=True)
+
+
+def generation_path(directory: str, meta: Dict[str, Any]) -> str:
+    return os.path.join(directory, meta['generation'])
+
+
+def _write_parquet(path: str, columns: COLUMNS) -> None:
+    import pyarrow  # pylint: disable=import-outside-toplevel
+    import pyarrow.parquet  # pylint: disable=import-outside-toplevel
+
+    arrays: Dict[str, Any] = {
+        name: pyarrow.FixedSizeListArray.from_arrays(values.ravel(), values.shape[1])
+        if values.ndim == 2
+        else values
+        for name, values in columns.items()
+    }
+    pyarrow.parquet.write_table(pyarrow.table(arrays), path)
+
+
+def export_rating_stats(
+    session: Session,
+    directory: str,
+    chunk_size: int = 50000,
+    prior_votes: Optional[float] = None,
+    parquet: bool = False,
+) -> Dict[str, Any]:
+    # Writes <table>.<column>.npy for movies and years, and optionally
+    # <table>.parquet, into a new generation, then publishes it.
+    movies, by_year, meta = compute_rating_stats(session, chunk_size, prior_votes)
+    generation: str = new_generation(directory)
+    for table, columns in (('movies', movies), ('years', by_year)):
+        for name, values in columns.items():
+            np.save(os.path.join(generation, f'{table}.{name}.npy'), values)
+        if parquet:
+            _write_parquet(os.path.join(generation, f'{table}.parquet'), columns)
+    publish(directory, generation, meta)
+    return meta
+
+
+class RatingStats:
+    # A memory-mapped export; only the pages that are read get loaded.
+    def __init__(self, directory: str) -> None:
+        self.meta: Dict[str, Any] = read_meta(directory)
+        generation: str = generation_path(directory, self.meta)
+        self._ids: np.ndarray = self._column(generation, 'movie_id')
+        self._histograms: np.ndarray = self._column(generation, 'histogram')
+
+    @staticmethod
+    def _column(directory: str, name: str) -> np.ndarray:
+        return np.load(os.path.join(directory, f'movies.{name}.npy'), mmap_mode='r')
+
+    def histogram(self, movie_id: int) -> Optional[List[int]]:
+        position: int = int(np.searchsorted(self._ids, movie_id))
+        if position < len(self._ids) and self._ids[position] == movie_id:
+            return self._histograms[position].tolist()
+        return None
+
+
+_loaded: Dict[str, Tuple[int, RatingStats]] = {}
+_loaded_lock = threading.Lock()
+
+
+def load_rating_stats(directory: str) -> RatingStats:
+    # Reloaded when a new export replaces meta.json.
+    version: int = os.stat(os.path.join(directory, META_FILE)).st_mtime_ns
+    with _loaded_lock:
+        loaded: Optional[Tuple[int, RatingStats]] = _loaded.get(directory)
+        if loaded is None or loaded[0] != version:
+            loaded = (version, RatingStats(directory))
+            _loaded[directory] = loaded
+        return loaded[1]
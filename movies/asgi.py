@@ -0,0 +1,205 @@
+import asyncio
+import io
+import os
+import sys
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+    Tuple,
+)
+
+from .database import dispose_engine
+from .hashing import configure_hasher, password_hasher
+
+SCOPE = Dict[str, Any]
+MESSAGE = Dict[str, Any]
+RECEIVE = Callable[[], Any]
+SEND = Callable[[MESSAGE], Any]
+HEADERS = List[Tuple[bytes, bytes]]
+WSGI_RESULT = Tuple[int, HEADERS, Optional[bytes], Iterator[bytes], Iterable[bytes]]
+
+
+def build_environ(scope: SCOPE, body: bytes) -> Dict[str, Any]:
+    server: Tuple[str, int] = scope.get('server') or ('localhost', 80)
+    client: Optional[Tuple[str, int]] = scope.get('client')
+    environ: Dict[str, Any] = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f'HTTP/{scope.get("http_version", "1.1")}',
+        'REMOTE_ADDR': client[0] if client else '',
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.input_terminated': True,
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope.get('headers', []):
+        key: str = name.decode('latin-1').upper().replace('-', '_')
+        if key == 'CONTENT_LENGTH':
+            continue
+        if key != 'CONTENT_TYPE':
+            key = 'HTTP_' + key
+        value = value.decode('latin-1')
+        environ[key] = f'{environ[key]},{value}' if key in environ else value
+    return environ
+
+
+async def read_body(receive: RECEIVE) -> bytes:
+    chunks: List[bytes] = []
+    while True:
+        message: MESSAGE = await receive()
+        if message['type'] == 'http.disconnect':
+            break
+        chunks.append(message.get('body', b''))
+        if not message.get('more_body'):
+            break
+    return b''.join(chunks)
+
+
+class AsgiApp:
+    # Serves a WSGI app from an event loop. Each request's blocking work
+    # (routing, SQL, hashing waits) runs on a bounded thread pool, and streamed
+    # bodies are pulled from it chunk by chunk, so the loop only does I/O.
+    def __init__(
+        self,
+        wsgi_app: Callable[..., Iterable[bytes]],
+        executor: Executor,
+        on_shutdown: Optional[Callable[[], None]] = None,
+    ) -> None:
+        self.wsgi_app = wsgi_app
+        self.executor = executor
+        self.on_shutdown = on_shutdown
+
+    async def __call__(self, scope: SCOPE, receive: RECEIVE, send: SEND) -> None:
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+        elif scope['type'] == 'http':
+            await self._http(scope, receive, send)
+        else:
+            raise ValueError(f'Unsupported ASGI scope type: {scope["type"]!r}')
+
+    async def _lifespan(self, receive: RECEIVE, send: SEND) -> None:
+        while True:
+            message: MESSAGE = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.shutdown()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    def shutdown(self) -> None:
+        self.executor.shutdown()
+        if self.on_shutdown is not None:
+            self.on_shutdown()
+
+    def _call(self, environ: Dict[str, Any]) -> WSGI_RESULT:
+        response: Dict[str, Any] = {}
+
+        def start_response(status: str, headers: list, exc_info: Any = None) -> None:
+            response['status'] = int(status.split(' ', 1)[0])
+            response['headers'] = [
+                (name.lower().encode('latin-1'), value.encode('latin-1'))
+                for name, value in headers
+            ]
+
+        result: Iterable[bytes] = self.wsgi_app(environ, start_response)
+        iterator: Iterator[bytes] = iter(result)
+        first: Optional[bytes] = next(iterator, None)
+        return response['status'], response['headers'], first, iterator, result
+
+    async def _http(self, scope: SCOPE, receive: RECEIVE, send: SEND) -> None:
+        loop = asyncio.get_running_loop()
+        environ: Dict[str, Any] = build_environ(scope, await read_body(receive))
+        status, headers, chunk, iterator, result = await loop.run_in_executor(
+            self.executor, self._call, environ
+        )
+        try:
+            await send(
+                {'type': 'http.response.start', 'status': status, 'headers': headers}
+            )
+            while chunk is not None:
+                if chunk:
+                    await send(
+                        {'type': 'http.response.body', 'body': chunk, 'more_body': True}
+                    )
+                chunk = await loop.run_in_executor(self.executor, next, iterator, None)
+            await send({'type': 'http.response.body', 'body': b''})
+        finally:
+            close: Optional[Callable[[], None]] = getattr(result, 'close', None)
+            if close is not None:
+                await loop.run_in_executor(self.executor, close)
+
+
+async def asgi_request(
+    app: Callable[..., Any],
+    method: str,
+    path: str,
+    body: bytes = b'',
+    headers: Optional[Dict[str, str]] = None,
+) -> Tuple[int, Dict[str, str], bytes]:
+    # In-process client for tests and benchmarks.
+    path, _, query = path.partition('?')
+    scope: SCOPE = {
+        'type': 'http',
+        'http_version': '1.1',
+        'method': method,
+        'path': path,
+        'query_string': query.encode('latin-1'),
+        'headers': [
+            (name.lower().encode('latin-1'), value.encode('latin-1'))
+            for name, value in (headers or {}).items()
+        ],
+    }
+    messages: List[MESSAGE] = [{'type': 'http.request', 'body': body}]
+    sent: List[MESSAGE] = []
+
+    async def receive() -> MESSAGE:
+        return messages.pop(0) if messages else {'type': 'http.disconnect'}
+
+    async def send(message: MESSAGE) -> None:
+        sent.append(message)
+
+    await app(scope, receive, send)
+    start: MESSAGE = sent[0]
+    return (
+        start['status'],
+        {
+            name.decode('latin-1'): value.decode('latin-1')
+            for name, value in start['headers']
+        },
+        b''.join(message.get('body', b'') for message in sent[1:]),
+    )
+
+
+def create_asgi_app(config: Optional[Mapping[str, Any]] = None) -> AsgiApp:
+    # Serve with e.g. `uvicorn --factory movies.asgi:create_asgi_app`.
+    from .api import create_app  # pylint: disable=import-outside-toplevel
+
+    app = create_app(config)
+    configure_hasher(app.config, app.config['HASH_WORKERS'] or os.cpu_count() or 1)
+    executor = ThreadPoolExecutor(
+        app.config['ASGI_THREADS'], thread_name_prefix='movies-asgi'
+    )
+
+    def shutdown() -> None:
+        app.extensions['movies'].rating_queue.drain()
+        password_hasher.shutdown()
+        dispose_engine()
+
+    return AsgiApp(app, executor, shutdown)
@@ -1,17 +1,63 @@
 from typing import Optional
 
-from flask_httpauth import HTTPBasicAuth
+from flask import g
+from flask_httpauth import HTTPBasicAuth, HTTPTokenAuth, MultiAuth
+from sqlalchemy import event
 
+from .credentials import credential_cache
 from .database import create_session
+from .instrumentation import timed
 from .models import User
+from .state import token_signer
+from .tokens import TokenClaims
 
-auth: HTTPBasicAuth = HTTPBasicAuth()
+basic_auth: HTTPBasicAuth = HTTPBasicAuth()
+token_auth: HTTPTokenAuth = HTTPTokenAuth('Bearer')
+auth: MultiAuth = MultiAuth(basic_auth, token_auth)
 
 
-@auth.verify_password
+def _login(user_id: int, username: str) -> bool:
+    g.user_id = user_id
+    g.username = username
+    return True
+
+
+def current_user_id() -> int:
+    return g.user_id
+
+
+def current_username() -> str:
+    return g.username
+
+
+@basic_auth.verify_password
+@timed('auth')
 def verify_password(username: str, password: str) -> bool:
-    with create_session() as session:
+    user_id: Optional[int] = credential_cache.get(username, password)
+    if user_id is not None:
+        return _login(user_id, username)
+    # Users who just signed up may not have reached a replica yet, and logins
+    # can rehash the stored password.
+    with create_session(readonly=False) as session:
         user: Optional[User] = session.query(User).filter_by(username=username).first()
         if not user or not user.verify_password(password):
             return False
-        return True
+        credential_cache.put(username, password, user.id)
+        return _login(user.id, username)
+
+
+@token_auth.verify_token
+@timed('auth')
+def verify_token(token: str) -> bool:
+    claims: Optional[TokenClaims] = token_signer.verify(token)
+    if claims is None:
+        return False
+    g.token = claims
+    return _login(claims.user_id, claims.username)
+
+
+@event.listens_for(User.password_hash, 'set')
+def invalidate_credentials(
+    target: User, value: str, oldvalue: object, initiator: object
+) -> None:
+    credential_cache.invalidate(target.username)
@@ -0,0 +1,273 @@
+import json
+from itertools import islice
+from typing import (
+    Any,
+    Collection,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+)
+
+from flask import Request
+from sqlalchemy.orm import Session
+
+from .models import Movie, MovieRating, MovieStats, MovieTrigram, User
+from .ratings import insert_empty_ratings, update_ratings
+from .search import trigrams
+from .stats import (
+    RATING_VALUES,
+    STATS_DELTA,
+    apply_stats_deltas,
+    ensure_movie_stats,
+    stats_delta,
+)
+
+NDJSON = 'application/x-ndjson'
+IN_CHUNK_SIZE = 400
+BULK_RESULT = Dict[str, Any]
+MOVIE_KEY = Tuple[str, int]
+RATING_KEY = Tuple[int, int]
+
+
+def iter_items(request: Request) -> Iterator[Any]:
+    if request.mimetype == NDJSON:
+        return _iter_ndjson(request.stream)
+    payload: Any = request.get_json(silent=True)
+    if not isinstance(payload, list):
+        raise ValueError('Expected a JSON array or NDJSON stream')
+    return iter(payload)
+
+
+def _iter_ndjson(stream: Iterable[bytes]) -> Iterator[Any]:
+    for line in stream:
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError:
+            yield None
+
+
+def batched(items: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    iterator: Iterator[Any] = iter(items)
+    batch: List[Any] = list(islice(iterator, size))
+    while batch:
+        yield batch
+        batch = list(islice(iterator, size))
+
+
+def _chunks(values: Collection[Any]) -> Iterator[List[Any]]:
+    return batched(values, IN_CHUNK_SIZE)
+
+
+def _result(index: int, status: str, **fields: Any) -> BULK_RESULT:
+    return {'index': index, 'status': status, **fields}
+
+
+def summarize(results: List[BULK_RESULT], elapsed: float) -> Dict[str, Any]:
+    counts: Dict[str, int] = {}
+    for result in results:
+        counts[result['status']] = counts.get(result['status'], 0) + 1
+    return {
+        'results': results,
+        'counts': counts,
+        'elapsed': round(elapsed, 6),
+        'rows_per_second': round(len(results) / elapsed, 1) if elapsed else None,
+    }
+
+
+def _movie_key(item: Any) -> MOVIE_KEY:
+    if not isinstance(item, dict):
+        raise ValueError('Item must be a JSON object')
+    name: Any = item.get('name')
+    if not isinstance(name, str) or not name:
+        raise ValueError('name is required')
+    try:
+        return name, int(item.get('year'))  # type: ignore
+    except (TypeError, ValueError):
+        raise ValueError('year must be an integer')
+
+
+def _movie_ids(session: Session, keys: Collection[MOVIE_KEY]) -> Dict[MOVIE_KEY, int]:
+    found: Dict[MOVIE_KEY, int] = {}
+    for names in _chunks({name for name, _ in keys}):
+        rows = session.query(Movie.id, Movie.name, Movie.year).filter(
+            Movie.name.in_(names)
+        )
+        found.update(((name, year), id) for id, name, year in rows)
+    return {key: found[key] for key in keys if key in found}
+
+
+def import_movies(session: Session, batch: Sequence[Any], start: int) -> List[Any]:
+    results: List[Any] = [None] * len(batch)
+    pending: Dict[MOVIE_KEY, int] = {}
+    for i, item in enumerate(batch):
+        try:
+            key: MOVIE_KEY = _movie_key(item)
+        except ValueError as error:
+            results[i] = _result(start + i, 'error', error=str(error))
+            continue
+        if key in pending:
+            results[i] = _result(start + i, 'duplicate')
+        else:
+            pending[key] = i
+    existing: Dict[MOVIE_KEY, int] = _movie_ids(session, pending)
+    new: List[MOVIE_KEY] = [key for key in pending if key not in existing]
+    created: Dict[MOVIE_KEY, int] = {}
+    if new:
+        session.execute(
+            Movie.__table__.insert(),
+            [{'name': name, 'year': year} for name, year in new],
+        )
+        created = _movie_ids(session, new)
+        session.execute(
+            MovieStats.__table__.insert(),
+            [{'movie_id': movie_id} for movie_id in created.values()],
+        )
+        trigram_rows: List[Dict[str, Any]] = [
+            {'trigram': trigram, 'movie_id': created[key]}
+            for key in new
+            for trigram in trigrams(key[0])
+        ]
+        if trigram_rows:
+            session.execute(MovieTrigram.__table__.insert(), trigram_rows)
+    for key, i in pending.items():
+        if key in created:
+            results[i] = _result(start + i, 'created', id=created[key])
+        else:
+            results[i] = _result(start + i, 'exists', id=existing[key])
+    return results
+
+
+def rating_values(item: Any, user_id: int, any_user: bool) -> Tuple[RATING_KEY, dict]:
+    if not isinstance(item, dict):
+        raise ValueError('Item must be a JSON object')
+    values: dict = {
+        name: item[name] for name in ('rating', 'review') if item.get(name) is not None
+    }
+    if not values:
+        raise ValueError('rating or review is required')
+    rating: Any = values.get('rating')
+    if rating is not None and (
+        isinstance(rating, bool) or not isinstance(rating, int) or not 0 <= rating <= 10
+    ):
+        raise ValueError('rating must be an integer from 0 to 10')
+    if not isinstance(values.get('review', ''), str):
+        raise ValueError('review must be a string')
+    movie_id: Any = item.get('movie_id')
+    if isinstance(movie_id, bool) or not isinstance(movie_id, int):
+        raise ValueError('movie_id must be an integer')
+    owner: Any = item.get('user_id', user_id)
+    if owner != user_id and not any_user:
+        raise ValueError('Not allowed to rate on behalf of other users')
+    return (owner, movie_id), values
+
+
+def _existing_ids(session: Session, column: Any, ids: Set[int]) -> Set[int]:
+    found: Set[int] = set()
+    for chunk in _chunks(ids):
+        found.update(id for (id,) in session.query(column).filter(column.in_(chunk)))
+    return found
+
+
+def _locked_ratings(
+    session: Session, keys: Collection[RATING_KEY]
+) -> Dict[RATING_KEY, Tuple[int, Optional[int], Optional[str]]]:
+    # Read after insert_empty_ratings(), so every key of a known movie is found.
+    found: Dict[RATING_KEY, Tuple[int, Optional[int], Optional[str]]] = {}
+    columns = (
+        MovieRating.id,
+        MovieRating.user_id,
+        MovieRating.movie_id,
+        MovieRating.rating,
+        MovieRating.review,
+    )
+    for user_ids in _chunks({user_id for user_id, _ in keys}):
+        for movie_ids in _chunks({movie_id for _, movie_id in keys}):
+            rows = (
+                session.query(*columns)
+                .filter(
+                    MovieRating.user_id.in_(user_ids),
+                    MovieRating.movie_id.in_(movie_ids),
+                )
+                .with_for_update()
+            )
+            for id, user_id, movie_id, rating, review in rows:
+                if (user_id, movie_id) in keys:
+                    found[user_id, movie_id] = (id, rating, review)
+    return found
+
+
+def _write_ratings(
+    session: Session,
+    pending: Dict[RATING_KEY, dict],
+    existing: Dict[RATING_KEY, Tuple[int, Optional[int], Optional[str]]],
+) -> Dict[int, STATS_DELTA]:
+    deltas: Dict[int, STATS_DELTA] = {}
+    updates: List[Dict[str, Any]] = []
+    for (user_id, movie_id), values in pending.items():
+        rating_id, old_rating, old_review = existing[user_id, movie_id]
+        old: RATING_VALUES = (old_rating, old_review)
+        new: RATING_VALUES = (
+            values.get('rating', old[0]),
+            values.get('review', old[1]),
+        )
+        delta = stats_delta(old, new)
+        deltas[movie_id] = tuple(  # type: ignore
+            a + b for a, b in zip(deltas.get(movie_id, (0, 0, 0)), delta)
+        )
+        updates.append(
+            {'rating_id': rating_id, 'new_rating': new[0], 'new_review': new[1]}
+        )
+    update_ratings(session, updates)
+    return deltas
+
+
+def import_ratings(
+    session: Session,
+    batch: Sequence[Any],
+    start: int,
+    user_id: int,
+    any_user: bool = False,
+) -> List[Any]:
+    results: List[Any] = [None] * len(batch)
+    pending: Dict[RATING_KEY, dict] = {}
+    indexes: Dict[RATING_KEY, List[int]] = {}
+    for i, item in enumerate(batch):
+        try:
+            key, values = rating_values(item, user_id, any_user)
+        except ValueError as error:
+            results[i] = _result(start + i, 'error', error=str(error))
+            continue
+        pending.setdefault(key, {}).update(values)
+        indexes.setdefault(key, []).append(i)
+    movies: Set[int] = _existing_ids(session, Movie.id, {key[1] for key in pending})
+    users: Set[int] = _existing_ids(session, User.id, {key[0] for key in pending})
+    for key in [key for key in pending if key[1] not in movies or key[0] not in users]:
+        del pending[key]
+        for i in indexes[key]:
+            results[i] = _result(start + i, 'error', error='Unknown movie or user')
+    insert_empty_ratings(
+        session,
+        [{'user_id': user_id, 'movie_id': movie_id} for user_id, movie_id in pending],
+    )
+    existing = _locked_ratings(session, pending)
+    # Only the ratings inserted above are empty.
+    created: Set[RATING_KEY] = {
+        key
+        for key, (_, rating, review) in existing.items()
+        if (rating, review) == (None, None)
+    }
+    deltas: Dict[int, STATS_DELTA] = _write_ratings(session, pending, existing)
+    apply_stats_deltas(session, deltas)
+    ensure_movie_stats(session, deltas)
+    for key in pending:
+        status: str = 'created' if key in created else 'updated'
+        for i in indexes[key]:
+            results[i] = _result(start + i, status, user_id=key[0], movie_id=key[1])
+    return results
@@ -0,0 +1,170 @@
+import bisect
+import sys
+import threading
+import time
+from array import array
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from .models import Movie
+
+# Typed arrays can't hold NULL years.
+NO_YEAR = -(2 ** 63)
+# ids, years, names and ids by year
+COLUMNS = Tuple[array, array, List[str], Dict[int, array]]
+
+
+class CatalogMovie(NamedTuple):
+    id: int
+    name: str
+    year: Optional[int]
+
+
+def _read_columns(session: Session) -> COLUMNS:
+    ids: array = array('q')
+    years: array = array('q')
+    names: List[str] = []
+    by_year: Dict[int, array] = {}
+    rows = session.query(Movie.id, Movie.name, Movie.year).order_by(Movie.id)
+    for id, name, year in rows:
+        ids.append(id)
+        names.append(sys.intern(name))
+        if year is None:
+            years.append(NO_YEAR)
+        else:
+            years.append(year)
+            by_year.setdefault(year, array('q')).append(id)
+    return ids, years, names, by_year
+
+
+class MovieCatalog:
+    # Column-oriented copy of the movies table for listings and lookups by id,
+    # so they don't build an ORM instance per row. Ids are kept sorted and the
+    # other columns are parallel to them.
+    def __init__(
+        self,
+        max_age: Optional[float] = 60.0,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.max_age = max_age
+        self._clock = clock
+        self._ids: array = array('q')
+        self._years: array = array('q')
+        self._names: List[str] = []
+        self._by_year: Dict[int, array] = {}
+        self._built_at: Optional[float] = None
+        # Movies added while a rebuild's query runs may be missing from its
+        # rows, so they are kept until every running rebuild has swapped in.
+        self._rebuilds: int = 0
+        self._added: List[CatalogMovie] = []
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    @property
+    def stale(self) -> bool:
+        if self._built_at is None:
+            return True
+        return self.max_age is not None and (
+            self._clock() - self._built_at >= self.max_age
+        )
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._built_at = None
+
+    def rebuild(self, session: Session) -> None:
+        with self._lock:
+            self._rebuilds += 1
+        columns: Optional[COLUMNS] = None
+        try:
+            columns = _read_columns(session)
+        finally:
+            with self._lock:
+                self._rebuilds -= 1
+                if columns is not None:
+                    self._ids, self._years, self._names, self._by_year = columns
+                    self._built_at = self._clock()
+                    for movie in self._added:
+                        self._insert(*movie)
+                if not self._rebuilds:
+                    self._added = []
+
+    def add(self, id: int, name: str, year: Optional[int]) -> None:
+        with self._lock:
+            if self._rebuilds:
+                self._added.append(CatalogMovie(id, name, year))
+            if self._built_at is not None:
+                self._insert(id, name, year)
+
+    def _insert(self, id: int, name: str, year: Optional[int]) -> None:
+        # New ids are almost always the largest, which makes this an append.
+        position: int = bisect.bisect_left(self._ids, id)
+        if position < len(self._ids) and self._ids[position] == id:
+            return
+        self._ids.insert(position, id)
+        self._names.insert(position, sys.intern(name))
+        self._years.insert(position, NO_YEAR if year is None else year)
+        if year is not None:
+            year_ids: array = self._by_year.setdefault(year, array('q'))
+            year_ids.insert(bisect.bisect_left(year_ids, id), id)
+
+    def _movie(self, position: int) -> CatalogMovie:
+        year: int = self._years[position]
+        return CatalogMovie(
+            self._ids[position],
+            self._names[position],
+            None if year == NO_YEAR else year,
+        )
+
+    def get(self, session: Session, id: int) -> Optional[CatalogMovie]:
+        if self.stale:
+            self.rebuild(session)
+        with self._lock:
+            position: int = bisect.bisect_left(self._ids, id)
+            if position < len(self._ids) and self._ids[position] == id:
+                return self._movie(position)
+            return None
+
+    def movies(
+        self,
+        session: Session,
+        year: Optional[int] = None,
+        after: Optional[int] = None,
+        offset: int = 0,
+        limit: Optional[int] = None,
+    ) -> List[CatalogMovie]:
+        # Ordered by id, like the listings they replace.
+        if self.stale:
+            self.rebuild(session)
+        with self._lock:
+            ids: array = (
+                self._ids if year is None else self._by_year.get(year, array('q'))
+            )
+            start: int = offset
+            if after is not None:
+                start += bisect.bisect_right(ids, after)
+            stop: Optional[int] = None if limit is None else start + limit
+            if year is None:
+                return [
+                    self._movie(position) for position in range(len(ids))[start:stop]
+                ]
+            return [
+                self._movie(bisect.bisect_left(self._ids, id)) for id in ids[start:stop]
+            ]
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            names: int = sum(sys.getsizeof(name) for name in set(self._names))
+            index: int = sum(sys.getsizeof(ids) for ids in self._by_year.values())
+            return {
+                'movies': len(self._ids),
+                'years': len(self._by_year),
+                'bytes': sys.getsizeof(self._ids)
+                + sys.getsizeof(self._years)
+                + sys.getsizeof(self._names)
+                + names
+                + index,
+            }
@@ -0,0 +1,89 @@
+from typing import Optional
+
+import click
+from flask import current_app
+
+from .database import create_session, init_db
+from .search import ensure_search_index, rebuild_search_index
+from .state import leaderboard
+from .stats import rebuild_movie_stats
+from .views.common import OPT_STR, bp
+
+
+@bp.cli.command('init-db')
+def init_database() -> None:
+    init_db()
+    with create_session() as session:
+        ensure_search_index(session)
+    click.echo('Database is up to date')
+
+
+@bp.cli.command('rebuild-stats')
+def rebuild_stats() -> None:
+    with create_session() as session:
+        count: int = rebuild_movie_stats(session)
+    leaderboard.invalidate()
+    click.echo(f'Rebuilt rating stats for {count} movies')
+
+
+@bp.cli.command('rebuild-search-index')
+def rebuild_search() -> None:
+    with create_session() as session:
+        count: int = rebuild_search_index(session)
+    click.echo(f'Rebuilt search index for {count} movies')
+
+
+@bp.cli.command('export-rating-stats')
+@click.argument('directory', required=False)
+@click.option('--chunk-size', type=int, default=50000, show_default=True)
+@click.option('--prior-votes', type=float, help='Defaults to the mean votes per movie')
+@click.option('--parquet', is_flag=True, help='Also write movies/years.parquet')
+def export_stats(
+    directory: OPT_STR, chunk_size: int, prior_votes: Optional[float], parquet: bool
+) -> None:
+    # pylint: disable=import-outside-toplevel
+    from .analytics import export_rating_stats
+
+    directory = directory or current_app.config['ANALYTICS_DIR']
+    if not directory:
+        raise click.UsageError('Pass DIRECTORY or set ANALYTICS_DIR')
+    with create_session(readonly=True) as session:
+        meta: dict = export_rating_stats(
+            session, directory, chunk_size, prior_votes, parquet
+        )
+    click.echo(
+        f"Exported rating stats for {meta['movies']} movies "
+        f"and {meta['years']} years to {directory}"
+    )
+
+
+@bp.cli.command('build-similarity')
+@click.argument('directory', required=False)
+@click.option('--k', type=int, default=20, show_default=True)
+@click.option(
+    '--method',
+    type=click.Choice(['adjusted_cosine', 'cosine']),
+    default='adjusted_cosine',
+    show_default=True,
+)
+@click.option('--workers', type=int, default=0, help='Process pool size')
+@click.option('--chunk-size', type=int, default=128, show_default=True)
+@click.option('--full', is_flag=True, help='Rebuild instead of refreshing')
+def build_similar(
+    directory: OPT_STR, k: int, method: str, workers: int, chunk_size: int, full: bool,
+) -> None:
+    # pylint: disable=import-outside-toplevel
+    from .similarity import build_similarity
+
+    directory = directory or current_app.config['SIMILARITY_DIR']
+    if not directory:
+        raise click.UsageError('Pass DIRECTORY or set SIMILARITY_DIR')
+    with create_session(readonly=True) as session:
+        meta: dict = build_similarity(
+            session, directory, k, method, workers, chunk_size, full
+        )
+    action: str = 'Refreshed' if meta['refreshed'] else 'Built'
+    click.echo(
+        f"{action} similar movies for {meta['movies']} movies "
+        f"in {meta['seconds']}s to {directory}"
+    )
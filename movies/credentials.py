@@ -0,0 +1,73 @@
+import hashlib
+import hmac
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Optional, Tuple
+
+CREDENTIAL_KEY = Tuple[str, bytes]
+CREDENTIAL_ENTRY = Tuple[int, float]
+
+
+class CredentialCache:
+    def __init__(
+        self,
+        maxsize: int = 1024,
+        ttl: float = 300.0,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._clock = clock
+        self._secret = os.urandom(32)
+        self._entries: 'OrderedDict[CREDENTIAL_KEY, CREDENTIAL_ENTRY]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _key(self, username: str, password: str) -> CREDENTIAL_KEY:
+        # Only a keyed digest of the password is kept in memory.
+        digest = hmac.new(self._secret, password.encode('utf-8'), hashlib.sha256)
+        return username, digest.digest()
+
+    def get(self, username: str, password: str) -> Optional[int]:
+        key = self._key(username, password)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] <= self._clock():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, username: str, password: str, user_id: int) -> None:
+        key = self._key(username, password)
+        with self._lock:
+            self._entries[key] = (user_id, self._clock() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, username: str) -> None:
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == username]:
+                del self._entries[key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> Dict[str, int]:
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self)}
+
+
+credential_cache: CredentialCache = CredentialCache()
@@ -1,20 +1,163 @@
+import os
+import threading
 from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Mapping, Optional, Tuple
 
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.engine.url import make_url
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool
 
-engine = create_engine('sqlite:///movies-rating.db')
-Session = sessionmaker(bind=engine)
+from .replicas import ReplicaSet
+
+if TYPE_CHECKING:
+    from alembic.config import Config  # pylint: disable=ungrouped-imports
+
+MIGRATIONS = os.path.join(os.path.dirname(__file__), 'migrations')
+ENV_PREFIX = 'MOVIES_'
+SETTINGS: Dict[str, Tuple[Callable[[str], Any], Any]] = {
+    'DATABASE_URL': (str, 'sqlite:///movies-rating.db'),
+    'DATABASE_POOL_SIZE': (int, 5),
+    'DATABASE_MAX_OVERFLOW': (int, 10),
+    'DATABASE_POOL_RECYCLE': (int, 3600),
+    'DATABASE_BUSY_TIMEOUT': (float, 30.0),
+    'SQLITE_JOURNAL_MODE': (str, 'WAL'),
+    'SQLITE_SYNCHRONOUS': (str, 'NORMAL'),
+    'SQLITE_CACHE_SIZE': (int, -64000),
+    'SQLITE_MMAP_SIZE': (int, 256 * 1024 * 1024),
+    'DATABASE_REPLICA_URLS': (lambda value: [u for u in value.split(',') if u], []),
+    'DATABASE_REPLICA_POLICY': (str, 'round_robin'),
+    'DATABASE_STICKY_SECONDS': (float, 5.0),
+}
+
+
+def load_settings(
+    config: Optional[Mapping[str, Any]] = None, environ: Mapping[str, str] = os.environ,
+) -> Dict[str, Any]:
+    # App config wins over MOVIES_* environment variables, which win over defaults.
+    settings: Dict[str, Any] = {}
+    for name, (convert, default) in SETTINGS.items():
+        if config is not None and name in config:
+            settings[name] = config[name]
+        elif ENV_PREFIX + name in environ:
+            settings[name] = convert(environ[ENV_PREFIX + name])
+        else:
+            settings[name] = default
+    return settings
+
+
+def _set_sqlite_pragmas(settings: Dict[str, Any]) -> Callable[..., None]:
+    pragmas: Dict[str, Any] = {
+        'journal_mode': settings['SQLITE_JOURNAL_MODE'],
+        'synchronous': settings['SQLITE_SYNCHRONOUS'],
+        'cache_size': settings['SQLITE_CACHE_SIZE'],
+        'mmap_size': settings['SQLITE_MMAP_SIZE'],
+    }
+
+    def set_pragmas(dbapi_connection: Any, connection_record: Any) -> None:
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name}={value}')
+        cursor.close()
+
+    return set_pragmas
+
+
+def make_engine(settings: Dict[str, Any]) -> Engine:
+    url = make_url(settings['DATABASE_URL'])
+    timeout: float = settings['DATABASE_BUSY_TIMEOUT']
+    pool: Dict[str, Any] = {
+        'pool_size': settings['DATABASE_POOL_SIZE'],
+        'max_overflow': settings['DATABASE_MAX_OVERFLOW'],
+        'pool_recycle': settings['DATABASE_POOL_RECYCLE'],
+    }
+    if url.get_backend_name() != 'sqlite':
+        connect_args: Dict[str, Any] = {}
+        if url.get_backend_name() == 'postgresql':
+            connect_args['options'] = f'-c lock_timeout={int(timeout * 1000)}'
+        return create_engine(url, pool_pre_ping=True, connect_args=connect_args, **pool)
+    if url.database in (None, '', ':memory:'):
+        new_engine: Engine = create_engine(url)
+    else:
+        new_engine = create_engine(
+            url,
+            poolclass=QueuePool,
+            connect_args={'timeout': timeout, 'check_same_thread': False},
+            **pool,
+        )
+    event.listen(new_engine, 'connect', _set_sqlite_pragmas(settings))
+    return new_engine
+
+
+def make_replicas(settings: Dict[str, Any]) -> ReplicaSet:
+    engines: List[Engine] = [
+        make_engine({**settings, 'DATABASE_URL': url})
+        for url in settings['DATABASE_REPLICA_URLS']
+    ]
+    return ReplicaSet(engines, settings['DATABASE_REPLICA_POLICY'])
+
+
+# The engine is created on first use, so importing the package (or forking
+# workers after importing it) never opens a connection.
+engine: Optional[Engine] = None
+replicas: ReplicaSet = ReplicaSet([])
+Session = sessionmaker()
 Base = declarative_base()
+# Set per request; sessions opened without an explicit mode read from replicas.
+read_only: ContextVar[bool] = ContextVar('read_only', default=False)
+_engine_lock = threading.Lock()
+
+
+def reads_replica() -> bool:
+    # Whether a session opened now without an explicit mode reads a replica.
+    return bool(read_only.get() and replicas)
+
+
+def configure_engine(config: Optional[Mapping[str, Any]] = None) -> Engine:
+    global engine, replicas  # pylint: disable=global-statement
+    dispose_engine()
+    settings: Dict[str, Any] = load_settings(config)
+    engine = make_engine(settings)
+    replicas = make_replicas(settings)
+    Session.configure(bind=engine)
+    return engine
+
+
+def get_engine() -> Engine:
+    with _engine_lock:
+        if engine is None:
+            return configure_engine()
+        return engine
+
+
+def dispose_engine() -> None:
+    # Pooled connections must not be shared with forked worker processes.
+    if engine is not None:
+        engine.dispose()
+    replicas.dispose()
 
 
 @contextmanager
-def create_session(**kwargs):
+def create_session(readonly: Optional[bool] = None, **kwargs):
+    if readonly is None:
+        readonly = read_only.get()
+    if engine is None:
+        get_engine()
+    on_replica: bool = bool(readonly and replicas and 'bind' not in kwargs)
+    if on_replica:
+        kwargs['bind'] = replicas.choose()
     new_session = Session(**kwargs)
     try:
         yield new_session
-        new_session.commit()
+        # Anything added while reading a replica (e.g. rebuilt stats) is
+        # discarded rather than written to it.
+        if on_replica:
+            new_session.rollback()
+        else:
+            new_session.commit()
     except Exception:
         new_session.rollback()
         raise
@@ -22,5 +165,29 @@ def create_session(**kwargs):
         new_session.close()
 
 
-def init_db():
-    Base.metadata.create_all(bind=engine)
+def migrations_config(connection: Connection) -> 'Config':
+    # Alembic is only needed to create or migrate the schema.
+    from alembic.config import Config  # pylint: disable=import-outside-toplevel
+
+    config = Config()
+    config.set_main_option('script_location', MIGRATIONS)
+    config.attributes['connection'] = connection
+    return config
+
+
+def init_db(bind: Optional[Engine] = None) -> None:
+    from alembic import command  # pylint: disable=import-outside-toplevel
+
+    from . import models  # noqa: F401 pylint: disable=import-outside-toplevel
+
+    bind = bind or get_engine()
+    # Fresh databases get the current schema and are stamped as up to date;
+    # existing ones get missing tables plus any pending migrations.
+    with bind.begin() as connection:
+        fresh: bool = not bind.dialect.has_table(connection, 'movies')
+        Base.metadata.create_all(bind=connection)
+        config = migrations_config(connection)
+        if fresh:
+            command.stamp(config, 'head')
+        else:
+            command.upgrade(config, 'head')
@@ -0,0 +1,156 @@
+import multiprocessing
+import threading
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor
+from functools import lru_cache
+from typing import TYPE_CHECKING, Any, Callable, Dict, Mapping, Optional, Tuple
+
+if TYPE_CHECKING:
+    from passlib.context import CryptContext
+
+DEFAULT_SCHEME = 'sha512_crypt'
+# Schemes of hashes created before the scheme became configurable.
+LEGACY_SCHEMES = ('sha512_crypt', 'sha256_crypt')
+VERIFY_RESULT = Tuple[bool, Optional[str]]
+
+
+class HasherOverloaded(Exception):
+    pass
+
+
+@lru_cache(maxsize=None)
+def _context(scheme: str, rounds: Optional[int]) -> 'CryptContext':
+    # passlib is slow to import, and only needed once a password is hashed.
+    from passlib.context import CryptContext  # pylint: disable=import-outside-toplevel
+
+    options: Dict[str, Any] = {}
+    if rounds is not None:
+        # Pinning the accepted range makes hashes with other rounds need update.
+        for name in ('default_rounds', 'min_rounds', 'max_rounds'):
+            options[f'{scheme}__{name}'] = rounds
+    return CryptContext(
+        schemes=[scheme] + [legacy for legacy in LEGACY_SCHEMES if legacy != scheme],
+        default=scheme,
+        deprecated='auto',
+        **options,
+    )
+
+
+# Module-level so they can be pickled into the process pool; each returns its
+# result together with the time spent hashing.
+def _hash(scheme: str, rounds: Optional[int], password: str) -> Tuple[str, float]:
+    started: float = time.perf_counter()
+    password_hash: str = _context(scheme, rounds).hash(password)
+    return password_hash, time.perf_counter() - started
+
+
+def _verify_and_update(
+    scheme: str, rounds: Optional[int], password: str, password_hash: str
+) -> Tuple[VERIFY_RESULT, float]:
+    started: float = time.perf_counter()
+    result = _context(scheme, rounds).verify_and_update(password, password_hash)
+    return result, time.perf_counter() - started
+
+
+class PasswordHasher:
+    # Hashes inline by default; with workers the CPU-bound passlib calls run in
+    # a process pool so they neither hold the GIL nor stall an event loop.
+    def __init__(self) -> None:
+        self.executor: Optional[Executor] = None
+        self.workers: int = 0
+        self.queue_size: Optional[int] = None
+        self.scheme: str = DEFAULT_SCHEME
+        self.rounds: Optional[int] = None
+        self._lock = threading.Lock()
+        self._depth: int = 0
+        self.jobs: int = 0
+        self.rejected: int = 0
+        self.rehashed: int = 0
+        self.hash_seconds: float = 0.0
+        self.wait_seconds: float = 0.0
+
+    def configure(
+        self,
+        workers: int = 0,
+        queue_size: Optional[int] = None,
+        scheme: str = DEFAULT_SCHEME,
+        rounds: Optional[int] = None,
+    ) -> None:
+        _context(scheme, rounds)  # fail fast on an unknown scheme or rounds
+        self.shutdown()
+        self.queue_size = queue_size
+        self.scheme = scheme
+        self.rounds = rounds
+        self.workers = workers
+        if workers:
+            # Forking a process with running threads can deadlock the child.
+            context = multiprocessing.get_context('spawn')
+            self.executor = ProcessPoolExecutor(workers, mp_context=context)
+
+    def shutdown(self) -> None:
+        executor, self.executor = self.executor, None
+        self.workers = 0
+        if executor is not None:
+            executor.shutdown()
+
+    def _run(self, func: Callable[..., Tuple[Any, float]], *args: Any) -> Any:
+        with self._lock:
+            if self.queue_size is not None and self._depth >= self.queue_size:
+                self.rejected += 1
+                raise HasherOverloaded(f'{self._depth} password hashes in progress')
+            self._depth += 1
+        started: float = time.perf_counter()
+        try:
+            if self.executor is None:
+                result, seconds = func(self.scheme, self.rounds, *args)
+            else:
+                future = self.executor.submit(func, self.scheme, self.rounds, *args)
+                result, seconds = future.result()
+        finally:
+            with self._lock:
+                self._depth -= 1
+        elapsed: float = time.perf_counter() - started
+        with self._lock:
+            self.jobs += 1
+            self.hash_seconds += seconds
+            self.wait_seconds += max(elapsed - seconds, 0.0)
+        return result
+
+    def hash(self, password: str) -> str:
+        return self._run(_hash, password)
+
+    def verify(self, password: str, password_hash: str) -> bool:
+        return self.verify_and_update(password, password_hash)[0]
+
+    def verify_and_update(self, password: str, password_hash: str) -> VERIFY_RESULT:
+        # The new hash is set when the stored one uses an outdated scheme or rounds.
+        verified, new_hash = self._run(_verify_and_update, password, password_hash)
+        if new_hash is not None:
+            with self._lock:
+                self.rehashed += 1
+        return verified, new_hash
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            return {
+                'workers': self.workers,
+                'queue_depth': self._depth,
+                'queue_size': -1 if self.queue_size is None else self.queue_size,
+                'jobs': self.jobs,
+                'rejected': self.rejected,
+                'rehashed': self.rehashed,
+                'hash_seconds': round(self.hash_seconds, 6),
+                'wait_seconds': round(self.wait_seconds, 6),
+            }
+
+
+password_hasher = PasswordHasher()
+
+
+def configure_hasher(config: Mapping[str, Any], workers: Optional[int] = None) -> None:
+    password_hasher.configure(
+        config['HASH_WORKERS'] if workers is None else workers,
+        config['HASH_QUEUE_SIZE'],
+        config['HASH_SCHEME'],
+        config['HASH_ROUNDS'],
+    )
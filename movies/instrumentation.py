@@ -0,0 +1,228 @@
+import cProfile
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from http import HTTPStatus
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from flask import Flask, Response, abort, current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+METRICS_MIMETYPE = 'text/plain; version=0.0.4'
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+PHASES = ('sql', 'auth', 'serialize')
+
+
+class RequestTimings:
+    def __init__(self) -> None:
+        self.started: float = time.perf_counter()
+        self.durations: Dict[str, float] = {}
+        self.counts: Dict[str, int] = {}
+
+    def add(self, name: str, seconds: float) -> None:
+        self.durations[name] = self.durations.get(name, 0.0) + seconds
+        self.counts[name] = self.counts.get(name, 0) + 1
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def server_timing(self, total: float) -> str:
+        metrics: List[str] = []
+        for name in PHASES:
+            if name in self.durations:
+                metric: str = f'{name};dur={self.durations[name] * 1000:.3f}'
+                if name == 'sql':
+                    metric += f';desc="{self.counts[name]} queries"'
+                metrics.append(metric)
+        metrics.append(f'total;dur={total * 1000:.3f}')
+        return ', '.join(metrics)
+
+
+def current_timings() -> Optional[RequestTimings]:
+    return g.get('timings') if has_request_context() else None
+
+
+@contextmanager
+def timed(name: str) -> Iterator[None]:
+    timings: Optional[RequestTimings] = current_timings()
+    started: float = time.perf_counter()
+    try:
+        yield
+    finally:
+        if timings is not None:
+            timings.add(name, time.perf_counter() - started)
+
+
+class EndpointMetrics:
+    def __init__(self) -> None:
+        self.statuses: Dict[int, int] = {}
+        self.buckets: List[int] = [0] * len(DURATION_BUCKETS)
+        self.count: int = 0
+        self.seconds: float = 0.0
+        self.sql_statements: int = 0
+        self.phases: Dict[str, float] = dict.fromkeys(PHASES, 0.0)
+
+
+class Metrics:
+    def __init__(self) -> None:
+        self._endpoints: Dict[str, EndpointMetrics] = {}
+        self._lock = threading.Lock()
+        self._stats: List[Tuple[str, Callable[[], Dict[str, float]]]] = []
+
+    def add_stats(self, prefix: str, stats: Callable[[], Dict[str, float]]) -> None:
+        # Values of stats() are exported as movies_<prefix>_<key> gauges.
+        self._stats.append((prefix, stats))
+
+    def observe(
+        self, endpoint: str, status: int, timings: RequestTimings, total: float
+    ) -> None:
+        with self._lock:
+            metrics: EndpointMetrics = self._endpoints.setdefault(
+                endpoint, EndpointMetrics()
+            )
+            metrics.statuses[status] = metrics.statuses.get(status, 0) + 1
+            for i, bound in enumerate(DURATION_BUCKETS):
+                if total <= bound:
+                    metrics.buckets[i] += 1
+            metrics.count += 1
+            metrics.seconds += total
+            metrics.sql_statements += timings.counts.get('sql', 0)
+            for name in PHASES:
+                metrics.phases[name] += timings.durations.get(name, 0.0)
+
+    def render(self) -> str:
+        with self._lock:
+            endpoints: List[Tuple[str, EndpointMetrics]] = sorted(
+                self._endpoints.items()
+            )
+            lines: List[str] = [
+                '# HELP movies_requests_total Requests handled.',
+                '# TYPE movies_requests_total counter',
+            ]
+            for endpoint, metrics in endpoints:
+                for status, count in sorted(metrics.statuses.items()):
+                    lines.append(
+                        f'movies_requests_total{{endpoint="{endpoint}",status="{status}"}} {count}'
+                    )
+            lines += [
+                '# HELP movies_request_duration_seconds Request duration.',
+                '# TYPE movies_request_duration_seconds histogram',
+            ]
+            for endpoint, metrics in endpoints:
+                label: str = f'endpoint="{endpoint}"'
+                for bound, count in zip(DURATION_BUCKETS, metrics.buckets):
+                    lines.append(
+                        f'movies_request_duration_seconds_bucket{{{label},le="{bound}"}} {count}'
+                    )
+                lines += [
+                    f'movies_request_duration_seconds_bucket{{{label},le="+Inf"}} {metrics.count}',
+                    f'movies_request_duration_seconds_sum{{{label}}} {metrics.seconds:.6f}',
+                    f'movies_request_duration_seconds_count{{{label}}} {metrics.count}',
+                ]
+            lines += [
+                '# HELP movies_sql_statements_total SQL statements executed.',
+                '# TYPE movies_sql_statements_total counter',
+            ]
+            for endpoint, metrics in endpoints:
+                lines.append(
+                    f'movies_sql_statements_total{{endpoint="{endpoint}"}} {metrics.sql_statements}'
+                )
+            for name in PHASES:
+                lines += [
+                    f'# HELP movies_{name}_seconds_total Time spent in {name}.',
+                    f'# TYPE movies_{name}_seconds_total counter',
+                ]
+                for endpoint, metrics in endpoints:
+                    lines.append(
+                        f'movies_{name}_seconds_total{{endpoint="{endpoint}"}} {metrics.phases[name]:.6f}'
+                    )
+        for prefix, stats in self._stats:
+            for key, value in stats().items():
+                lines += [
+                    f'# TYPE movies_{prefix}_{key} gauge',
+                    f'movies_{prefix}_{key} {value}',
+                ]
+        return '\n'.join(lines) + '\n'
+
+
+def _before_cursor_execute(conn: Any, *args: Any) -> None:
+    if current_timings() is not None:
+        conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn: Any, *args: Any) -> None:
+    timings: Optional[RequestTimings] = current_timings()
+    started: List[float] = conn.info.get('query_started', [])
+    if timings is not None and started:
+        timings.add('sql', time.perf_counter() - started.pop())
+
+
+def _timed_encoder(base: Any) -> Any:
+    class TimedJSONEncoder(base):
+        def encode(self, o: Any) -> str:
+            with timed('serialize'):
+                return super().encode(o)
+
+    return TimedJSONEncoder
+
+
+def _endpoint() -> str:
+    # Without the blueprint name, so labels don't depend on how routes are grouped.
+    return (request.endpoint or 'unknown').rpartition('.')[2]
+
+
+def _start_profile(config: Any) -> Optional[cProfile.Profile]:
+    if random.random() >= config['PROFILE_SAMPLE_RATE']:
+        return None
+    profile = cProfile.Profile()
+    try:
+        profile.enable()
+    except ValueError:
+        # Another request on this interpreter is already being profiled.
+        return None
+    return profile
+
+
+def _dump_profile(profile: cProfile.Profile, config: Any, total: float) -> None:
+    profile.disable()
+    if total >= config['PROFILE_SLOW_SECONDS']:
+        os.makedirs(config['PROFILE_DIR'], exist_ok=True)
+        name: str = f'{_endpoint()}-{time.time_ns()}.prof'
+        profile.dump_stats(os.path.join(config['PROFILE_DIR'], name))
+
+
+def instrument(app: Flask, metrics: Metrics) -> None:
+    # Hooks are always installed but do nothing unless INSTRUMENTATION is set,
+    # so it can be switched on in a running app.
+    app.json_encoder = _timed_encoder(app.json_encoder)
+    if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+
+    @app.before_request
+    def start_timings() -> None:
+        if app.config['INSTRUMENTATION']:
+            g.timings = RequestTimings()
+            g.profile = _start_profile(app.config)
+
+    @app.after_request
+    def record_timings(response: Response) -> Response:
+        timings: Optional[RequestTimings] = g.pop('timings', None)
+        if timings is None:
+            return response
+        total: float = timings.elapsed()
+        profile: Optional[cProfile.Profile] = g.pop('profile', None)
+        if profile is not None:
+            _dump_profile(profile, app.config, total)
+        response.headers['Server-Timing'] = timings.server_timing(total)
+        metrics.observe(_endpoint(), response.status_code, timings, total)
+        return response
+
+    @app.route('/metrics')
+    def get_metrics() -> Response:
+        if not current_app.config['INSTRUMENTATION']:
+            abort(HTTPStatus.NOT_FOUND)
+        return Response(metrics.render(), mimetype=METRICS_MIMETYPE)
@@ -0,0 +1,125 @@
+import bisect
+import threading
+import time
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy.orm import Query, Session
+
+from .models import Movie, MovieStats
+
+RANK_KEY = Tuple[float, int]
+
+
+class RankedMovie(NamedTuple):
+    id: int
+    name: str
+    year: Optional[int]
+    average: float
+
+    @property
+    def key(self) -> RANK_KEY:
+        return -self.average, self.id
+
+
+def top_movies_query(session: Session, min_votes: int = 1) -> Query:
+    return (
+        session.query(Movie.id, Movie.name, Movie.year, MovieStats.average)
+        .join(MovieStats)
+        .filter(MovieStats.rating_count >= max(min_votes, 1))
+        .order_by(MovieStats.average.desc(), Movie.id)
+    )
+
+
+class Leaderboard:
+    def __init__(
+        self,
+        capacity: int = 1000,
+        min_votes: int = 1,
+        max_age: Optional[float] = 60.0,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.capacity = capacity
+        self.min_votes = min_votes
+        self.max_age = max_age
+        self._clock = clock
+        self._keys: List[RANK_KEY] = []
+        self._entries: Dict[int, RankedMovie] = {}
+        # Best possible key among movies that did not fit, None if there are none.
+        self._ceiling: Optional[RANK_KEY] = None
+        self._built_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    @property
+    def stale(self) -> bool:
+        if self._built_at is None:
+            return True
+        return self.max_age is not None and (
+            self._clock() - self._built_at >= self.max_age
+        )
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._built_at = None
+
+    def rebuild(self, session: Session) -> None:
+        rows = top_movies_query(session, self.min_votes).limit(self.capacity + 1)
+        movies: List[RankedMovie] = [RankedMovie(*row) for row in rows]
+        with self._lock:
+            self._entries = {movie.id: movie for movie in movies[: self.capacity]}
+            self._keys = [movie.key for movie in movies[: self.capacity]]
+            self._ceiling = (
+                movies[self.capacity].key if len(movies) > self.capacity else None
+            )
+            self._built_at = self._clock()
+
+    def update(self, movie: RankedMovie, votes: int) -> None:
+        with self._lock:
+            if self._built_at is None:
+                return
+            current: Optional[RankedMovie] = self._entries.pop(movie.id, None)
+            if current is not None:
+                self._keys.remove(current.key)
+            if votes < self.min_votes or movie.average is None:
+                if current is not None and self._ceiling is not None:
+                    self._built_at = None
+                return
+            if current is None and len(self._keys) >= self.capacity:
+                if movie.key > self._keys[-1]:
+                    self._lower_ceiling(movie.key)
+                    return
+                evicted: RANK_KEY = self._keys.pop()
+                del self._entries[evicted[1]]
+                self._lower_ceiling(evicted)
+            if self._ceiling is not None and movie.key > self._ceiling:
+                self._built_at = None
+                return
+            bisect.insort(self._keys, movie.key)
+            self._entries[movie.id] = movie
+
+    def _lower_ceiling(self, key: RANK_KEY) -> None:
+        self._ceiling = key if self._ceiling is None else min(self._ceiling, key)
+
+    def top(
+        self, session: Session, limit: int, offset: int = 0
+    ) -> Optional[List[RankedMovie]]:
+        if self.stale:
+            self.rebuild(session)
+        with self._lock:
+            return self._slice(offset, limit)
+
+    def after(
+        self, session: Session, key: Optional[RANK_KEY], limit: int
+    ) -> Optional[List[RankedMovie]]:
+        if self.stale:
+            self.rebuild(session)
+        with self._lock:
+            start: int = 0 if key is None else bisect.bisect_right(self._keys, key)
+            return self._slice(start, limit)
+
+    def _slice(self, start: int, limit: int) -> Optional[List[RankedMovie]]:
+        if self._ceiling is not None and start + limit > len(self._keys):
+            return None
+        return [self._entries[key[1]] for key in self._keys[start : start + limit]]
@@ -0,0 +1,70 @@
+from typing import Any, Dict, Iterable, List
+
+from sqlalchemy.orm import Session
+
+from .bulk import IN_CHUNK_SIZE, batched
+from .models import Movie, MovieStats
+from .stats import aggregate_movie_stats
+
+LOOKUP_ITEM = Dict[str, Any]
+
+
+def parse_ids(values: Iterable[Any], max_ids: int) -> List[int]:
+    ids: List[int] = []
+    for value in values:
+        if isinstance(value, (bool, float)):
+            raise ValueError(f'Not a movie id: {value!r}')
+        try:
+            ids.append(int(value))
+        except (TypeError, ValueError):
+            raise ValueError(f'Not a movie id: {value!r}')
+    if not ids:
+        raise ValueError('No movie ids given')
+    if len(ids) > max_ids:
+        raise ValueError(f'At most {max_ids} movie ids can be looked up at once')
+    return ids
+
+
+def _item(movie_id: int, name: str, year: Any, stats: Any) -> LOOKUP_ITEM:
+    _, rating_count, review_count, average = stats
+    return {
+        'id': movie_id,
+        'name': name,
+        'year': year,
+        'average_rating': average,
+        'rating_count': rating_count,
+        'review_count': review_count,
+    }
+
+
+def lookup_movies(session: Session, ids: List[int]) -> List[LOOKUP_ITEM]:
+    # One query per IN_CHUNK_SIZE ids, plus one for movies whose stats row
+    # hasn't been built yet. Items follow the order of ids, duplicates included.
+    found: Dict[int, LOOKUP_ITEM] = {}
+    for chunk in batched(dict.fromkeys(ids), IN_CHUNK_SIZE):
+        rows = (
+            session.query(
+                Movie.id,
+                Movie.name,
+                Movie.year,
+                MovieStats.rating_sum,
+                MovieStats.rating_count,
+                MovieStats.review_count,
+                MovieStats.average,
+                MovieStats.movie_id.label('stats_id'),
+            )
+            .outerjoin(Movie.stats)
+            .filter(Movie.id.in_(chunk))
+        )
+        unbuilt: Dict[int, tuple] = {}
+        for row in rows:
+            if row.stats_id is None:
+                unbuilt[row.id] = (row.name, row.year)
+            else:
+                found[row.id] = _item(row.id, row.name, row.year, row[3:7])
+        if unbuilt:
+            for movie_id, stats in aggregate_movie_stats(
+                session, list(unbuilt)
+            ).items():
+                found[movie_id] = _item(movie_id, *unbuilt[movie_id], stats)
+    return [found.get(id) or {'id': id, 'error': 'not found'} for id in ids]
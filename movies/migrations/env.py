@@ -0,0 +1,20 @@
+import movies.models  # noqa: F401
+from alembic import context
+from movies import database
+from movies.database import Base
+from sqlalchemy.engine import Connection
+
+config = context.config
+
+
+def run_migrations(connection: Connection) -> None:
+    context.configure(connection=connection, target_metadata=Base.metadata)
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+if 'connection' in config.attributes:
+    run_migrations(config.attributes['connection'])
+else:
+    with database.get_engine().connect() as engine_connection:
+        run_migrations(engine_connection)
@@ -0,0 +1,111 @@
+"""Add indexes for movie and rating lookups
+
+Revision ID: 0001
+Revises:
+Create Date: 2020-04-01 12:00:00.000000
+"""
+from typing import Any, Dict, List, Set, Tuple
+
+from alembic import op
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Connection
+
+revision = '0001'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+DUPLICATE_MOVIES = text(
+    'SELECT movies.id, keep.id FROM movies JOIN ('
+    'SELECT min(id) AS id, name, year FROM movies WHERE year IS NOT NULL '
+    'GROUP BY name, year HAVING count(*) > 1) keep '
+    'ON movies.name = keep.name AND movies.year = keep.year AND movies.id > keep.id'
+)
+DUPLICATE_RATINGS = text(
+    'SELECT movierating.id, movierating.user_id, movierating.movie_id, '
+    'movierating.rating, movierating.review FROM movierating JOIN ('
+    'SELECT user_id, movie_id FROM movierating '
+    'GROUP BY user_id, movie_id HAVING count(*) > 1) duplicate '
+    'ON movierating.user_id = duplicate.user_id '
+    'AND movierating.movie_id = duplicate.movie_id '
+    'ORDER BY movierating.id'
+)
+MOVIE_STATS = text(
+    'INSERT INTO moviestats '
+    '(movie_id, rating_sum, rating_count, review_count, average) '
+    'SELECT movies.id, coalesce(sum(movierating.rating), 0), '
+    'count(movierating.rating), count(movierating.review), avg(movierating.rating) '
+    'FROM movies LEFT OUTER JOIN movierating ON movierating.movie_id = movies.id '
+    'GROUP BY movies.id'
+)
+
+
+def _tables(connection: Connection) -> Set[str]:
+    # Tables added after this revision exist once init_db() has run.
+    return set(inspect(connection).get_table_names())
+
+
+def _merge_movies(connection: Connection) -> None:
+    # Movies with the same name and year become the one with the lowest id.
+    duplicates: List[Dict[str, int]] = [
+        {'id': id, 'keep': keep} for id, keep in connection.execute(DUPLICATE_MOVIES)
+    ]
+    if duplicates:
+        connection.execute(
+            text('UPDATE movierating SET movie_id = :keep WHERE movie_id = :id'),
+            duplicates,
+        )
+        for table in {'moviestats', 'movietrigram'} & _tables(connection):
+            connection.execute(
+                text(f'DELETE FROM {table} WHERE movie_id = :id'), duplicates
+            )
+        connection.execute(text('DELETE FROM movies WHERE id = :id'), duplicates)
+
+
+def _merge_ratings(connection: Connection) -> None:
+    # One user's ratings of a movie become the first one, holding the latest
+    # rating and review, as if later ones had been upserts.
+    merged: Dict[Tuple[int, int], Dict[str, Any]] = {}
+    removed: List[Dict[str, int]] = []
+    for id, user_id, movie_id, rating, review in connection.execute(DUPLICATE_RATINGS):
+        kept: Any = merged.get((user_id, movie_id))
+        if kept is None:
+            merged[user_id, movie_id] = {'id': id, 'rating': rating, 'review': review}
+            continue
+        kept['rating'] = kept['rating'] if rating is None else rating
+        kept['review'] = kept['review'] if review is None else review
+        removed.append({'id': id})
+    if removed:
+        connection.execute(text('DELETE FROM movierating WHERE id = :id'), removed)
+        connection.execute(
+            text(
+                'UPDATE movierating SET rating = :rating, review = :review '
+                'WHERE id = :id'
+            ),
+            list(merged.values()),
+        )
+
+
+def upgrade() -> None:
+    # Existing duplicates would make the unique indexes fail to build.
+    connection: Connection = op.get_bind()
+    _merge_movies(connection)
+    _merge_ratings(connection)
+    if 'moviestats' in _tables(connection):
+        # init_db() creates moviestats empty on databases older than it, so
+        # stats are built for every movie, not only the merged ones.
+        connection.execute(text('DELETE FROM moviestats'))
+        connection.execute(MOVIE_STATS)
+    op.create_index('uq_movies_name_year', 'movies', ['name', 'year'], unique=True)
+    op.create_index('ix_movies_year', 'movies', ['year'])
+    op.create_index(
+        'uq_movierating_user_movie', 'movierating', ['user_id', 'movie_id'], unique=True
+    )
+    op.create_index('ix_movierating_movie_id', 'movierating', ['movie_id'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_movierating_movie_id', 'movierating')
+    op.drop_index('uq_movierating_user_movie', 'movierating')
+    op.drop_index('ix_movies_year', 'movies')
+    op.drop_index('uq_movies_name_year', 'movies')
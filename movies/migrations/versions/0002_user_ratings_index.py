@@ -0,0 +1,20 @@
+"""Add an index for listing a user's ratings
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2020-05-01 12:00:00.000000
+"""
+from alembic import op
+
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_movierating_user_id_id', 'movierating', ['user_id', 'id'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_movierating_user_id_id', 'movierating')
@@ -1,6 +1,15 @@
 from movies.database import Base
-from passlib.apps import custom_app_context as pwd_context
-from sqlalchemy import CheckConstraint, Column, ForeignKey, Integer, String
+from movies.hashing import password_hasher
+from sqlalchemy import (
+    CheckConstraint,
+    Column,
+    Float,
+    ForeignKey,
+    Index,
+    Integer,
+    String,
+)
+from sqlalchemy.orm import backref, relationship
 
 
 class User(Base):
@@ -13,14 +22,23 @@ class User(Base):
         self.username = username
 
     def hash_password(self, password):
-        self.password_hash = pwd_context.encrypt(password)
+        self.password_hash = password_hasher.hash(password)
 
     def verify_password(self, password):
-        return pwd_context.verify(password, self.password_hash)
+        verified, new_hash = password_hasher.verify_and_update(
+            password, self.password_hash
+        )
+        if new_hash is not None:
+            self.password_hash = new_hash
+        return verified
 
 
 class Movie(Base):
     __tablename__ = 'movies'
+    __table_args__ = (
+        Index('uq_movies_name_year', 'name', 'year', unique=True),
+        Index('ix_movies_year', 'year'),
+    )
     id = Column(Integer, primary_key=True)
     name = Column(String(100), nullable=False)
     year = Column(Integer)
@@ -32,15 +50,51 @@ class Movie(Base):
 
 class MovieRating(Base):
     __tablename__ = 'movierating'
-    __table_args__ = (CheckConstraint('rating >= 0 and rating <= 10'),)
+    __table_args__ = (
+        CheckConstraint('rating >= 0 and rating <= 10'),
+        Index('uq_movierating_user_movie', 'user_id', 'movie_id', unique=True),
+        Index('ix_movierating_movie_id', 'movie_id'),
+        Index('ix_movierating_user_id_id', 'user_id', 'id'),
+    )
     id = Column(Integer, primary_key=True)
     user_id = Column(Integer, ForeignKey(User.id), nullable=False)
     movie_id = Column(Integer, ForeignKey(Movie.id), nullable=False)
     rating = Column(Integer)
     review = Column(String(512))
+    user = relationship(User, backref=backref('ratings', lazy='dynamic'))
+    movie = relationship(Movie, backref=backref('ratings', lazy='dynamic'))
 
     def __init__(self, user_id, movie_id, rating, review=None):
         self.user_id = user_id
         self.movie_id = movie_id
         self.rating = rating
         self.review = review
+
+
+class MovieStats(Base):
+    __tablename__ = 'moviestats'
+    movie_id = Column(Integer, ForeignKey(Movie.id), primary_key=True)
+    rating_sum = Column(Integer, nullable=False, default=0)
+    rating_count = Column(Integer, nullable=False, default=0)
+    review_count = Column(Integer, nullable=False, default=0)
+    average = Column(Float, index=True)
+    movie = relationship(Movie, backref=backref('stats', uselist=False))
+
+    def __init__(
+        self, movie_id, rating_sum=0, rating_count=0, review_count=0, average=None
+    ):
+        self.movie_id = movie_id
+        self.rating_sum = rating_sum
+        self.rating_count = rating_count
+        self.review_count = review_count
+        self.average = average
+
+
+class MovieTrigram(Base):
+    __tablename__ = 'movietrigram'
+    trigram = Column(String(3), primary_key=True)
+    movie_id = Column(Integer, ForeignKey(Movie.id), primary_key=True)
+
+    def __init__(self, trigram, movie_id):
+        self.trigram = trigram
+        self.movie_id = movie_id
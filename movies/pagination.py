@@ -0,0 +1,63 @@
+import base64
+import binascii
+import json
+from typing import Any, Callable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Query
+
+from .models import Movie, MovieStats
+
+DEFAULT_PAGE_SIZE = 20
+CURSOR_KEY = List[Any]
+KEYSET_PAGE = Tuple[List[Any], Optional[str]]
+
+
+def encode_cursor(key: CURSOR_KEY) -> str:
+    data: bytes = json.dumps(key, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(data).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: str, length: int) -> Optional[CURSOR_KEY]:
+    if not cursor:
+        return None
+    try:
+        data: bytes = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        key = json.loads(data)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise ValueError(f'Malformed cursor: {cursor!r}')
+    if not isinstance(key, list) or len(key) != length:
+        raise ValueError(f'Malformed cursor: {cursor!r}')
+    if not all(isinstance(item, (int, float)) for item in key):
+        raise ValueError(f'Malformed cursor: {cursor!r}')
+    return key
+
+
+def seek_by_id(
+    query: Query, after: Optional[CURSOR_KEY], column: Any = Movie.id
+) -> Query:
+    if after is not None:
+        query = query.filter(column > after[0])
+    return query.order_by(column)
+
+
+def seek_by_average(query: Query, after: Optional[CURSOR_KEY]) -> Query:
+    # query must already be ordered by (average desc, id).
+    if after is not None:
+        average, movie_id = after
+        query = query.filter(
+            or_(
+                MovieStats.average < average,
+                and_(MovieStats.average == average, Movie.id > movie_id),
+            )
+        )
+    return query
+
+
+def keyset_page(
+    rows: Sequence[Any], size: int, key: Callable[[Any], CURSOR_KEY]
+) -> KEYSET_PAGE:
+    # Callers fetch size + 1 rows so the last page gets no cursor.
+    if len(rows) > size:
+        return list(rows[:size]), encode_cursor(key(rows[size - 1]))
+    return list(rows), None
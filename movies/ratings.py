@@ -0,0 +1,37 @@
+from typing import Any, Dict, List
+
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import bindparam, text
+
+from .models import MovieRating
+
+# Inserts an empty rating for movies that exist, unless the user has rated them
+# already (SQLite 3.24+, PostgreSQL 9.5+). Writing first takes the write lock,
+# so a rating read back afterwards with FOR UPDATE holds the values this
+# transaction replaces, even when the same rating is written concurrently.
+# Ratings are only empty until the writer that inserted them fills them in.
+INSERT_EMPTY_RATINGS = text(
+    '''
+INSERT INTO movierating (user_id, movie_id)
+SELECT :user_id, movies.id FROM movies WHERE movies.id = :movie_id
+ON CONFLICT (user_id, movie_id) DO NOTHING
+'''
+)
+
+
+def insert_empty_ratings(session: Session, keys: List[Dict[str, int]]) -> None:
+    if keys:
+        session.execute(INSERT_EMPTY_RATINGS, keys)
+
+
+def update_ratings(session: Session, values: List[Dict[str, Any]]) -> None:
+    # Items hold rating_id, new_rating and new_review.
+    if not values:
+        return
+    table = MovieRating.__table__
+    session.execute(
+        table.update()
+        .where(table.c.id == bindparam('rating_id'))
+        .values(rating=bindparam('new_rating'), review=bindparam('new_review')),
+        values,
+    )
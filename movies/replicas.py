@@ -0,0 +1,122 @@
+import hashlib
+import itertools
+import math
+import threading
+import time
+from http import HTTPStatus
+from typing import Callable, Dict, List, Optional
+
+from flask import Flask, Response, g, request
+from sqlalchemy.engine import Engine
+
+REPLICA_POLICIES = ('round_robin', 'least_loaded')
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+WROTE_COOKIE = 'movies_wrote'
+
+
+def _checked_out(engine: Engine) -> int:
+    # Only QueuePool tracks checked out connections; treat others as idle.
+    checkedout: Optional[Callable[[], int]] = getattr(engine.pool, 'checkedout', None)
+    return checkedout() if checkedout is not None else 0
+
+
+class ReplicaSet:
+    def __init__(self, engines: List[Engine], policy: str = 'round_robin') -> None:
+        if policy not in REPLICA_POLICIES:
+            raise ValueError(f'Unknown replica policy: {policy!r}')
+        self.engines = engines
+        self.policy = policy
+        self._counter = itertools.count()
+
+    def __bool__(self) -> bool:
+        return bool(self.engines)
+
+    def choose(self) -> Engine:
+        if self.policy == 'least_loaded':
+            return min(self.engines, key=_checked_out)
+        return self.engines[next(self._counter) % len(self.engines)]
+
+    def dispose(self) -> None:
+        for engine in self.engines:
+            engine.dispose()
+
+
+class ReadYourWrites:
+    # Clients that wrote recently read from the primary until replicas have had
+    # `window` seconds to catch up. Clients are kept as digests of their key,
+    # and are also handed a marker, so other workers pin them too.
+    def __init__(
+        self, window: float = 5.0, clock: Callable[[], float] = time.time
+    ) -> None:
+        self.window = window
+        self._clock = clock
+        self._writes: Dict[bytes, float] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._writes)
+
+    @staticmethod
+    def _key(client: str) -> bytes:
+        return hashlib.sha256(client.encode('utf-8')).digest()
+
+    def wrote(self, client: str) -> None:
+        now: float = self._clock()
+        with self._lock:
+            for key in [key for key, until in self._writes.items() if until <= now]:
+                del self._writes[key]
+            self._writes[self._key(client)] = now + self.window
+
+    def pinned(self, client: str, marker: Optional[str] = None) -> bool:
+        until: Optional[float] = self._writes.get(self._key(client))
+        if marker is not None:
+            try:
+                until = max(until or 0.0, float(marker))
+            except ValueError:
+                pass
+        return until is not None and until > self._clock()
+
+    def marker(self) -> str:
+        # Wall clock time, so any worker can compare it.
+        return f'{self._clock() + self.window:.3f}'
+
+
+def _client() -> str:
+    return request.headers.get('Authorization') or request.remote_addr or ''
+
+
+def route_reads(app: Flask, read_your_writes: ReadYourWrites) -> None:
+    # Imported here: database imports ReplicaSet from this module.
+    from . import database  # pylint: disable=import-outside-toplevel
+
+    @app.before_request
+    def use_replicas() -> None:
+        pinned: bool = read_your_writes.pinned(
+            _client(), request.cookies.get(WROTE_COOKIE)
+        )
+        # Cached responses may have been read from a replica, so clients
+        # reading the primary skip the response cache too.
+        g.pinned = pinned and bool(database.replicas)
+        replica: bool = request.method in SAFE_METHODS and not pinned
+        g.read_only_token = database.read_only.set(replica)
+
+    @app.after_request
+    def pin_writer(response: Response) -> Response:
+        if request.method not in SAFE_METHODS and response.status_code < (
+            HTTPStatus.BAD_REQUEST
+        ):
+            read_your_writes.wrote(_client())
+            response.set_cookie(
+                WROTE_COOKIE,
+                read_your_writes.marker(),
+                max_age=math.ceil(read_your_writes.window),
+                httponly=True,
+                samesite='Lax',
+            )
+        return response
+
+    @app.teardown_request
+    def reset_replicas(error: Optional[BaseException]) -> None:
+        token = g.pop('read_only_token', None)
+        if token is not None:
+            database.read_only.reset(token)
@@ -0,0 +1,187 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from typing import Any, Callable, Dict, Iterable, List, Mapping, NamedTuple, Optional
+from urllib.parse import urlencode
+
+from flask import Request, Response, g, make_response, request
+
+from .database import reads_replica
+from .streaming import stream_format
+
+TAGS = Callable[..., Iterable[str]]
+
+
+class MemoryBackend:
+    def __init__(self, maxsize: int = 1024) -> None:
+        self.maxsize = maxsize
+        self._entries: 'OrderedDict[str, Any]' = OrderedDict()
+        # Tag versions live outside the LRU, or an eviction could undo a bump.
+        self._counters: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            if key in self._counters:
+                return str(self._counters[key]).encode('ascii')
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[1] is not None and entry[1] <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def set(self, key: str, value: bytes, ex: Optional[int] = None) -> None:
+        expires: Optional[float] = None if ex is None else time.monotonic() + ex
+        with self._lock:
+            self._entries[key] = (value, expires)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def incr(self, key: str) -> int:
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + 1
+            return self._counters[key]
+
+
+class RedisBackend:
+    # Works with redis.Redis or any client with the same get/set/incr calls,
+    # e.g. fakeredis when running locally.
+    def __init__(self, client: Any, prefix: str = 'movies:') -> None:
+        self.client = client
+        self.prefix = prefix
+
+    @classmethod
+    def from_url(cls, url: str) -> 'RedisBackend':
+        import redis  # pylint: disable=import-outside-toplevel
+
+        return cls(redis.Redis.from_url(url))
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self.client.get(self.prefix + key)
+
+    def set(self, key: str, value: bytes, ex: Optional[int] = None) -> None:
+        self.client.set(self.prefix + key, value, ex=ex)
+
+    def incr(self, key: str) -> int:
+        return self.client.incr(self.prefix + key)
+
+
+def make_backend(config: Mapping[str, Any]) -> Any:
+    kind: Optional[str] = config.get('RESPONSE_CACHE')
+    if not kind:
+        return None
+    if kind == 'memory':
+        return MemoryBackend(config.get('RESPONSE_CACHE_SIZE', 1024))
+    if kind == 'redis':
+        return RedisBackend.from_url(config['RESPONSE_CACHE_URL'])
+    raise ValueError(f'Unknown response cache backend: {kind!r}')
+
+
+class CachedResponse(NamedTuple):
+    body: bytes
+    status: int
+    mimetype: str
+    etag: str
+    stored_at: float
+    versions: List[int]
+
+
+def cache_key(req: Request) -> str:
+    args = sorted((name, value) for name, value in req.args.items(multi=True))
+    return f'response:{req.path}?{urlencode(args)}'
+
+
+class ResponseCache:
+    def __init__(
+        self,
+        backend: Any = None,
+        ttl: Optional[int] = 300,
+        replica_ttl: Optional[int] = None,
+    ) -> None:
+        self.backend = backend
+        self.ttl = ttl
+        # Responses read from a replica may miss writes the tag versions
+        # already count, so they are kept no longer than replicas may lag.
+        self.replica_ttl = replica_ttl
+        self.hits = 0
+        self.misses = 0
+
+    def versions(self, tags: List[str]) -> List[int]:
+        return [int(self.backend.get(f'tag:{tag}') or 0) for tag in tags]
+
+    def invalidate(self, *tags: str) -> None:
+        if self.backend is not None:
+            for tag in tags:
+                self.backend.incr(f'tag:{tag}')
+
+    def load(self, key: str, versions: List[int]) -> Optional[CachedResponse]:
+        data: Optional[bytes] = self.backend.get(key)
+        if data is not None:
+            head, body = data.split(b'\n', 1)
+            entry = CachedResponse(body, *json.loads(head))
+            if entry.versions == versions:
+                self.hits += 1
+                return entry
+        self.misses += 1
+        return None
+
+    def store(
+        self, key: str, versions: List[int], response: Response, replica: bool = False
+    ) -> CachedResponse:
+        # versions must be read before the response was rendered, so a write
+        # racing with the request leaves the stored entry already stale.
+        body: bytes = response.get_data()
+        entry = CachedResponse(
+            body,
+            response.status_code,
+            response.mimetype,
+            hashlib.sha1(body).hexdigest(),
+            time.time(),
+            versions,
+        )
+        head: bytes = json.dumps(list(entry[1:])).encode('utf-8')
+        ttl: Optional[int] = self.ttl
+        if replica and self.replica_ttl is not None:
+            ttl = self.replica_ttl if ttl is None else min(ttl, self.replica_ttl)
+        self.backend.set(key, head + b'\n' + body, ex=ttl)
+        return entry
+
+    def stats(self) -> Dict[str, int]:
+        return {'hits': self.hits, 'misses': self.misses}
+
+
+def _conditional(entry: CachedResponse) -> Response:
+    response = Response(entry.body, status=entry.status, mimetype=entry.mimetype)
+    response.set_etag(entry.etag)
+    response.last_modified = int(entry.stored_at)
+    return response.make_conditional(request)
+
+
+def cached(cache: ResponseCache, tags: TAGS) -> Callable[[Callable], Callable]:
+    def decorator(view: Callable[..., Response]) -> Callable[..., Response]:
+        @wraps(view)
+        def wrapper(*args: Any, **kwargs: Any) -> Response:
+            # Clients that just wrote read the primary, and an entry rendered
+            # from a replica may not have their write yet.
+            if cache.backend is None or stream_format(request) or g.get('pinned'):
+                return view(*args, **kwargs)
+            key: str = cache_key(request)
+            versions: List[int] = cache.versions(list(tags(request.args, **kwargs)))
+            entry: Optional[CachedResponse] = cache.load(key, versions)
+            if entry is None:
+                response: Response = make_response(view(*args, **kwargs))
+                if response.status_code != 200 or response.is_streamed:
+                    return response
+                entry = cache.store(key, versions, response, reads_replica())
+            return _conditional(entry)
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,73 @@
+import re
+from typing import Set
+
+from sqlalchemy.orm import Query, Session
+from sqlalchemy.sql import case, func
+
+from .models import Movie, MovieTrigram
+
+TRIGRAM_SIZE = 3
+MATCH_MODES = ('substring', 'prefix', 'ranked')
+
+
+def trigrams(text: str) -> Set[str]:
+    # LIKE wildcards in a search term match anything, so only the literal
+    # segments around them can be looked up in the index.
+    result: Set[str] = set()
+    for segment in re.split('[%_]', text.lower()):
+        result.update(
+            segment[i : i + TRIGRAM_SIZE]
+            for i in range(len(segment) - TRIGRAM_SIZE + 1)
+        )
+    return result
+
+
+def index_movie(session: Session, movie: Movie) -> None:
+    session.add_all(MovieTrigram(trigram, movie.id) for trigram in trigrams(movie.name))
+
+
+def rebuild_search_index(session: Session) -> int:
+    session.query(MovieTrigram).delete(synchronize_session=False)
+    count: int = 0
+    for movie in session.query(Movie).yield_per(1000):
+        index_movie(session, movie)
+        count += 1
+    return count
+
+
+def ensure_search_index(session: Session) -> None:
+    if session.query(MovieTrigram.movie_id).first() is not None:
+        return
+    if session.query(Movie.id).first() is not None:
+        rebuild_search_index(session)
+
+
+def search_movies(query: Query, substring: str, match: str = 'substring') -> Query:
+    if match not in MATCH_MODES:
+        raise ValueError(f'Unknown match mode: {match!r}')
+    if match == 'prefix':
+        query = query.filter(Movie.name.startswith(substring))
+    else:
+        query = query.filter(Movie.name.contains(substring))
+    grams: Set[str] = trigrams(substring)
+    if grams:
+        candidates: Query = (
+            query.session.query(MovieTrigram.movie_id)
+            .filter(MovieTrigram.trigram.in_(grams))
+            .group_by(MovieTrigram.movie_id)
+            .having(func.count() == len(grams))
+        )
+        query = query.filter(Movie.id.in_(candidates.subquery()))
+    if match == 'ranked':
+        name = func.lower(Movie.name)
+        query = query.order_by(
+            case(
+                [
+                    (name == substring.lower(), 0),
+                    (name.startswith(substring.lower()), 1),
+                ],
+                else_=2,
+            ),
+            func.length(Movie.name),
+        )
+    return query
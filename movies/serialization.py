@@ -0,0 +1,108 @@
+import json
+import re
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Mapping, Tuple
+
+from flask.json import JSONEncoder
+
+JSON_PROVIDERS = ('auto', 'orjson', 'json')
+DUMPS = Callable[[Any], bytes]
+# orjson writes 1e16 and 1e-5 where json.dumps writes 1e+16 and 1e-05.
+EXPONENT = re.compile(rb'[0-9]e')
+
+
+def _json_dumps(obj: Any) -> bytes:
+    # What jsonify writes with the default JSON_* settings, minus the newline.
+    return json.dumps(
+        obj, cls=JSONEncoder, sort_keys=True, separators=(',', ':')
+    ).encode('ascii')
+
+
+def _orjson_dumps() -> DUMPS:
+    import orjson  # pylint: disable=import-outside-toplevel
+
+    # Dates and dataclasses go through Flask's encoder so they come out the same.
+    options: int = (
+        orjson.OPT_SORT_KEYS
+        | orjson.OPT_PASSTHROUGH_DATETIME
+        | orjson.OPT_PASSTHROUGH_DATACLASS
+    )
+    default: Callable[[Any], Any] = JSONEncoder().default
+
+    def dumps(obj: Any) -> bytes:
+        data: bytes = orjson.dumps(obj, default=default, option=options)
+        # orjson can't escape non-ASCII text the way json.dumps does, and
+        # formats exponents differently; both are rare in API responses.
+        if data.isascii() and not EXPONENT.search(data):
+            return data
+        return _json_dumps(obj)
+
+    return dumps
+
+
+def compatible(config: Mapping[str, Any], debug: bool = False) -> bool:
+    # Other JSON_* settings change jsonify's output, which is then used instead.
+    return (
+        config['JSON_SORT_KEYS']
+        and config['JSON_AS_ASCII']
+        and not (config['JSONIFY_PRETTYPRINT_REGULAR'] or debug)
+    )
+
+
+class JsonWriter:
+    # Writes the same bytes as jsonify. List items can be passed as fragments,
+    # encoded once and cached by their values, so a listing only joins them.
+    def __init__(
+        self, provider: str = 'auto', fragment_cache_size: int = 65536
+    ) -> None:
+        self.configure(provider, fragment_cache_size)
+
+    def configure(self, provider: str, fragment_cache_size: int) -> None:
+        if provider not in JSON_PROVIDERS:
+            raise ValueError(f'Unknown JSON provider: {provider!r}')
+        self.dumps: DUMPS = _json_dumps
+        self.provider: str = 'json'
+        if provider != 'json':
+            try:
+                self.dumps = _orjson_dumps()
+                self.provider = 'orjson'
+            except ImportError:
+                if provider == 'orjson':
+                    raise
+        self.fragment_cache_size = fragment_cache_size
+        self._encoders: Dict[Tuple[str, ...], Any] = {}
+
+    def fragment_encoder(self, *names: str) -> Callable[..., bytes]:
+        # Returns encode(*values) for objects with these keys.
+        encoder: Any = self._encoders.get(names)
+        if encoder is None:
+            dumps: DUMPS = self.dumps
+            encoder = lru_cache(self.fragment_cache_size)(
+                lambda *values: dumps(dict(zip(names, values)))
+            )
+            self._encoders[names] = encoder
+        return encoder
+
+    def document(
+        self, fields: Dict[str, Any], key: str, fragments: List[bytes]
+    ) -> bytes:
+        parts: List[bytes] = []
+        for name in sorted([*fields, key]):
+            value: bytes = (
+                b'[' + b','.join(fragments) + b']'
+                if name == key
+                else self.dumps(fields[name])
+            )
+            parts.append(self.dumps(name) + b':' + value)
+        return b'{' + b','.join(parts) + b'}'
+
+    def stats(self) -> Dict[str, float]:
+        infos = [encoder.cache_info() for encoder in self._encoders.values()]
+        return {
+            'fragments': sum(info.currsize for info in infos),
+            'hits': sum(info.hits for info in infos),
+            'misses': sum(info.misses for info in infos),
+        }
+
+
+json_writer: JsonWriter = JsonWriter()
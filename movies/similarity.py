@@ -0,0 +1,317 @@
+import datetime
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+from scipy import sparse
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import select
+
+from .analytics import (
+    META_FILE,
+    generation_path,
+    integer_rows,
+    new_generation,
+    publish,
+    read_meta,
+)
+from .models import MovieRating
+
+SIMILARITY_METHODS = ('adjusted_cosine', 'cosine')
+NO_NEIGHBOUR = -1
+# Refreshes touching more movies than this fraction rebuild everything.
+MAX_REFRESH_FRACTION = 0.25
+# Rows of rating id, user id, movie id, rating.
+RATINGS = np.ndarray
+
+
+class SimilarityIndex(NamedTuple):
+    # Row i holds the neighbours of movie_ids[i], best first, padded with
+    # NO_NEIGHBOUR.
+    movie_ids: np.ndarray
+    neighbours: np.ndarray
+    scores: np.ndarray
+
+
+def read_ratings(session: Session, chunk_size: int = 50000) -> RATINGS:
+    statement = select(
+        [MovieRating.id, MovieRating.user_id, MovieRating.movie_id, MovieRating.rating]
+    ).where(MovieRating.rating.isnot(None))
+    chunks: List[np.ndarray] = list(integer_rows(session, statement, chunk_size))
+    return np.concatenate(chunks) if chunks else np.zeros((0, 4), np.int64)
+
+
+def rating_matrix(ratings: RATINGS, method: str) -> Tuple[np.ndarray, Any]:
+    # Users x movies with unit-length columns, so a dot product of two columns
+    # is their cosine similarity.
+    if method not in SIMILARITY_METHODS:
+        raise ValueError(f'Unknown similarity method: {method!r}')
+    movie_ids, columns = np.unique(ratings[:, 2], return_inverse=True)
+    user_ids, rows = np.unique(ratings[:, 1], return_inverse=True)
+    values: np.ndarray = ratings[:, 3].astype(np.float64)
+    if method == 'adjusted_cosine':
+        # Without each user's mean, generous and harsh raters look alike.
+        means: np.ndarray = np.bincount(rows, values) / np.bincount(rows)
+        values = values - means[rows]
+    matrix = sparse.csc_matrix(
+        (values, (rows, columns)), shape=(len(user_ids), len(movie_ids))
+    )
+    norms: np.ndarray = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=0)))
+    with np.errstate(divide='ignore'):
+        scale: np.ndarray = np.where(norms > 0, 1 / norms, 0.0).ravel()
+    return movie_ids.astype(np.int32), (matrix @ sparse.diags(scale)).tocsc()
+
+
+_worker_matrices: Tuple[Any, Any] = (None, None)
+
+
+def _init_worker(matrices: Tuple[Any, Any]) -> None:
+    global _worker_matrices  # pylint: disable=global-statement
+    _worker_matrices = matrices
+
+
+def _top_k(positions: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    # Neighbour positions and scores for the movies at positions.
+    movies_by_user, users_by_movie = _worker_matrices
+    products = (movies_by_user[positions] @ users_by_movie).tocsr()
+    neighbours: np.ndarray = np.full((len(positions), k), NO_NEIGHBOUR, np.int64)
+    scores: np.ndarray = np.zeros((len(positions), k), np.float32)
+    for row, position in enumerate(positions):
+        start, stop = products.indptr[row], products.indptr[row + 1]
+        columns: np.ndarray = products.indices[start:stop]
+        values: np.ndarray = products.data[start:stop]
+        keep: np.ndarray = (values > 1e-9) & (columns != position)
+        columns, values = columns[keep], values[keep]
+        if len(values) > k:
+            best: np.ndarray = np.argpartition(-values, k - 1)[:k]
+            columns, values = columns[best], values[best]
+        order: np.ndarray = np.lexsort((columns, -values))
+        neighbours[row, : len(order)] = columns[order]
+        scores[row, : len(order)] = values[order]
+    return neighbours, scores
+
+
+def top_neighbours(
+    matrix: Any, positions: np.ndarray, k: int, workers: int, chunk_size: int
+) -> Tuple[np.ndarray, np.ndarray]:
+    # Chunks of movies are multiplied against the whole matrix, in a process
+    # pool of `workers` processes, or here when it is 0.
+    matrices: Tuple[Any, Any] = (matrix.T.tocsr(), matrix.tocsr())
+    chunks: List[np.ndarray] = [
+        positions[start : start + chunk_size]
+        for start in range(0, len(positions), chunk_size)
+    ]
+    if not chunks:
+        return np.zeros((0, k), np.int64), np.zeros((0, k), np.float32)
+    # Starting the pool costs more than a chunk per worker takes to compute.
+    if workers and len(chunks) > workers:
+        with ProcessPoolExecutor(
+            workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker,
+            initargs=(matrices,),
+        ) as pool:
+            parts = list(pool.map(_top_k, chunks, [k] * len(chunks)))
+    else:
+        _init_worker(matrices)
+        try:
+            parts = [_top_k(chunk, k) for chunk in chunks]
+        finally:
+            _init_worker((None, None))
+    return (
+        np.concatenate([part[0] for part in parts]),
+        np.concatenate([part[1] for part in parts]),
+    )
+
+
+def _movie_ids(movie_ids: np.ndarray, positions: np.ndarray) -> np.ndarray:
+    return np.where(positions >= 0, movie_ids[positions], NO_NEIGHBOUR).astype(np.int32)
+
+
+def build_index(
+    ratings: RATINGS,
+    k: int = 20,
+    method: str = 'adjusted_cosine',
+    workers: int = 0,
+    chunk_size: int = 128,
+) -> SimilarityIndex:
+    if not len(ratings):
+        return SimilarityIndex(
+            np.zeros(0, np.int32),
+            np.zeros((0, k), np.int32),
+            np.zeros((0, k), np.float32),
+        )
+    movie_ids, matrix = rating_matrix(ratings, method)
+    positions, scores = top_neighbours(
+        matrix, np.arange(len(movie_ids)), k, workers, chunk_size
+    )
+    return SimilarityIndex(movie_ids, _movie_ids(movie_ids, positions), scores)
+
+
+def _changed_movies(ratings: RATINGS, new: RATINGS, method: str) -> np.ndarray:
+    if method == 'cosine':
+        return np.unique(new[:, 2])
+    # A new rating moves its user's mean, and with it all of their ratings.
+    return np.unique(ratings[np.isin(ratings[:, 1], new[:, 1]), 2])
+
+
+def refresh_index(
+    index: SimilarityIndex,
+    ratings: RATINGS,
+    since_rating_id: int,
+    method: str = 'adjusted_cosine',
+    workers: int = 0,
+    chunk_size: int = 128,
+) -> SimilarityIndex:
+    # Recomputes the movies affected by ratings with ids above since_rating_id
+    # and merges their new scores into the other movies' neighbours. Other
+    # neighbours are kept as they were, so changed or deleted ratings are only
+    # picked up by a full build.
+    k: int = index.neighbours.shape[1]
+    new: RATINGS = ratings[ratings[:, 0] > since_rating_id]
+    if not len(new):
+        return index
+    movie_ids, matrix = rating_matrix(ratings, method)
+    affected: np.ndarray = np.searchsorted(
+        movie_ids, _changed_movies(ratings, new, method)
+    )
+    if len(affected) > MAX_REFRESH_FRACTION * len(movie_ids):
+        return build_index(ratings, k, method, workers, chunk_size)
+
+    neighbours: np.ndarray = np.full((len(movie_ids), k), NO_NEIGHBOUR, np.int32)
+    scores: np.ndarray = np.zeros((len(movie_ids), k), np.float32)
+    old_rows: np.ndarray = np.searchsorted(index.movie_ids, movie_ids)
+    indexed: np.ndarray = old_rows < len(index.movie_ids)
+    indexed[indexed] = index.movie_ids[old_rows[indexed]] == movie_ids[indexed]
+    neighbours[indexed] = index.neighbours[old_rows[indexed]]
+    scores[indexed] = index.scores[old_rows[indexed]]
+
+    # Scores of every movie against the affected ones, a column per movie.
+    affected_ids: np.ndarray = movie_ids[affected]
+    cross = (matrix.T.tocsr() @ matrix[:, affected]).tocsr()
+    stale: np.ndarray = np.isin(neighbours, affected_ids)
+    touched: np.ndarray = (np.diff(cross.indptr) > 0) | stale.any(axis=1)
+    touched[affected] = False
+    for row in np.flatnonzero(touched):
+        start, stop = cross.indptr[row], cross.indptr[row + 1]
+        keep: np.ndarray = (neighbours[row] != NO_NEIGHBOUR) & ~stale[row]
+        ids: np.ndarray = np.concatenate(
+            [neighbours[row][keep], affected_ids[cross.indices[start:stop]]]
+        )
+        values: np.ndarray = np.concatenate(
+            [scores[row][keep], cross.data[start:stop].astype(np.float32)]
+        )
+        positive: np.ndarray = (values > 1e-9) & (ids != movie_ids[row])
+        ids, values = ids[positive], values[positive]
+        order: np.ndarray = np.lexsort((ids, -values))[:k]
+        neighbours[row] = NO_NEIGHBOUR
+        scores[row] = 0
+        neighbours[row, : len(order)] = ids[order]
+        scores[row, : len(order)] = values[order]
+
+    positions, affected_scores = top_neighbours(
+        matrix, affected, k, workers, chunk_size
+    )
+    neighbours[affected] = _movie_ids(movie_ids, positions)
+    scores[affected] = affected_scores
+    return SimilarityIndex(movie_ids, neighbours, scores)
+
+
+def save_index(directory: str, index: SimilarityIndex, meta: Dict[str, Any]) -> None:
+    # Written into a new generation, so loaders see either index, never a mix.
+    generation: str = new_generation(directory)
+    for name, values in index._asdict().items():
+        np.save(os.path.join(generation, f'{name}.npy'), values)
+    publish(directory, generation, meta)
+
+
+def load_index(directory: str, meta: Dict[str, Any]) -> SimilarityIndex:
+    generation: str = generation_path(directory, meta)
+    return SimilarityIndex(
+        *(
+            np.load(os.path.join(generation, f'{name}.npy'), mmap_mode='r')
+            for name in SimilarityIndex._fields
+        )
+    )
+
+
+def build_similarity(
+    session: Session,
+    directory: str,
+    k: int = 20,
+    method: str = 'adjusted_cosine',
+    workers: int = 0,
+    chunk_size: int = 128,
+    full: bool = False,
+) -> Dict[str, Any]:
+    # Refreshes the index in directory when it was built with the same k and
+    # method, and builds it from scratch otherwise.
+    started: float = time.perf_counter()
+    ratings: RATINGS = read_ratings(session)
+    previous: Optional[Dict[str, Any]] = None
+    if not full and os.path.exists(os.path.join(directory, META_FILE)):
+        previous = read_meta(directory)
+        if (previous['k'], previous['method']) != (k, method):
+            previous = None
+    if previous is None:
+        index: SimilarityIndex = build_index(ratings, k, method, workers, chunk_size)
+    else:
+        index = refresh_index(
+            load_index(directory, previous),
+            ratings,
+            previous['last_rating_id'],
+            method,
+            workers,
+            chunk_size,
+        )
+    meta: Dict[str, Any] = {
+        'created_at': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        'method': method,
+        'k': k,
+        'movies': len(index.movie_ids),
+        'ratings': len(ratings),
+        'last_rating_id': int(ratings[:, 0].max()) if len(ratings) else 0,
+        'refreshed': previous is not None,
+        'seconds': round(time.perf_counter() - started, 3),
+    }
+    save_index(directory, index, meta)
+    return meta
+
+
+class SimilarMovies:
+    # A memory-mapped index; only the rows that are read get loaded.
+    def __init__(self, directory: str) -> None:
+        self.meta: Dict[str, Any] = read_meta(directory)
+        self._index: SimilarityIndex = load_index(directory, self.meta)
+
+    def similar(self, movie_id: int, k: int) -> List[Tuple[int, float]]:
+        movie_ids: np.ndarray = self._index.movie_ids
+        position: int = int(np.searchsorted(movie_ids, movie_id))
+        if position == len(movie_ids) or movie_ids[position] != movie_id:
+            return []
+        neighbours: List[int] = self._index.neighbours[position, :k].tolist()
+        scores: List[float] = self._index.scores[position, :k].tolist()
+        return [
+            (neighbour, score)
+            for neighbour, score in zip(neighbours, scores)
+            if neighbour != NO_NEIGHBOUR
+        ]
+
+
+_loaded: Dict[str, Tuple[int, SimilarMovies]] = {}
+_loaded_lock = threading.Lock()
+
+
+def load_similar_movies(directory: str) -> SimilarMovies:
+    # Reloaded when a new build replaces meta.json.
+    version: int = os.stat(os.path.join(directory, META_FILE)).st_mtime_ns
+    with _loaded_lock:
+        loaded: Optional[Tuple[int, SimilarMovies]] = _loaded.get(directory)
+        if loaded is None or loaded[0] != version:
+            loaded = (version, SimilarMovies(directory))
+            _loaded[directory] = loaded
+        return loaded[1]
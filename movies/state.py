@@ -0,0 +1,36 @@
+from typing import NamedTuple
+
+from flask import current_app
+from werkzeug.local import LocalProxy
+
+from .catalog import MovieCatalog
+from .instrumentation import Metrics
+from .leaderboard import Leaderboard
+from .response_cache import ResponseCache
+from .tokens import TokenSigner
+from .write_behind import RatingQueue
+
+
+class AppState(NamedTuple):
+    # Built by create_app() and kept in app.extensions, so two apps in one
+    # process don't share keys, caches or queues.
+    token_signer: TokenSigner
+    leaderboard: Leaderboard
+    response_cache: ResponseCache
+    catalog: MovieCatalog
+    metrics: Metrics
+    rating_queue: RatingQueue
+
+
+def app_state() -> AppState:
+    return current_app.extensions['movies']
+
+
+# The current app's objects, for code that runs in an app context.
+token_signer: TokenSigner = LocalProxy(lambda: app_state().token_signer)  # type: ignore
+leaderboard: Leaderboard = LocalProxy(lambda: app_state().leaderboard)  # type: ignore
+response_cache: ResponseCache = LocalProxy(  # type: ignore
+    lambda: app_state().response_cache
+)
+catalog: MovieCatalog = LocalProxy(lambda: app_state().catalog)  # type: ignore
+rating_queue: RatingQueue = LocalProxy(lambda: app_state().rating_queue)  # type: ignore
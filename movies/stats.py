@@ -0,0 +1,124 @@
+from typing import Collection, Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import Select, bindparam, func, select
+
+from .models import Movie, MovieRating, MovieStats
+
+RATING_VALUES = Tuple[Optional[int], Optional[str]]
+STATS_VALUES = Tuple[Optional[float], int]
+STATS_DELTA = Tuple[int, int, int]
+# rating_sum, rating_count, review_count, average
+STATS_ROW = Tuple[int, int, int, Optional[float]]
+STATS_COLUMNS = ['movie_id', 'rating_sum', 'rating_count', 'review_count', 'average']
+
+
+def _aggregates() -> Select:
+    return (
+        select(
+            [
+                Movie.id,
+                func.coalesce(func.sum(MovieRating.rating), 0),
+                func.count(MovieRating.rating),
+                func.count(MovieRating.review),
+                func.avg(MovieRating.rating),
+            ]
+        )
+        .select_from(Movie.__table__.outerjoin(MovieRating.__table__))
+        .group_by(Movie.id)
+    )
+
+
+def _rating(value: Optional[object]) -> Optional[int]:
+    return None if value is None else int(value)  # type: ignore
+
+
+def build_movie_stats(session: Session, movie_id: int) -> MovieStats:
+    row = session.execute(_aggregates().where(Movie.id == movie_id)).first()
+    stats: MovieStats = MovieStats(*row) if row else MovieStats(movie_id)
+    session.add(stats)
+    return stats
+
+
+def aggregate_movie_stats(
+    session: Session, movie_ids: Collection[int]
+) -> Dict[int, STATS_ROW]:
+    # Computed from the ratings, without building MovieStats rows.
+    rows = session.execute(_aggregates().where(Movie.id.in_(movie_ids)))
+    return {row[0]: tuple(row[1:]) for row in rows}  # type: ignore
+
+
+def stats_delta(old: RATING_VALUES, new: RATING_VALUES) -> STATS_DELTA:
+    old_rating, new_rating = _rating(old[0]), _rating(new[0])
+    return (
+        (new_rating or 0) - (old_rating or 0),
+        (new_rating is not None) - (old_rating is not None),
+        (new[1] is not None) - (old[1] is not None),
+    )
+
+
+def apply_stats_deltas(session: Session, deltas: Dict[int, STATS_DELTA]) -> None:
+    params: List[Dict[str, int]] = [
+        {
+            'movie': movie_id,
+            'sum_delta': delta[0],
+            'count_delta': delta[1],
+            'review_delta': delta[2],
+        }
+        for movie_id, delta in deltas.items()
+        if any(delta)
+    ]
+    if not params:
+        return
+    table = MovieStats.__table__
+    rating_count = table.c.rating_count + bindparam('count_delta')
+    # Relative UPDATE so concurrent writers never lose each other's deltas.
+    statement = (
+        table.update()
+        .where(table.c.movie_id == bindparam('movie'))
+        .values(
+            rating_sum=table.c.rating_sum + bindparam('sum_delta'),
+            rating_count=rating_count,
+            review_count=table.c.review_count + bindparam('review_delta'),
+            average=(table.c.rating_sum + bindparam('sum_delta'))
+            * 1.0
+            / func.nullif(rating_count, 0),
+        )
+    )
+    session.execute(statement, params)
+
+
+def ensure_movie_stats(session: Session, movie_ids: Iterable[int]) -> None:
+    missing: Set[int] = set(movie_ids)
+    for (movie_id,) in session.query(MovieStats.movie_id).filter(
+        MovieStats.movie_id.in_(missing)
+    ):
+        missing.discard(movie_id)
+    if missing:
+        session.flush()
+    for movie_id in missing:
+        build_movie_stats(session, movie_id)
+
+
+def update_movie_stats(
+    session: Session, movie_id: int, old: RATING_VALUES, new: RATING_VALUES
+) -> STATS_VALUES:
+    apply_stats_deltas(session, {movie_id: stats_delta(old, new)})
+    values: Optional[STATS_VALUES] = (
+        session.query(MovieStats.average, MovieStats.rating_count)
+        .filter(MovieStats.movie_id == movie_id)
+        .first()
+    )
+    if values is None:
+        session.flush()
+        stats: MovieStats = build_movie_stats(session, movie_id)
+        return stats.average, stats.rating_count
+    return values
+
+
+def rebuild_movie_stats(session: Session) -> int:
+    session.query(MovieStats).delete(synchronize_session=False)
+    session.execute(
+        MovieStats.__table__.insert().from_select(STATS_COLUMNS, _aggregates())
+    )
+    return session.query(MovieStats).count()
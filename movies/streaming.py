@@ -0,0 +1,95 @@
+import json
+from typing import Any, Callable, Dict, Iterator, Optional
+
+from flask import Request, Response
+from sqlalchemy.orm import Query
+
+from .database import create_session, read_only
+
+JSON = 'application/json'
+NDJSON = 'application/x-ndjson'
+STREAM_BATCH_SIZE = 1000
+SERIALIZER = Callable[[Any], Dict[str, Any]]
+
+
+def stream_format(request: Request) -> Optional[str]:
+    stream: Optional[str] = request.args.get('stream')
+    if stream == 'ndjson' or (
+        request.accept_mimetypes.best_match([JSON, NDJSON]) == NDJSON
+    ):
+        return NDJSON
+    if stream:
+        return JSON
+    return None
+
+
+def _iter_rows(query: Query, batch_size: int, readonly: bool) -> Iterator[Any]:
+    # The handler's session is closed before the body is sent, so rows are
+    # read through a session owned by the generator. The request context is
+    # gone by then too, so the replica choice is made when the body is built.
+    with create_session(readonly) as session:
+        rows = (
+            query.with_session(session)
+            .execution_options(stream_results=True)
+            .yield_per(batch_size)
+        )
+        yield from rows
+
+
+def _chunks(
+    query: Query,
+    serialize: SERIALIZER,
+    separator: str,
+    batch_size: int,
+    readonly: bool,
+) -> Iterator[str]:
+    chunk = []
+    for row in _iter_rows(query, batch_size, readonly):
+        chunk.append(json.dumps(serialize(row)))
+        if len(chunk) == batch_size:
+            yield separator.join(chunk)
+            chunk = []
+    if chunk:
+        yield separator.join(chunk)
+
+
+def _ndjson(
+    query: Query, serialize: SERIALIZER, batch_size: int, readonly: bool
+) -> Iterator[bytes]:
+    for chunk in _chunks(query, serialize, '\n', batch_size, readonly):
+        yield (chunk + '\n').encode('utf-8')
+
+
+def _json(
+    query: Query,
+    serialize: SERIALIZER,
+    batch_size: int,
+    key: str,
+    fields: Dict[str, Any],
+    readonly: bool,
+) -> Iterator[bytes]:
+    head: str = ''.join(
+        f'{json.dumps(name)}: {json.dumps(value)}, ' for name, value in fields.items()
+    )
+    yield f'{{{head}{json.dumps(key)}: ['.encode('utf-8')
+    separator: str = ''
+    for chunk in _chunks(query, serialize, ', ', batch_size, readonly):
+        yield (separator + chunk).encode('utf-8')
+        separator = ', '
+    yield b']}'
+
+
+def stream_response(
+    query: Query,
+    serialize: SERIALIZER,
+    mimetype: str,
+    key: str,
+    fields: Optional[Dict[str, Any]] = None,
+    batch_size: int = STREAM_BATCH_SIZE,
+) -> Response:
+    readonly: bool = read_only.get()
+    if mimetype == NDJSON:
+        body: Iterator[bytes] = _ndjson(query, serialize, batch_size, readonly)
+    else:
+        body = _json(query, serialize, batch_size, key, fields or {}, readonly)
+    return Response(body, mimetype=mimetype)
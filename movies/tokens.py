@@ -0,0 +1,121 @@
+import base64
+import binascii
+import hashlib
+import hmac
+import json
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Mapping, NamedTuple, Optional, Tuple
+
+TOKEN_KEY = Tuple[str, bytes]
+
+
+class TokenClaims(NamedTuple):
+    user_id: int
+    username: str
+    expires: int
+    token_id: str
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).decode('ascii').rstrip('=')
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + '=' * (-len(data) % 4))
+
+
+class DenyList:
+    # Revoked token ids are only kept until the token would have expired anyway.
+    def __init__(self, clock: Callable[[], float] = time.time) -> None:
+        self._clock = clock
+        self._entries: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, token_id: str) -> bool:
+        return token_id in self._entries
+
+    def add(self, token_id: str, expires: int) -> None:
+        now: float = self._clock()
+        with self._lock:
+            for expired in [id for id, exp in self._entries.items() if exp <= now]:
+                del self._entries[expired]
+            if expires > now:
+                self._entries[token_id] = expires
+
+
+class TokenSigner:
+    # Tokens are signed with the first key; the others are still accepted so
+    # keys can be rotated without logging everybody out.
+    def __init__(
+        self,
+        keys: Optional[Mapping[str, Any]] = None,
+        ttl: int = 900,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self._clock = clock
+        self.deny_list = DenyList(clock)
+        self.configure(keys, ttl)
+
+    def configure(self, keys: Optional[Mapping[str, Any]], ttl: int) -> None:
+        if keys:
+            self._keys: List[TOKEN_KEY] = [
+                (kid, secret.encode('utf-8') if isinstance(secret, str) else secret)
+                for kid, secret in keys.items()
+            ]
+        else:
+            # Without configured keys tokens only work in this process.
+            self._keys = [(_b64encode(os.urandom(6)), os.urandom(32))]
+        self.ttl = ttl
+
+    @property
+    def key_ids(self) -> List[str]:
+        return [kid for kid, _ in self._keys]
+
+    def rotate(self, kid: str, secret: bytes, keep: int = 2) -> None:
+        self._keys = [(kid, secret)] + self._keys[: keep - 1]
+
+    def _sign(self, secret: bytes, payload: str) -> str:
+        return _b64encode(
+            hmac.new(secret, payload.encode('ascii'), hashlib.sha256).digest()
+        )
+
+    def issue(self, user_id: int, username: str) -> Tuple[str, int]:
+        kid, secret = self._keys[0]
+        expires: int = int(self._clock()) + self.ttl
+        claims: Dict[str, Any] = {
+            'kid': kid,
+            'sub': user_id,
+            'usr': username,
+            'exp': expires,
+            'jti': _b64encode(os.urandom(12)),
+        }
+        payload: str = _b64encode(
+            json.dumps(claims, separators=(',', ':')).encode('utf-8')
+        )
+        return f'{payload}.{self._sign(secret, payload)}', expires
+
+    def verify(self, token: str) -> Optional[TokenClaims]:
+        payload, _, signature = token.partition('.')
+        try:
+            claims: Any = json.loads(_b64decode(payload))
+            secret: bytes = dict(self._keys)[claims['kid']]
+            result = TokenClaims(
+                claims['sub'], claims['usr'], claims['exp'], claims['jti']
+            )
+        except (binascii.Error, UnicodeDecodeError, ValueError, TypeError, KeyError):
+            return None
+        # compare_digest only accepts ASCII str, so compare the encoded bytes.
+        expected: bytes = self._sign(secret, payload).encode('ascii')
+        if not hmac.compare_digest(expected, signature.encode('utf-8', 'replace')):
+            return None
+        if result.expires <= self._clock() or result.token_id in self.deny_list:
+            return None
+        return result
+
+    def revoke(self, claims: TokenClaims) -> None:
+        self.deny_list.add(claims.token_id, claims.expires)
@@ -0,0 +1,3 @@
+# Importing the views registers their routes on bp.
+from . import bulk, lookup, movies, ratings, similar, user_ratings, users  # noqa: F401
+from .common import bp  # noqa: F401
@@ -0,0 +1,71 @@
+import time
+from functools import partial
+from http import HTTPStatus
+from typing import Any, Callable, List, Set
+
+from flask import Response, abort, current_app, jsonify, make_response, request
+
+from ..auth import auth, current_user_id, current_username
+from ..bulk import (
+    BULK_RESULT,
+    batched,
+    import_movies,
+    import_ratings,
+    iter_items,
+    summarize,
+)
+from ..database import create_session
+from ..state import catalog, leaderboard, response_cache
+from .common import bp
+
+
+def _bulk_import(
+    importer: Callable[..., List[BULK_RESULT]],
+    invalidate: Callable[[List[BULK_RESULT]], None],
+) -> Response:
+    try:
+        items = iter_items(request)
+    except ValueError:
+        abort(HTTPStatus.BAD_REQUEST)
+    started: float = time.perf_counter()
+    results: List[BULK_RESULT] = []
+    for batch in batched(items, current_app.config['BULK_BATCH_SIZE']):
+        with create_session() as session:
+            batch_results: List[BULK_RESULT] = importer(session, batch, len(results))
+        invalidate(batch_results)
+        results.extend(batch_results)
+    elapsed: float = time.perf_counter() - started
+    return make_response(jsonify(summarize(results, elapsed)), HTTPStatus.OK)
+
+
+@bp.route('/movies/bulk', methods=['POST'])
+@auth.login_required
+def add_movies_bulk() -> Response:
+    return _bulk_import(import_movies, _invalidate_movies)
+
+
+def _invalidate_movies(results: List[BULK_RESULT]) -> None:
+    if any(result['status'] == 'created' for result in results):
+        catalog.invalidate()
+        response_cache.invalidate('movies')
+
+
+def invalidate_ratings(results: List[BULK_RESULT]) -> None:
+    movie_ids: Set[int] = {
+        result['movie_id'] for result in results if result['status'] != 'error'
+    }
+    if movie_ids:
+        response_cache.invalidate(*(f'movie:{id}' for id in movie_ids), 'ratings')
+
+
+@bp.route('/ratings/bulk', methods=['POST'])
+@auth.login_required
+def rate_movies_bulk() -> Response:
+    importer: Any = partial(
+        import_ratings,
+        user_id=current_user_id(),
+        any_user=current_username() in current_app.config['BULK_IMPORT_USERS'],
+    )
+    response: Response = _bulk_import(importer, invalidate_ratings)
+    leaderboard.invalidate()
+    return response
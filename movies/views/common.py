@@ -0,0 +1,43 @@
+from http import HTTPStatus
+from typing import Any, List, Optional
+
+from flask import Blueprint, Response, current_app, jsonify, make_response
+
+from ..instrumentation import timed
+from ..serialization import compatible, json_writer
+
+OPT_STR = Optional[str]
+
+bp: Blueprint = Blueprint('movies', __name__, cli_group=None)
+
+
+def movie_item(movie: Any) -> dict:
+    return {'id': movie.id, 'name': movie.name, 'year': movie.year}
+
+
+def json_body(body: bytes) -> Response:
+    return current_app.response_class(
+        body + b'\n',
+        status=HTTPStatus.OK,
+        mimetype=current_app.config['JSONIFY_MIMETYPE'],
+    )
+
+
+def json_response(result: dict) -> Response:
+    if not compatible(current_app.config, current_app.debug):
+        return make_response(jsonify(result), HTTPStatus.OK)
+    with timed('serialize'):
+        return json_body(json_writer.dumps(result))
+
+
+def movies_response(result: dict, movies: list) -> Response:
+    # Same bytes as jsonify, but each movie is encoded once and then reused.
+    if not compatible(current_app.config, current_app.debug):
+        result['Movies'] = [movie_item(movie) for movie in movies]
+        return make_response(jsonify(result), HTTPStatus.OK)
+    with timed('serialize'):
+        fragment = json_writer.fragment_encoder('id', 'name', 'year')
+        fragments: List[bytes] = [
+            fragment(movie.id, movie.name, movie.year) for movie in movies
+        ]
+        return json_body(json_writer.document(result, 'Movies', fragments))
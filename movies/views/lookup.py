@@ -0,0 +1,38 @@
+from http import HTTPStatus
+from typing import Any, List
+
+from flask import Response, abort, current_app, request
+
+from ..auth import auth
+from ..database import create_session
+from ..lookup import lookup_movies, parse_ids
+from ..response_cache import cached
+from ..state import response_cache
+from .common import bp, json_response
+
+
+def _lookup_response(ids: Any) -> Response:
+    try:
+        movie_ids: List[int] = parse_ids(
+            ids, current_app.config['MOVIE_LOOKUP_MAX_IDS']
+        )
+    except ValueError:
+        abort(HTTPStatus.BAD_REQUEST)
+    with create_session() as session:
+        return json_response({'Movies': lookup_movies(session, movie_ids)})
+
+
+@bp.route('/movies/lookup', methods=['POST'])
+@auth.login_required
+def lookup_movies_post() -> Response:
+    payload: Any = request.get_json(silent=True)
+    if not isinstance(payload, dict) or not isinstance(payload.get('ids'), list):
+        abort(HTTPStatus.BAD_REQUEST)
+    return _lookup_response(payload['ids'])
+
+
+# Authenticated like GET /movies/<id>, so it has to run before the cache.
+@auth.login_required
+@cached(response_cache, lambda args: ['movies', 'ratings'])
+def lookup_movies_get() -> Response:
+    return _lookup_response(request.args['ids'].split(','))
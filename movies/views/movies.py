@@ -0,0 +1,218 @@
+from http import HTTPStatus
+from typing import Any, Optional
+
+from flask import Response, abort, current_app, jsonify, make_response, request
+from sqlalchemy.orm import Query, Session
+from sqlalchemy_pagination import Page, paginate
+
+from ..auth import auth
+from ..database import create_session
+from ..leaderboard import top_movies_query
+from ..models import Movie, MovieStats
+from ..pagination import (
+    CURSOR_KEY,
+    DEFAULT_PAGE_SIZE,
+    KEYSET_PAGE,
+    decode_cursor,
+    keyset_page,
+    seek_by_average,
+    seek_by_id,
+)
+from ..response_cache import cached
+from ..search import MATCH_MODES, index_movie, search_movies
+from ..state import catalog, leaderboard, response_cache
+from ..streaming import stream_format, stream_response
+from .common import OPT_STR, bp, movie_item, movies_response
+from .lookup import lookup_movies_get
+
+
+@bp.route('/movies', methods=['POST'])
+@auth.login_required
+def add_movie() -> Response:
+    name: OPT_STR = request.json.get('name')
+    year: OPT_STR = request.json.get('year')
+    if name is None or year is None:
+        abort(HTTPStatus.BAD_REQUEST)
+    with create_session() as session:
+        if session.query(Movie).filter_by(name=name, year=year).first() is not None:
+            abort(HTTPStatus.BAD_REQUEST)
+        movie: Movie = Movie(name, year)
+        session.add(movie)
+        session.flush()
+        session.refresh(movie)
+        session.add(MovieStats(movie.id))
+        index_movie(session, movie)
+        added: tuple = (movie.id, movie.name, int(movie.year))
+        response: Response = make_response(
+            jsonify({'id': added[0], 'movie': added[1], 'year': added[2]}),
+            HTTPStatus.CREATED,
+            {'Location': f'/movies/{movie.id}'},
+        )
+    catalog.add(*added)
+    response_cache.invalidate('movies')
+    return response
+
+
+@bp.route('/movies/<int:id>', methods=['GET'])
+@auth.login_required
+@cached(response_cache, lambda args, id: [f'movie:{id}'])
+def get_movie(id: str) -> Response:
+    movie: Any = None
+    if current_app.config['CATALOG']:
+        # Rebuilt from the primary, or a lagging replica's copy would be served
+        # for CATALOG_MAX_AGE.
+        with create_session(readonly=False) as primary:
+            movie = catalog.get(primary, id)
+    with create_session() as session:
+        # Movies added by other processes aren't in the catalog until it's rebuilt.
+        if not movie:
+            movie = session.query(Movie).get(id)
+        if not movie:
+            abort(HTTPStatus.BAD_REQUEST)
+        return make_response(
+            jsonify({'movie': movie.name, 'year': movie.year}), HTTPStatus.OK
+        )
+
+
+def _movies_query(
+    session: Session, substring: OPT_STR, year: OPT_STR, match: str
+) -> Query:
+    query: Query = session.query(Movie)
+    if substring:
+        return search_movies(query, substring, match)
+    if year:
+        return query.filter(Movie.year == int(year))
+    return query
+
+
+def _top_movies(session: Session, limit: int, offset: int = 0) -> list:
+    # Rebuilt from the primary, or a lagging replica's ranking would be served
+    # for LEADERBOARD_MAX_AGE.
+    with create_session(readonly=False) as primary:
+        movies: Optional[list] = leaderboard.top(primary, limit, offset)
+    if movies is None:
+        query: Query = top_movies_query(session, leaderboard.min_votes)
+        movies = query.limit(limit).offset(offset).all()
+    return movies
+
+
+def _cursor_page_size(size: OPT_STR) -> int:
+    page_size: int = int(size or DEFAULT_PAGE_SIZE)
+    if not 1 <= page_size <= current_app.config['MOVIES_MAX_PAGE_SIZE']:
+        raise ValueError(f'Page size out of range: {page_size}')
+    return page_size
+
+
+def _keyset_movies(
+    session: Session, query: Query, cursor: str, size: int, top: bool
+) -> KEYSET_PAGE:
+    if not top:
+        after: Optional[CURSOR_KEY] = decode_cursor(cursor, 1)
+        movies: list = seek_by_id(query, after).limit(size + 1).all()
+        return keyset_page(movies, size, lambda movie: [movie.id])
+    after = decode_cursor(cursor, 2)
+    with create_session(readonly=False) as primary:
+        movies = leaderboard.after(primary, after and (-after[0], after[1]), size + 1)
+    if movies is None:
+        query = top_movies_query(session, leaderboard.min_votes)
+        movies = seek_by_average(query, after).limit(size + 1).all()
+    return keyset_page(movies, size, lambda movie: [movie.average, movie.id])
+
+
+def _catalog_listing(
+    year: OPT_STR, size: OPT_STR, page: OPT_STR, cursor: OPT_STR
+) -> Response:
+    result: dict = {}
+    # Only used to rebuild the catalog, which must not copy a lagging replica.
+    with create_session(readonly=False) as session:
+        year_value: Optional[int] = int(year) if year else None
+        if cursor is not None:
+            try:
+                page_size: int = _cursor_page_size(size)
+                after: Optional[CURSOR_KEY] = decode_cursor(cursor, 1)
+                movies: list = catalog.movies(
+                    session, year_value, after and after[0], limit=page_size + 1
+                )
+            except ValueError:
+                abort(HTTPStatus.BAD_REQUEST)
+            movies, result['next_cursor'] = keyset_page(
+                movies, page_size, lambda movie: [movie.id]
+            )
+        elif size and page:
+            page_size = int(size)
+            page_number: int = int(page)
+            if page_size < 1 or page_number < 1:
+                abort(HTTPStatus.BAD_REQUEST)
+            movies = catalog.movies(
+                session,
+                year_value,
+                offset=(page_number - 1) * page_size,
+                limit=page_size,
+            )
+        else:
+            movies = catalog.movies(session, year_value)
+    return movies_response(result, movies)
+
+
+@bp.route('/movies', methods=['GET'])
+def search_movie() -> Response:
+    if 'ids' in request.args:
+        return lookup_movies_get()
+    return _list_movies()
+
+
+@cached(
+    response_cache,
+    lambda args: ['movies', 'ratings'] if args.get('top') else ['movies'],
+)
+def _list_movies() -> Response:
+    substring: OPT_STR = request.args.get('filter')
+    year: OPT_STR = request.args.get('year')
+    top: OPT_STR = None if substring or year else request.args.get('top')
+    size: OPT_STR = request.args.get('size')
+    page: OPT_STR = request.args.get('page')
+    cursor: OPT_STR = request.args.get('cursor')
+    stream: OPT_STR = stream_format(request)
+    match: str = request.args.get('match', 'substring')
+    if match not in MATCH_MODES or (cursor is not None and match == 'ranked'):
+        abort(HTTPStatus.BAD_REQUEST)
+    if current_app.config['CATALOG'] and not (
+        substring or top or stream or request.args.get('total')
+    ):
+        return _catalog_listing(year, size, page, cursor)
+    result: dict = {}
+    with create_session() as session:
+        query: Query = _movies_query(session, substring, year, match).order_by(Movie.id)
+        if cursor is not None:
+            try:
+                movies, result['next_cursor'] = _keyset_movies(
+                    session, query, cursor, _cursor_page_size(size), bool(top)
+                )
+            except ValueError:
+                abort(HTTPStatus.BAD_REQUEST)
+        elif size and page:
+            size: int = int(size)
+            page: int = int(page)
+            if size < 1 or page < 1:
+                abort(HTTPStatus.BAD_REQUEST)
+            if request.args.get('total'):
+                if top:
+                    query = top_movies_query(session, leaderboard.min_votes)
+                pagination: Page = paginate(query, page, size)
+                movies, result['total'] = pagination.items, pagination.total
+            elif top:
+                movies = _top_movies(session, size, (page - 1) * size)
+            else:
+                movies = query.limit(size).offset((page - 1) * size).all()
+        elif top:
+            movies = _top_movies(session, int(top))
+        elif stream:
+            return stream_response(
+                query.with_entities(Movie.id, Movie.name, Movie.year),
+                movie_item,
+                stream,
+                'Movies',
+            )
+        else:
+            movies = query.all()
+        return movies_response(result, movies)
@@ -0,0 +1,224 @@
+from http import HTTPStatus
+from typing import Any, List, Optional
+
+from flask import Response, abort, current_app, jsonify, make_response, request
+from sqlalchemy import and_, func
+from sqlalchemy.orm import Query, Session
+
+from ..auth import auth, current_user_id
+from ..bulk import rating_values
+from ..database import create_session
+from ..leaderboard import RankedMovie
+from ..models import Movie, MovieRating, MovieStats, User
+from ..ratings import insert_empty_ratings, update_ratings
+from ..response_cache import cached
+from ..state import leaderboard, rating_queue, response_cache
+from ..stats import RATING_VALUES, build_movie_stats, update_movie_stats
+from ..streaming import stream_format, stream_response
+from .common import OPT_STR, bp, json_response
+
+
+def _rating_item(movie_rating: Any) -> dict:
+    return {'Rating': movie_rating.rating, 'Review': movie_rating.review}
+
+
+def _rating_value(value: Any) -> Optional[int]:
+    if value is None:
+        return None
+    rating: int = int(value)
+    if isinstance(value, bool) or rating != float(value) or not 0 <= rating <= 10:
+        raise ValueError(f'Invalid rating: {value!r}')
+    return rating
+
+
+@bp.route('/movies/<int:id>/ratings', methods=['POST'])
+@auth.login_required
+def rate_movie(id: str) -> Response:
+    review: OPT_STR = request.json.get('review')
+    try:
+        rating: Optional[int] = _rating_value(request.json.get('rating'))
+    except (TypeError, ValueError):
+        abort(HTTPStatus.BAD_REQUEST)
+    if rating is None and not review:
+        abort(HTTPStatus.BAD_REQUEST)
+    if current_app.config['RATING_QUEUE']:
+        return _queue_rating(int(id), rating, review)
+    user_id: int = current_user_id()
+    with create_session() as session:
+        insert_empty_ratings(session, [{'user_id': user_id, 'movie_id': int(id)}])
+        # The movie and this user's rating of it, locked until the commit.
+        query: Query = session.query(
+            Movie.id,
+            Movie.name,
+            Movie.year,
+            MovieRating.id.label('rating_id'),
+            MovieRating.rating,
+            MovieRating.review,
+        ).join(
+            MovieRating,
+            and_(MovieRating.movie_id == Movie.id, MovieRating.user_id == user_id),
+        )
+        row: Optional[tuple] = (
+            query.filter(Movie.id == int(id)).with_for_update(of=MovieRating).first()
+        )
+        if not row:
+            abort(HTTPStatus.BAD_REQUEST)
+        old: RATING_VALUES = (row.rating, row.review)
+        new: RATING_VALUES = (
+            old[0] if rating is None else rating,
+            review or old[1],
+        )
+        update_ratings(
+            session,
+            [{'rating_id': row.rating_id, 'new_rating': new[0], 'new_review': new[1]}],
+        )
+        average, votes = update_movie_stats(session, row.id, old, new)
+    leaderboard.update(RankedMovie(row.id, row.name, row.year, average), votes)
+    response_cache.invalidate(f'movie:{id}', 'ratings')
+    return make_response(
+        jsonify({'name': row.name, 'rating': new[0], 'review': new[1]}),
+        HTTPStatus.CREATED,
+        {'Location': f'/movies/{id}/ratings/{row.rating_id}'},
+    )
+
+
+def _queue_rating(movie_id: int, rating: Optional[int], review: OPT_STR) -> Response:
+    try:
+        item: dict = {'movie_id': movie_id, 'rating': rating, 'review': review}
+        key, values = rating_values(item, current_user_id(), False)
+    except (TypeError, ValueError):
+        abort(HTTPStatus.BAD_REQUEST)
+    with create_session() as session:
+        name: OPT_STR = session.query(Movie.name).filter(Movie.id == movie_id).scalar()
+    if name is None:
+        abort(HTTPStatus.BAD_REQUEST)
+    rating_queue.submit(key[0], key[1], values)
+    return make_response(
+        jsonify(
+            {
+                'name': name,
+                'rating': values.get('rating'),
+                'review': values.get('review'),
+            }
+        ),
+        HTTPStatus.ACCEPTED,
+    )
+
+
+def _rating_histogram(session: Session, movie_id: int) -> List[int]:
+    # Counts of each rating 0-10, from the last export when there is one.
+    directory: OPT_STR = current_app.config['ANALYTICS_DIR']
+    if directory:
+        # pylint: disable=import-outside-toplevel
+        from ..analytics import load_rating_stats
+
+        try:
+            exported: Optional[List[int]] = load_rating_stats(directory).histogram(
+                movie_id
+            )
+        except (OSError, ValueError, KeyError):
+            # Not exported yet, or unreadable: the query below still answers.
+            exported = None
+        if exported is not None:
+            return exported
+    counts: List[int] = [0] * 11
+    for rating, count in (
+        session.query(MovieRating.rating, func.count())
+        .filter(MovieRating.movie_id == movie_id, MovieRating.rating.isnot(None))
+        .group_by(MovieRating.rating)
+    ):
+        counts[rating] = count
+    return counts
+
+
+@bp.route('/movies/<int:id>/ratings', methods=['GET'])
+@auth.login_required
+@cached(response_cache, lambda args, id: [f'movie:{id}'])
+def get_movie_rating(id: str) -> Response:
+    avg: OPT_STR = request.args.get('avg')
+    n_rates: OPT_STR = request.args.get('rates')
+    n_reviews: OPT_STR = request.args.get('reviews')
+    histogram: OPT_STR = request.args.get('histogram')
+    stream: OPT_STR = stream_format(request)
+    with create_session() as session:
+        if histogram:
+            movie_name: OPT_STR = session.query(Movie.name).filter(
+                Movie.id == id
+            ).scalar()
+            if movie_name is None:
+                abort(HTTPStatus.BAD_REQUEST)
+            result: dict = {
+                'Movie': movie_name,
+                'Rating histogram': _rating_histogram(session, int(id)),
+            }
+        elif avg or n_rates or n_reviews:
+            row: Optional[tuple] = session.query(Movie, MovieStats).outerjoin(
+                Movie.stats
+            ).filter(Movie.id == id).first()
+            if not row:
+                abort(HTTPStatus.BAD_REQUEST)
+            movie, stats = row
+            if stats is None:
+                stats = build_movie_stats(session, movie.id)
+            result = {'Movie': movie.name}
+            if avg:
+                result['Average rating'] = stats.average
+            elif n_rates:
+                result['Number of rates'] = stats.rating_count
+            else:
+                result['Number of reviews'] = stats.review_count
+        elif stream:
+            movie_name = session.query(Movie.name).filter(Movie.id == id).scalar()
+            if movie_name is None:
+                abort(HTTPStatus.BAD_REQUEST)
+            return stream_response(
+                session.query(MovieRating.rating, MovieRating.review)
+                .filter(MovieRating.movie_id == id)
+                .order_by(MovieRating.id),
+                _rating_item,
+                stream,
+                'Ratings and reviews',
+                {'Movie': movie_name},
+            )
+        else:
+            rows: List[tuple] = session.query(
+                Movie.name, MovieRating.id, MovieRating.rating, MovieRating.review
+            ).outerjoin(Movie.ratings).filter(Movie.id == id).order_by(
+                MovieRating.id
+            ).all()
+            if not rows:
+                abort(HTTPStatus.BAD_REQUEST)
+            result = {
+                'Movie': rows[0].name,
+                'Ratings and reviews': [
+                    _rating_item(row) for row in rows if row.id is not None
+                ],
+            }
+    return json_response(result)
+
+
+@bp.route('/ratings/<int:id>', methods=['GET'])
+@auth.login_required
+def get_rating(id: str) -> Response:
+    with create_session() as session:
+        query: Query = (
+            session.query(
+                Movie.name, User.username, MovieRating.rating, MovieRating.review
+            )
+            .select_from(MovieRating)
+            .join(MovieRating.movie)
+            .join(MovieRating.user)
+        )
+        row: Optional[tuple] = query.filter(MovieRating.id == id).first()
+    if not row:
+        abort(HTTPStatus.BAD_REQUEST)
+    return make_response(
+        jsonify(
+            {
+                'movie': row.name,
+                'user': row.username,
+                'rating': row.rating,
+                'review': row.review,
+            }
+        )
+    )
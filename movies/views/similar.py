@@ -0,0 +1,53 @@
+from http import HTTPStatus
+from typing import Dict, List
+
+from flask import Response, abort, current_app, request
+from sqlalchemy.orm import Query
+
+from ..auth import auth
+from ..database import create_session
+from ..models import Movie
+from .common import OPT_STR, bp, json_response, movie_item
+
+
+@bp.route('/movies/<int:id>/similar', methods=['GET'])
+@auth.login_required
+def get_similar_movies(id: str) -> Response:
+    directory: OPT_STR = current_app.config['SIMILARITY_DIR']
+    if not directory:
+        abort(HTTPStatus.SERVICE_UNAVAILABLE)
+    try:
+        k: int = int(request.args.get('k', 10))
+    except ValueError:
+        abort(HTTPStatus.BAD_REQUEST)
+    if k < 1:
+        abort(HTTPStatus.BAD_REQUEST)
+    # pylint: disable=import-outside-toplevel
+    from ..similarity import load_similar_movies
+
+    try:
+        similar: List[tuple] = load_similar_movies(directory).similar(int(id), k)
+    except (OSError, ValueError, KeyError):
+        # The index has not been built yet, or is unreadable.
+        abort(HTTPStatus.SERVICE_UNAVAILABLE)
+    with create_session() as session:
+        movie_name: OPT_STR = session.query(Movie.name).filter(Movie.id == id).scalar()
+        if movie_name is None:
+            abort(HTTPStatus.BAD_REQUEST)
+        movies: Dict[int, tuple] = {}
+        if similar:
+            # One IN query for the names and years of all neighbours.
+            rows: Query = session.query(Movie.id, Movie.name, Movie.year).filter(
+                Movie.id.in_([movie_id for movie_id, _ in similar])
+            )
+            movies = {row.id: row for row in rows}
+    return json_response(
+        {
+            'Movie': movie_name,
+            'Similar': [
+                {**movie_item(movies[movie_id]), 'score': round(score, 6)}
+                for movie_id, score in similar
+                if movie_id in movies
+            ],
+        }
+    )
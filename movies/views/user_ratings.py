@@ -0,0 +1,75 @@
+from http import HTTPStatus
+from typing import Any, Optional
+
+from flask import Response, abort, current_app, request
+from sqlalchemy.orm import Query
+
+from ..auth import auth
+from ..database import create_session
+from ..models import Movie, MovieRating, User
+from ..pagination import (
+    CURSOR_KEY,
+    DEFAULT_PAGE_SIZE,
+    decode_cursor,
+    keyset_page,
+    seek_by_id,
+)
+from ..response_cache import cached
+from ..state import response_cache
+from ..streaming import stream_format, stream_response
+from .common import OPT_STR, bp, json_response
+
+
+def _user_rating_item(row: Any) -> dict:
+    return {
+        'id': row.id,
+        'movie_id': row.movie_id,
+        'movie': row.name,
+        'rating': row.rating,
+        'review': row.review,
+    }
+
+
+@bp.route('/users/<int:id>/ratings', methods=['GET'])
+@auth.login_required
+@cached(response_cache, lambda args, id: ['ratings'])
+def get_user_ratings(id: str) -> Response:
+    stream: OPT_STR = stream_format(request)
+    try:
+        size: int = int(request.args.get('size', DEFAULT_PAGE_SIZE))
+        after: Optional[CURSOR_KEY] = decode_cursor(request.args.get('cursor', ''), 1)
+    except ValueError:
+        abort(HTTPStatus.BAD_REQUEST)
+    if not 1 <= size <= current_app.config['USER_RATINGS_MAX_PAGE_SIZE']:
+        abort(HTTPStatus.BAD_REQUEST)
+    with create_session() as session:
+        username: OPT_STR = session.query(User.username).filter(
+            User.id == int(id)
+        ).scalar()
+        if username is None:
+            abort(HTTPStatus.BAD_REQUEST)
+        # Seeks ix_movierating_user_id_id, so deep pages cost the same as the first.
+        query: Query = session.query(
+            MovieRating.id,
+            MovieRating.movie_id,
+            Movie.name,
+            MovieRating.rating,
+            MovieRating.review,
+        ).join(MovieRating.movie).filter(MovieRating.user_id == int(id))
+        if stream:
+            return stream_response(
+                query.order_by(MovieRating.id),
+                _user_rating_item,
+                stream,
+                'Ratings',
+                {'User': username},
+            )
+        rows: list = seek_by_id(query, after, MovieRating.id).limit(size + 1).all()
+    ratings, next_cursor = keyset_page(rows, size, lambda row: [row.id])
+    return json_response(
+        {
+            'User': username,
+            'Ratings': [_user_rating_item(row) for row in ratings],
+            'next_cursor': next_cursor,
+        }
+    )
@@ -0,0 +1,57 @@
+from http import HTTPStatus
+
+from flask import Response, abort, g, jsonify, make_response, request
+
+from ..auth import auth, basic_auth, current_user_id, current_username, token_auth
+from ..database import create_session
+from ..models import User
+from ..state import token_signer
+from .common import OPT_STR, bp
+
+
+@bp.route('/users', methods=['POST'])
+def new_user() -> Response:
+    username: OPT_STR = request.json.get('username')
+    password: OPT_STR = request.json.get('password')
+    if username is None or password is None:
+        abort(HTTPStatus.BAD_REQUEST)
+    with create_session() as session:
+        if session.query(User).filter_by(username=username).first() is not None:
+            abort(HTTPStatus.BAD_REQUEST)
+        user: User = User(username=username)
+        user.hash_password(password)
+        session.add(user)
+        session.flush()
+        session.refresh(user)
+        return make_response(
+            jsonify({'id': user.id, 'username': user.username}),
+            HTTPStatus.CREATED,
+            {'Location': f'/users/{user.id}'},
+        )
+
+
+@bp.route('/users/<int:id>')
+@auth.login_required
+def get_user(id: str) -> Response:
+    with create_session() as session:
+        user: User = session.query(User).get(int(id))
+        if not user:
+            abort(HTTPStatus.BAD_REQUEST)
+        return make_response(jsonify({'username': user.username}), HTTPStatus.OK)
+
+
+@bp.route('/tokens', methods=['POST'])
+@basic_auth.login_required
+def new_token() -> Response:
+    token, expires = token_signer.issue(current_user_id(), current_username())
+    return make_response(
+        jsonify({'token': token, 'token_type': 'Bearer', 'expires': expires}),
+        HTTPStatus.CREATED,
+    )
+
+
+@bp.route('/tokens', methods=['DELETE'])
+@token_auth.login_required
+def revoke_token() -> Response:
+    token_signer.revoke(g.token)
+    return make_response('', HTTPStatus.NO_CONTENT)
@@ -0,0 +1,183 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+RATING_KEY = Tuple[int, int]
+# Writes a batch and returns how many of its ratings were rejected.
+FLUSH = Callable[[List[Dict[str, Any]]], int]
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFull(Exception):
+    pass
+
+
+class RatingQueue:
+    # Ratings are acknowledged before they are written. A single worker thread
+    # writes them in batches, and repeated ratings of a movie by the same user
+    # are merged while they wait, so a burst costs one transaction per batch.
+    def __init__(
+        self,
+        flush: FLUSH,
+        max_size: int = 10000,
+        batch_size: int = 500,
+        interval: float = 0.05,
+        retries: int = 3,
+        retry_delay: float = 0.1,
+    ) -> None:
+        self.flush = flush
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self.interval = interval
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self._pending: 'OrderedDict[RATING_KEY, Dict[str, Any]]' = OrderedDict()
+        # Failed writes per rating, for ratings put back after a failed batch.
+        self._attempts: Dict[RATING_KEY, int] = {}
+        self._condition = threading.Condition()
+        # Held from taking a batch until it is written, so batches land in order.
+        self._writing = threading.Lock()
+        self._worker: Optional[threading.Thread] = None
+        self.submitted: int = 0
+        self.coalesced: int = 0
+        self.rejected: int = 0
+        self.flushed: int = 0
+        self.failed: int = 0
+        self.retried: int = 0
+        self.batches: int = 0
+        self.flush_seconds: float = 0.0
+        self.last_flush_seconds: float = 0.0
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def submit(self, user_id: int, movie_id: int, values: Dict[str, Any]) -> None:
+        key: RATING_KEY = (user_id, movie_id)
+        with self._condition:
+            if key in self._pending:
+                self._pending[key].update(values)
+                self.coalesced += 1
+            elif len(self._pending) >= self.max_size:
+                self.rejected += 1
+                raise QueueFull(f'{len(self._pending)} ratings waiting to be written')
+            else:
+                self._pending[key] = {
+                    'user_id': user_id,
+                    'movie_id': movie_id,
+                    **values,
+                }
+            self.submitted += 1
+            if self._worker is None:
+                self._worker = threading.Thread(
+                    target=self._run, name='movies-rating-queue', daemon=True
+                )
+                self._worker.start()
+            self._condition.notify()
+
+    def _flush_next(self) -> int:
+        with self._writing:
+            with self._condition:
+                count: int = min(self.batch_size, len(self._pending))
+                batch: List[Dict[str, Any]] = [
+                    self._pending.popitem(last=False)[1] for _ in range(count)
+                ]
+            if batch:
+                self._flush(batch)
+            return count
+
+    def _requeue(self, batch: List[Dict[str, Any]]) -> Tuple[int, int]:
+        # Puts a failed batch back in front of the queue, merged under anything
+        # submitted for the same ratings since. Ratings that failed more than
+        # `retries` times are dropped. Returns the dropped count and the most
+        # attempts of a requeued rating.
+        dropped: int = 0
+        attempts: int = 0
+        with self._condition:
+            for item in reversed(batch):
+                key: RATING_KEY = (item['user_id'], item['movie_id'])
+                failures: int = self._attempts.pop(key, 0) + 1
+                if failures > self.retries:
+                    dropped += 1
+                    continue
+                self._attempts[key] = failures
+                attempts = max(attempts, failures)
+                self._pending[key] = {**item, **self._pending.pop(key, {})}
+                self._pending.move_to_end(key, last=False)
+        return dropped, attempts
+
+    def _flush(self, batch: List[Dict[str, Any]]) -> None:
+        started: float = time.perf_counter()
+        attempts: int = 0
+        try:
+            rejected: int = self.flush(batch)
+        except Exception:  # pylint: disable=broad-except
+            logger.exception('Failed to write %d queued ratings', len(batch))
+            failed, attempts = self._requeue(batch)
+            flushed: int = 0
+            if failed:
+                logger.error(
+                    'Dropped %d queued ratings after %d retries', failed, self.retries
+                )
+        else:
+            failed, flushed = rejected, len(batch) - rejected
+            with self._condition:
+                for item in batch:
+                    self._attempts.pop((item['user_id'], item['movie_id']), None)
+        elapsed: float = time.perf_counter() - started
+        with self._condition:
+            self.failed += failed
+            self.flushed += flushed
+            self.retried += len(batch) - failed - flushed
+            self.batches += 1
+            self.flush_seconds += elapsed
+            self.last_flush_seconds = elapsed
+        if attempts:
+            # Backs off before writing the requeued ratings again.
+            time.sleep(self.retry_delay * 2 ** (attempts - 1))
+
+    def _stopped(self) -> bool:
+        # Draining replaces the worker, which tells the running one to exit.
+        return self._worker is not threading.current_thread()
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._pending or self._stopped())
+                # Give a burst a moment to fill the batch before writing it.
+                self._condition.wait_for(
+                    lambda: self._stopped() or len(self._pending) >= self.batch_size,
+                    self.interval,
+                )
+                if self._stopped():
+                    return
+            self._flush_next()
+
+    def drain(self) -> None:
+        # Stops the worker and writes everything still queued; a later submit
+        # starts a new worker.
+        with self._condition:
+            worker, self._worker = self._worker, None
+            self._condition.notify_all()
+        if worker is not None:
+            worker.join()
+        while self._flush_next():
+            pass
+
+    def stats(self) -> Dict[str, float]:
+        with self._condition:
+            return {
+                'queue_depth': len(self._pending),
+                'queue_size': self.max_size,
+                'submitted': self.submitted,
+                'coalesced': self.coalesced,
+                'rejected': self.rejected,
+                'flushed': self.flushed,
+                'failed': self.failed,
+                'retried': self.retried,
+                'batches': self.batches,
+                'flush_seconds': round(self.flush_seconds, 6),
+                'last_flush_seconds': round(self.last_flush_seconds, 6),
+            }
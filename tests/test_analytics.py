@@ -0,0 +1,131 @@
+import json
+import math
+
+import pytest
+from movies.database import Base
+from movies.models import Movie, MovieRating, User
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+np = pytest.importorskip('numpy')
+analytics = pytest.importorskip('movies.analytics')
+
+RATINGS = {
+    1: [(7, 'good'), (9, None), (None, 'no score'), (7, None)],
+    2: [(0, None)],
+    3: [],
+    4: [(10, 'great'), (4, None)],
+}
+YEARS = {1: 2001, 2: 2001, 3: None, 4: 1999}
+
+
+@pytest.fixture()
+def session():
+    engine = create_engine('sqlite://')
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+    for i in range(1, 6):
+        user = User(f'user_{i}')
+        user.password_hash = 'x'
+        session.add(user)
+    for movie_id, year in YEARS.items():
+        session.add(Movie(f'film_{movie_id}', year))
+    session.flush()
+    for movie_id, ratings in RATINGS.items():
+        for user_id, (rating, review) in enumerate(ratings, 1):
+            session.add(MovieRating(user_id, movie_id, rating, review))
+    session.commit()
+    yield session
+    session.close()
+
+
+def _expected(ratings, prior_mean, prior_votes):
+    scores = [rating for rating, _ in ratings if rating is not None]
+    mean = sum(scores) / len(scores) if scores else math.nan
+    return {
+        'histogram': [scores.count(score) for score in range(11)],
+        'rating_count': len(scores),
+        'review_count': sum(review is not None for _, review in ratings),
+        'mean': mean,
+        'variance': sum((s - mean) ** 2 for s in scores) / len(scores)
+        if scores
+        else math.nan,
+        'review_ratio': sum(review is not None for _, review in ratings) / len(ratings)
+        if ratings
+        else math.nan,
+        'bayesian_average': (sum(scores) + prior_votes * prior_mean)
+        / (len(scores) + prior_votes),
+    }
+
+
+def _check(columns, position, expected):
+    for name, value in expected.items():
+        actual = columns[name][position]
+        if name == 'histogram':
+            assert actual.tolist() == value
+        else:
+            assert actual == pytest.approx(value, nan_ok=True), name
+
+
+@pytest.mark.parametrize('chunk_size', [1, 3, 1000])
+def test_matches_python(session, chunk_size):
+    movies, by_year, meta = analytics.compute_rating_stats(session, chunk_size)
+    scores = [r for ratings in RATINGS.values() for r, _ in ratings if r is not None]
+    assert meta['prior_mean'] == pytest.approx(sum(scores) / len(scores))
+    assert meta['prior_votes'] == pytest.approx(len(scores) / 3)
+    assert (meta['movies'], meta['years'], meta['ratings']) == (4, 2, 7)
+    assert (meta['users'], meta['raters']) == (5, 4)
+    assert movies['movie_id'].tolist() == [1, 2, 3, 4]
+    for position, movie_id in enumerate(movies['movie_id']):
+        expected = _expected(RATINGS[movie_id], meta['prior_mean'], meta['prior_votes'])
+        _check(movies, position, expected)
+    assert by_year['year'].tolist() == [1999, 2001]
+    assert by_year['movie_count'].tolist() == [1, 2]
+    _check(
+        by_year,
+        1,
+        _expected(RATINGS[1] + RATINGS[2], meta['prior_mean'], meta['prior_votes']),
+    )
+
+
+def test_prior_votes(session):
+    movies, _, meta = analytics.compute_rating_stats(session, prior_votes=0)
+    assert meta['prior_votes'] == 0
+    assert movies['bayesian_average'][0] == pytest.approx(movies['mean'][0])
+
+
+def test_export_and_load(session, tmp_path):
+    meta = analytics.export_rating_stats(session, str(tmp_path))
+    assert json.loads((tmp_path / 'meta.json').read_text()) == meta
+    generation = tmp_path / meta['generation']
+    assert np.load(generation / 'years.year.npy').tolist() == [1999, 2001]
+    assert meta['previous_generation'] is None
+    assert not list(tmp_path.glob('*.tmp'))
+    stats = analytics.load_rating_stats(str(tmp_path))
+    assert stats.histogram(4) == [0, 0, 0, 0, 1, 0, 0, 0, 0, 0, 1]
+    assert stats.histogram(3) == [0] * 11
+    assert stats.histogram(5) is None
+    assert analytics.load_rating_stats(str(tmp_path)) is stats
+
+    session.add(MovieRating(5, 4, 6))
+    session.commit()
+    second = analytics.export_rating_stats(session, str(tmp_path))
+    assert second['previous_generation'] == meta['generation']
+    assert stats.histogram(4)[6] == 0
+    stats = analytics.load_rating_stats(str(tmp_path))
+    assert stats.histogram(4)[6] == 1
+
+    # The generation before the one being replaced is removed.
+    third = analytics.export_rating_stats(session, str(tmp_path))
+    assert sorted(path.name for path in tmp_path.iterdir()) == sorted(
+        [second['generation'], third['generation'], 'meta.json']
+    )
+
+
+def test_empty(session, tmp_path):
+    session.query(MovieRating).delete()
+    session.query(Movie).delete()
+    session.commit()
+    movies, by_year, meta = analytics.compute_rating_stats(session)
+    assert len(movies['movie_id']) == len(by_year['year']) == 0
+    assert meta['votes'] == 0
@@ -0,0 +1,112 @@
+import asyncio
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import Flask, Response, jsonify, request
+from movies.asgi import AsgiApp, asgi_request, build_environ
+
+flask_app = Flask(__name__)
+
+
+@flask_app.route('/echo', methods=['POST'])
+def echo():
+    return jsonify(
+        {
+            'json': request.json,
+            'args': request.args.to_dict(),
+            'accept': request.headers.get('Accept'),
+        }
+    )
+
+
+@flask_app.route('/stream')
+def stream():
+    return Response((f'{i}\n'.encode('ascii') for i in range(3)), mimetype='text/plain')
+
+
+def make_app(closed=None):
+    return AsgiApp(flask_app, ThreadPoolExecutor(2), lambda: closed.append(True))
+
+
+def test_build_environ():
+    scope = {
+        'method': 'GET',
+        'path': '/movies',
+        'query_string': b'page=1',
+        'headers': [
+            (b'content-type', b'application/json'),
+            (b'content-length', b'999'),
+            (b'x-tag', b'a'),
+            (b'x-tag', b'b'),
+        ],
+    }
+    environ = build_environ(scope, b'{}')
+    assert environ['PATH_INFO'] == '/movies'
+    assert environ['QUERY_STRING'] == 'page=1'
+    assert environ['CONTENT_TYPE'] == 'application/json'
+    assert environ['CONTENT_LENGTH'] == '2'
+    assert environ['HTTP_X_TAG'] == 'a,b'
+    assert environ['wsgi.input'].read() == b'{}'
+
+
+def test_asgi_request():
+    app = make_app([])
+    status, headers, body = asyncio.run(
+        asgi_request(
+            app,
+            'POST',
+            '/echo?q=1',
+            b'{"a": 1}',
+            {'Content-Type': 'application/json', 'Accept': 'text/plain'},
+        )
+    )
+    assert status == 200
+    assert headers['content-type'] == 'application/json'
+    assert json.loads(body) == {
+        'json': {'a': 1},
+        'args': {'q': '1'},
+        'accept': 'text/plain',
+    }
+    status, _, _ = asyncio.run(asgi_request(app, 'GET', '/missing'))
+    assert status == 404
+
+
+def test_asgi_streams_chunks():
+    sent = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': b''}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {'type': 'http', 'method': 'GET', 'path': '/stream'}
+    asyncio.run(make_app([])(scope, receive, send))
+    assert [message.get('body') for message in sent[1:]] == [
+        b'0\n',
+        b'1\n',
+        b'2\n',
+        b'',
+    ]
+    assert [message.get('more_body') for message in sent[1:]] == [
+        True,
+        True,
+        True,
+        None,
+    ]
+
+
+def test_asgi_lifespan():
+    closed = []
+    messages = [{'type': 'lifespan.startup'}, {'type': 'lifespan.shutdown'}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        sent.append(message['type'])
+
+    asyncio.run(make_app(closed)({'type': 'lifespan'}, receive, send))
+    assert sent == ['lifespan.startup.complete', 'lifespan.shutdown.complete']
+    assert closed == [True]
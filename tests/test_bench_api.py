@@ -0,0 +1,42 @@
+from benchmarks.bench_api import compare, over_budget, percentile, summarize
+
+
+def test_percentile():
+    values = [float(i) for i in range(1, 101)]
+    assert percentile(values, 0.50) == 50.0
+    assert percentile(values, 0.95) == 95.0
+    assert percentile(values, 0.99) == 99.0
+    assert percentile([3.0], 0.99) == 3.0
+
+
+def test_summarize():
+    summary = summarize([0.001, 0.002, 0.003, 0.004], 0.5)
+    assert summary['requests'] == 4
+    assert summary['p50'] == 2.0
+    assert summary['p99'] == 4.0
+    assert summary['rps'] == 8.0
+
+
+def test_compare():
+    baseline = {'client': {'get_movie': {'p95': 10.0, 'rps': 100.0, 'errors': 0}}}
+    ok = {'client': {'get_movie': {'p95': 11.0, 'rps': 90.0, 'errors': 0}}}
+    assert compare(ok, baseline, 0.25) == []
+    slow = {'client': {'get_movie': {'p95': 20.0, 'rps': 50.0, 'errors': 2}}}
+    assert len(compare(slow, baseline, 0.25)) == 3
+    jitter = {'client': {'get_movie': {'p95': 1.5, 'rps': 100.0, 'errors': 0}}}
+    assert (
+        compare(jitter, {'client': {'get_movie': {'p95': 1.0, 'rps': 100.0}}}, 0.25)
+        == []
+    )
+    new = {'wsgi': {'get_movie': {'p95': 99.0, 'rps': 1.0, 'errors': 0}}}
+    assert compare(new, baseline, 0.25) == ['wsgi get_movie: missing from the baseline']
+
+
+def test_over_budget():
+    results = {
+        'client': {'get_movie': {'p99': 80.0}, 'get_user_ratings': {'p99': 60.0}},
+        'wsgi': {'get_user_ratings': {'p99': 40.0}},
+    }
+    assert over_budget(results, {'get_user_ratings': 50.0}) == [
+        'client get_user_ratings: p99 60.0ms > 50.0ms budget'
+    ]
@@ -0,0 +1,144 @@
+import pytest
+from movies import bulk
+from movies.bulk import batched, import_movies, import_ratings, summarize
+from movies.database import Base
+from movies.models import Movie, MovieRating, MovieStats, User
+from movies.search import search_movies
+from movies.stats import rebuild_movie_stats
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+
+@pytest.fixture()
+def session():
+    engine = create_engine('sqlite://')
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+    for name in ('first', 'second'):
+        user = User(name)
+        user.password_hash = 'hash'
+        session.add(user)
+    session.add(Movie('film', 2020))
+    session.add(MovieStats(1))
+    session.commit()
+    yield session
+    session.close()
+
+
+def stats(session):
+    return [
+        (row.movie_id, row.rating_sum, row.rating_count, row.review_count, row.average)
+        for row in session.query(MovieStats).order_by(MovieStats.movie_id)
+    ]
+
+
+def test_batched():
+    assert list(batched(range(5), 2)) == [[0, 1], [2, 3], [4]]
+    assert list(batched([], 2)) == []
+
+
+def test_import_movies(session):
+    results = import_movies(
+        session,
+        [
+            {'name': 'film', 'year': 2020},
+            {'name': 'new film', 'year': '2021'},
+            {'name': 'new film', 'year': 2021},
+            {'name': 'film'},
+            {'year': 2000},
+            'film',
+        ],
+        10,
+    )
+    assert results == [
+        {'index': 10, 'status': 'exists', 'id': 1},
+        {'index': 11, 'status': 'created', 'id': 2},
+        {'index': 12, 'status': 'duplicate'},
+        {'index': 13, 'status': 'error', 'error': 'year must be an integer'},
+        {'index': 14, 'status': 'error', 'error': 'name is required'},
+        {'index': 15, 'status': 'error', 'error': 'Item must be a JSON object'},
+    ]
+    assert session.query(Movie).get(2).year == 2021
+    assert stats(session)[1] == (2, 0, 0, 0, None)
+    assert [movie.id for movie in search_movies(session.query(Movie), 'new f')] == [2]
+
+
+def test_import_ratings(session):
+    session.add(MovieRating(1, 1, 4, 'old'))
+    session.commit()
+    rebuild_movie_stats(session)
+    results = import_ratings(
+        session,
+        [
+            {'movie_id': 1, 'rating': 8},
+            {'movie_id': 1, 'user_id': 2, 'rating': 6},
+            {'movie_id': 1, 'user_id': 2, 'review': 'nice'},
+            {'movie_id': 2, 'rating': 6},
+            {'movie_id': 1, 'rating': 11},
+            {'movie_id': 1},
+            {'movie_id': '1', 'rating': 1},
+            {'movie_id': 1, 'review': 5},
+            [],
+        ],
+        0,
+        user_id=1,
+        any_user=True,
+    )
+    assert [result['status'] for result in results] == [
+        'updated',
+        'created',
+        'created',
+        'error',
+        'error',
+        'error',
+        'error',
+        'error',
+        'error',
+    ]
+    ratings = session.query(MovieRating.user_id, MovieRating.rating, MovieRating.review)
+    assert sorted(ratings) == [(1, 8, 'old'), (2, 6, 'nice')]
+    assert stats(session) == [(1, 14, 2, 2, 7.0)]
+    session.commit()
+    rebuild_movie_stats(session)
+    assert stats(session) == [(1, 14, 2, 2, 7.0)]
+
+
+def test_import_ratings_written_concurrently(session, monkeypatch):
+    rebuild_movie_stats(session)
+    insert = bulk.insert_empty_ratings
+
+    def racing_insert(session, keys):
+        # Another request rates the same movie first and commits.
+        session.add(MovieRating(1, 1, 2, 'first'))
+        session.flush()
+        bulk.apply_stats_deltas(session, {1: (2, 1, 1)})
+        insert(session, keys)
+
+    monkeypatch.setattr(bulk, 'insert_empty_ratings', racing_insert)
+    results = import_ratings(session, [{'movie_id': 1, 'rating': 9}], 0, 1)
+    assert results[0]['status'] == 'updated'
+    assert stats(session) == [(1, 9, 1, 1, 9.0)]
+    session.commit()
+    rebuild_movie_stats(session)
+    assert stats(session) == [(1, 9, 1, 1, 9.0)]
+
+
+def test_import_ratings_for_other_user_is_forbidden(session):
+    results = import_ratings(
+        session, [{'movie_id': 1, 'user_id': 2, 'rating': 1}], 0, 1
+    )
+    assert results[0]['error'] == 'Not allowed to rate on behalf of other users'
+
+
+def test_import_ratings_builds_missing_stats(session):
+    session.query(MovieStats).delete()
+    import_ratings(session, [{'movie_id': 1, 'rating': 3}], 0, 1)
+    assert stats(session) == [(1, 3, 1, 0, 3.0)]
+
+
+def test_summarize():
+    results = [{'status': 'created'}, {'status': 'created'}, {'status': 'error'}]
+    summary = summarize(results, 0.5)
+    assert summary['counts'] == {'created': 2, 'error': 1}
+    assert summary['rows_per_second'] == 6.0
+    assert summarize([], 0)['rows_per_second'] is None
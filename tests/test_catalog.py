@@ -0,0 +1,98 @@
+import pytest
+from movies import catalog as catalog_module
+from movies.catalog import CatalogMovie, MovieCatalog
+from movies.database import Base
+from movies.models import Movie
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture()
+def session():
+    engine = create_engine('sqlite://')
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+    for i in range(1, 11):
+        session.add(Movie(f'film_{i}', 2000 + i % 3))
+    session.add(Movie('undated', None))
+    session.commit()
+    yield session
+    session.close()
+
+
+def test_matches_database(session):
+    catalog = MovieCatalog(max_age=None)
+    expected = [
+        CatalogMovie(*row)
+        for row in session.query(Movie.id, Movie.name, Movie.year).order_by(Movie.id)
+    ]
+    assert catalog.movies(session) == expected
+    assert catalog.movies(session, 2001) == [m for m in expected if m.year == 2001]
+    assert catalog.movies(session, 1999) == []
+    assert catalog.get(session, 11) == CatalogMovie(11, 'undated', None)
+    assert catalog.get(session, 12) is None
+    assert catalog.stats()['movies'] == 11
+    assert catalog.stats()['years'] == 3
+
+
+def test_pages(session):
+    catalog = MovieCatalog(max_age=None)
+    assert [m.id for m in catalog.movies(session, offset=2, limit=3)] == [3, 4, 5]
+    assert [m.id for m in catalog.movies(session, after=8)] == [9, 10, 11]
+    assert [m.id for m in catalog.movies(session, 2000, after=3, limit=1)] == [6]
+    assert [m.id for m in catalog.movies(session, 2000, offset=1, limit=2)] == [6, 9]
+
+
+def test_add_and_interned_names(session):
+    catalog = MovieCatalog(max_age=None)
+    catalog.add(12, 'ignored', 2000)
+    assert len(catalog) == 0
+    catalog.get(session, 1)
+    name = ''.join(['film', '_new'])
+    catalog.add(12, name, 2000)
+    catalog.add(12, name, 2000)
+    catalog.add(0, 'first', 2000)
+    assert catalog.movies(session)[-1] == CatalogMovie(12, 'film_new', 2000)
+    assert catalog.get(session, 12).name is catalog.get(session, 12).name
+    assert [m.id for m in catalog.movies(session, 2000)] == [0, 3, 6, 9, 12]
+    assert catalog.movies(session)[0].id == 0
+
+
+def test_rebuilds_when_stale(session):
+    clock = Clock()
+    catalog = MovieCatalog(max_age=10, clock=clock)
+    assert len(catalog.movies(session)) == 11
+    session.add(Movie('late', 2020))
+    session.commit()
+    assert len(catalog.movies(session)) == 11
+    clock.now += 10
+    assert len(catalog.movies(session)) == 12
+    catalog.invalidate()
+    assert catalog.stale
+
+
+def test_add_during_rebuild(session, monkeypatch):
+    catalog = MovieCatalog(max_age=None)
+    read_columns = catalog_module._read_columns
+
+    def racing(session):
+        # Added after the rebuild's query read its rows.
+        columns = read_columns(session)
+        catalog.add(12, 'racing', 2000)
+        return columns
+
+    monkeypatch.setattr(catalog_module, '_read_columns', racing)
+    catalog.rebuild(session)
+    assert catalog.get(session, 12) == CatalogMovie(12, 'racing', 2000)
+    assert [m.id for m in catalog.movies(session, 2000)] == [3, 6, 9, 12]
+    monkeypatch.undo()
+    catalog.rebuild(session)
+    assert catalog.get(session, 12) is None
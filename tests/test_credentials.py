@@ -0,0 +1,63 @@
+import pytest
+from movies.auth import credential_cache
+from movies.credentials import CredentialCache
+from movies.models import User
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture()
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture()
+def cache(clock):
+    return CredentialCache(maxsize=2, ttl=10, clock=clock)
+
+
+def test_cache_hit_and_miss(cache):
+    assert cache.get('user', 'pass') is None
+    cache.put('user', 'pass', 1)
+    assert cache.get('user', 'pass') == 1
+    assert cache.get('user', 'wrong') is None
+    assert cache.stats() == {'hits': 1, 'misses': 2, 'size': 1}
+
+
+def test_cache_ttl(cache, clock):
+    cache.put('user', 'pass', 1)
+    clock.now = 10
+    assert cache.get('user', 'pass') is None
+    assert len(cache) == 0
+
+
+def test_cache_lru_eviction(cache):
+    cache.put('first', 'pass', 1)
+    cache.put('second', 'pass', 2)
+    assert cache.get('first', 'pass') == 1
+    cache.put('third', 'pass', 3)
+    assert cache.get('second', 'pass') is None
+    assert cache.get('first', 'pass') == 1
+    assert cache.get('third', 'pass') == 3
+
+
+def test_cache_invalidate(cache):
+    cache.put('user', 'pass', 1)
+    cache.put('other', 'pass', 2)
+    cache.invalidate('user')
+    assert cache.get('user', 'pass') is None
+    assert cache.get('other', 'pass') == 2
+    cache.clear()
+    assert cache.stats() == {'hits': 0, 'misses': 0, 'size': 0}
+
+
+def test_password_change_invalidates():
+    credential_cache.put('cached_user', 'pass', 1)
+    User('cached_user').hash_password('new_pass')
+    assert credential_cache.get('cached_user', 'pass') is None
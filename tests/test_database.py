@@ -0,0 +1,65 @@
+import pytest
+from movies import database
+from movies.database import SETTINGS, configure_engine, load_settings, make_engine
+from sqlalchemy.pool import QueuePool
+
+
+def test_load_settings_defaults():
+    settings = load_settings(environ={})
+    assert settings == {name: default for name, (_, default) in SETTINGS.items()}
+
+
+def test_load_settings_precedence():
+    settings = load_settings(
+        {'DATABASE_POOL_SIZE': 3},
+        {'MOVIES_DATABASE_POOL_SIZE': '7', 'MOVIES_DATABASE_BUSY_TIMEOUT': '1.5'},
+    )
+    assert settings['DATABASE_POOL_SIZE'] == 3
+    assert settings['DATABASE_BUSY_TIMEOUT'] == 1.5
+
+
+def test_sqlite_file_engine(tmp_path):
+    settings = load_settings(
+        {
+            'DATABASE_URL': f'sqlite:///{tmp_path}/movies.db',
+            'DATABASE_POOL_SIZE': 2,
+            'SQLITE_CACHE_SIZE': -1000,
+        },
+        {},
+    )
+    engine = make_engine(settings)
+    assert isinstance(engine.pool, QueuePool)
+    assert engine.pool.size() == 2
+    with engine.connect() as connection:
+        assert connection.execute('PRAGMA journal_mode').scalar() == 'wal'
+        assert connection.execute('PRAGMA synchronous').scalar() == 1
+        assert connection.execute('PRAGMA cache_size').scalar() == -1000
+        assert connection.execute('PRAGMA mmap_size').scalar() == 256 * 1024 * 1024
+    engine.dispose()
+
+
+def test_sqlite_memory_engine():
+    engine = make_engine(load_settings({'DATABASE_URL': 'sqlite://'}, {}))
+    assert engine.execute('SELECT 1').scalar() == 1
+
+
+def test_postgresql_engine():
+    pytest.importorskip('psycopg2')
+    engine = make_engine(
+        load_settings(
+            {'DATABASE_URL': 'postgresql://localhost/movies', 'DATABASE_POOL_SIZE': 4},
+            {},
+        )
+    )
+    assert engine.pool.size() == 4
+
+
+def test_configure_engine(tmp_path):
+    previous = database.engine
+    try:
+        engine = configure_engine({'DATABASE_URL': f'sqlite:///{tmp_path}/other.db'})
+        assert database.engine is engine
+        assert database.Session.kw['bind'] is engine
+    finally:
+        database.engine = previous
+        database.Session.configure(bind=previous)
@@ -0,0 +1,58 @@
+import pytest
+from movies.hashing import HasherOverloaded, PasswordHasher
+from passlib.hash import sha256_crypt
+
+
+def test_password_hasher_inline():
+    hasher = PasswordHasher()
+    password_hash = hasher.hash('secret')
+    assert password_hash.startswith('$6$')
+    assert hasher.verify('secret', password_hash)
+    assert not hasher.verify('wrong', password_hash)
+    assert hasher.stats()['jobs'] == 3
+
+
+def test_password_hasher_process_pool():
+    hasher = PasswordHasher()
+    hasher.configure(1, rounds=1000)
+    try:
+        assert hasher.stats()['workers'] == 1
+        password_hash = hasher.hash('secret')
+        assert hasher.verify('secret', password_hash)
+        assert not hasher.verify('wrong', password_hash)
+    finally:
+        hasher.shutdown()
+    assert hasher.executor is None
+    assert PasswordHasher().verify('secret', password_hash)
+
+
+def test_password_hasher_rejects_when_full():
+    hasher = PasswordHasher()
+    hasher.configure(queue_size=0)
+    with pytest.raises(HasherOverloaded):
+        hasher.hash('secret')
+    assert hasher.stats()['rejected'] == 1
+    assert hasher.stats()['queue_depth'] == 0
+
+
+def test_password_hasher_rehash():
+    hasher = PasswordHasher()
+    hasher.configure(rounds=1000)
+    password_hash = hasher.hash('secret')
+    assert '$rounds=1000$' in password_hash
+    assert hasher.verify_and_update('secret', password_hash) == (True, None)
+    hasher.configure(rounds=2000)
+    verified, new_hash = hasher.verify_and_update('secret', password_hash)
+    assert verified
+    assert '$rounds=2000$' in new_hash
+    assert hasher.verify_and_update('wrong', password_hash) == (False, None)
+    legacy_hash = sha256_crypt.using(rounds=1000).hash('secret')
+    verified, new_hash = hasher.verify_and_update('secret', legacy_hash)
+    assert verified
+    assert new_hash.startswith('$6$rounds=2000$')
+    assert hasher.stats()['rehashed'] == 2
+
+
+def test_password_hasher_unknown_scheme():
+    with pytest.raises(KeyError):
+        PasswordHasher().configure(scheme='rot13')
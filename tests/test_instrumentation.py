@@ -0,0 +1,36 @@
+from movies.instrumentation import Metrics, RequestTimings
+
+
+def test_server_timing():
+    timings = RequestTimings()
+    timings.add('sql', 0.002)
+    timings.add('sql', 0.001)
+    timings.add('serialize', 0.0005)
+    assert timings.server_timing(0.01) == (
+        'sql;dur=3.000;desc="2 queries", serialize;dur=0.500, total;dur=10.000'
+    )
+
+
+def test_metrics_render():
+    metrics = Metrics()
+    metrics.add_stats('hashing', lambda: {'queue_depth': 2})
+    timings = RequestTimings()
+    timings.add('sql', 0.002)
+    timings.add('auth', 0.1)
+    metrics.observe('get_movie', 200, timings, 0.02)
+    metrics.observe('get_movie', 400, RequestTimings(), 3.0)
+    lines = metrics.render().splitlines()
+    assert 'movies_requests_total{endpoint="get_movie",status="200"} 1' in lines
+    assert 'movies_requests_total{endpoint="get_movie",status="400"} 1' in lines
+    assert (
+        'movies_request_duration_seconds_bucket{endpoint="get_movie",le="0.025"} 1'
+        in lines
+    )
+    assert (
+        'movies_request_duration_seconds_bucket{endpoint="get_movie",le="+Inf"} 2'
+        in lines
+    )
+    assert 'movies_request_duration_seconds_count{endpoint="get_movie"} 2' in lines
+    assert 'movies_sql_statements_total{endpoint="get_movie"} 1' in lines
+    assert 'movies_auth_seconds_total{endpoint="get_movie"} 0.100000' in lines
+    assert 'movies_hashing_queue_depth 2' in lines
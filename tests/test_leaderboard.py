@@ -0,0 +1,77 @@
+import random
+
+import pytest
+from movies.database import Base
+from movies.leaderboard import Leaderboard, RankedMovie, top_movies_query
+from movies.models import Movie, MovieStats
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+
+@pytest.fixture()
+def session():
+    engine = create_engine('sqlite://')
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+    for i in range(1, 21):
+        session.add(Movie(f'film_{i}', 2000 + i))
+        session.add(MovieStats(i, i, 1, 0, float(i)))
+    session.commit()
+    yield session
+    session.close()
+
+
+def set_average(session, leaderboard, movie_id, average, votes=1):
+    stats = session.query(MovieStats).get(movie_id)
+    stats.average = average
+    stats.rating_count = votes
+    session.commit()
+    leaderboard.update(
+        RankedMovie(movie_id, f'film_{movie_id}', 2000 + movie_id, average), votes
+    )
+
+
+def test_top_from_memory(session):
+    leaderboard = Leaderboard(capacity=5, max_age=None)
+    movies = leaderboard.top(session, 3)
+    assert [movie.id for movie in movies] == [20, 19, 18]
+    assert [movie.id for movie in leaderboard.top(session, 2, 3)] == [17, 16]
+    assert leaderboard.top(session, 3, 4) is None
+    assert len(leaderboard) == 5
+
+
+def test_min_votes(session):
+    leaderboard = Leaderboard(capacity=5, min_votes=2, max_age=None)
+    assert leaderboard.top(session, 5) == []
+    set_average(session, leaderboard, 3, 3.0, votes=2)
+    assert [movie.id for movie in leaderboard.top(session, 5)] == [3]
+
+
+def test_incremental_updates_match_database(session):
+    leaderboard = Leaderboard(capacity=5, max_age=None)
+    leaderboard.rebuild(session)
+    rnd = random.Random(0)
+    for _ in range(200):
+        set_average(session, leaderboard, rnd.randint(1, 20), rnd.uniform(0, 30))
+        expected = [row.id for row in top_movies_query(session).limit(5)]
+        assert [movie.id for movie in leaderboard.top(session, 5)] == expected
+
+
+def test_dropping_below_min_votes_forces_rebuild(session):
+    leaderboard = Leaderboard(capacity=5, max_age=None)
+    leaderboard.rebuild(session)
+    set_average(session, leaderboard, 20, 20.0, votes=0)
+    assert leaderboard.stale
+    assert [movie.id for movie in leaderboard.top(session, 2)] == [19, 18]
+
+
+def test_max_age(session):
+    now = [0.0]
+    leaderboard = Leaderboard(capacity=5, max_age=10, clock=lambda: now[0])
+    leaderboard.update(RankedMovie(1, 'film_1', 2001, 100.0), 1)
+    leaderboard.rebuild(session)
+    assert not leaderboard.stale
+    now[0] = 10
+    assert leaderboard.stale
+    leaderboard.invalidate()
+    assert [movie.id for movie in leaderboard.top(session, 1)] == [20]
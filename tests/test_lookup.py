@@ -0,0 +1,89 @@
+import pytest
+from movies.database import Base
+from movies.lookup import lookup_movies, parse_ids
+from movies.models import Movie, MovieRating, MovieStats
+from movies.stats import rebuild_movie_stats
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+
+@pytest.fixture()
+def session():
+    engine = create_engine('sqlite://')
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+    for i in range(1, 1001):
+        session.add(Movie(f'film_{i}', 2000 + i % 3))
+    session.flush()
+    session.add_all(
+        [
+            MovieRating(1, 1, 8, 'good'),
+            MovieRating(2, 1, 5),
+            MovieRating(1, 2, None, 'no score'),
+        ]
+    )
+    rebuild_movie_stats(session)
+    session.commit()
+    yield session
+    session.close()
+
+
+def test_parse_ids():
+    assert parse_ids(['1', ' 2', 3], 3) == [1, 2, 3]
+    for values in ([], ['x'], [''], [1.5], [True], [None], [1, 2, 3, 4]):
+        with pytest.raises(ValueError):
+            parse_ids(values, 3)
+
+
+def test_lookup(session):
+    assert lookup_movies(session, [2, 12345, 1, 2]) == [
+        {
+            'id': 2,
+            'name': 'film_2',
+            'year': 2002,
+            'average_rating': None,
+            'rating_count': 0,
+            'review_count': 1,
+        },
+        {'id': 12345, 'error': 'not found'},
+        {
+            'id': 1,
+            'name': 'film_1',
+            'year': 2001,
+            'average_rating': 6.5,
+            'rating_count': 2,
+            'review_count': 1,
+        },
+        {
+            'id': 2,
+            'name': 'film_2',
+            'year': 2002,
+            'average_rating': None,
+            'rating_count': 0,
+            'review_count': 1,
+        },
+    ]
+
+
+def test_unbuilt_stats_match(session):
+    ids = [1, 2, 3]
+    built = lookup_movies(session, ids)
+    session.query(MovieStats).delete()
+    assert lookup_movies(session, ids) == built
+    assert session.query(MovieStats).count() == 0
+
+
+def test_statement_count(session):
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(session.bind, 'before_cursor_execute', record)
+    items = lookup_movies(session, list(range(1, 1001)))
+    assert len(items) == 1000
+    assert len(statements) == 3
+    session.query(MovieStats).filter(MovieStats.movie_id == 1).delete()
+    statements.clear()
+    lookup_movies(session, list(range(1, 101)))
+    assert len(statements) == 2
@@ -0,0 +1,74 @@
+from alembic import command
+from movies.database import init_db, migrations_config
+from sqlalchemy import create_engine, inspect
+
+LEGACY_SCHEMA = [
+    'CREATE TABLE users (id INTEGER PRIMARY KEY, username VARCHAR(50) NOT NULL '
+    'UNIQUE, password_hash VARCHAR(128) NOT NULL)',
+    'CREATE TABLE movies (id INTEGER PRIMARY KEY, name VARCHAR(100) NOT NULL, '
+    'year INTEGER)',
+    'CREATE TABLE movierating (id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL '
+    'REFERENCES users (id), movie_id INTEGER NOT NULL REFERENCES movies (id), '
+    'rating INTEGER, review VARCHAR(512), CHECK (rating >= 0 and rating <= 10))',
+    "INSERT INTO movies (name, year) VALUES ('film', 2020)",
+]
+
+
+def index_names(engine, table):
+    return {index['name'] for index in inspect(engine).get_indexes(table)}
+
+
+def test_fresh_database_is_stamped(tmp_path):
+    engine = create_engine(f'sqlite:///{tmp_path}/fresh.db')
+    init_db(engine)
+    assert engine.execute('SELECT version_num FROM alembic_version').scalar() == '0002'
+    assert 'uq_movies_name_year' in index_names(engine, 'movies')
+    assert 'ix_movierating_user_id_id' in index_names(engine, 'movierating')
+
+
+def test_legacy_database_is_migrated(tmp_path):
+    engine = create_engine(f'sqlite:///{tmp_path}/legacy.db')
+    for statement in LEGACY_SCHEMA:
+        engine.execute(statement)
+    init_db(engine)
+    assert index_names(engine, 'movies') == {'uq_movies_name_year', 'ix_movies_year'}
+    assert index_names(engine, 'movierating') == {
+        'uq_movierating_user_movie',
+        'ix_movierating_movie_id',
+        'ix_movierating_user_id_id',
+    }
+    assert engine.execute('SELECT name FROM movies').scalar() == 'film'
+    init_db(engine)
+    with engine.begin() as connection:
+        command.downgrade(migrations_config(connection), 'base')
+    assert index_names(engine, 'movies') == set()
+
+
+def test_duplicates_are_merged_before_indexing(tmp_path):
+    engine = create_engine(f'sqlite:///{tmp_path}/duplicates.db')
+    for statement in LEGACY_SCHEMA + [
+        "INSERT INTO users (username, password_hash) VALUES ('user', 'hash')",
+        "INSERT INTO movies (name, year) VALUES ('other', NULL), ('other', NULL), "
+        "('film', 2020)",
+        'INSERT INTO movierating (user_id, movie_id, rating, review) VALUES '
+        "(1, 1, 5, NULL), (1, 2, 9, NULL), (1, 4, NULL, 'good'), (1, 1, 7, NULL)",
+    ]:
+        engine.execute(statement)
+    init_db(engine)
+    assert engine.execute('SELECT id, name FROM movies ORDER BY id').fetchall() == [
+        (1, 'film'),
+        (2, 'other'),
+        (3, 'other'),
+    ]
+    ratings = 'SELECT id, movie_id, rating, review FROM movierating ORDER BY id'
+    assert engine.execute(ratings).fetchall() == [(1, 1, 7, 'good'), (2, 2, 9, None)]
+    stats = (
+        'SELECT movie_id, rating_sum, rating_count, review_count FROM moviestats '
+        'ORDER BY movie_id'
+    )
+    assert engine.execute(stats).fetchall() == [
+        (1, 7, 1, 1),
+        (2, 9, 1, 0),
+        (3, 0, 0, 0),
+    ]
+    assert 'uq_movierating_user_movie' in index_names(engine, 'movierating')
@@ -1,14 +1,38 @@
+import asyncio
 import base64
 import json
+import re
 from http import HTTPStatus
 
 import pytest
-from movies.api import app
+from flask import jsonify
+from movies import database
+from movies.api import create_app
+from movies.asgi import asgi_request, create_asgi_app
+from movies.credentials import credential_cache
+from movies.database import create_session, init_db
+from movies.hashing import configure_hasher, password_hasher
+from movies.models import Movie, MovieRating, MovieStats, User
+from movies.state import catalog, rating_queue, response_cache
+from movies.streaming import stream_response
+from sqlalchemy import event
+from sqlalchemy.orm import Query
 
 
 @pytest.fixture(scope='module')
-def test_client():
-    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+def config(tmp_path_factory):
+    database = tmp_path_factory.mktemp('api') / 'movies-rating.db'
+    return {'TESTING': True, 'SQLALCHEMY_DATABASE_URI': f'sqlite:///{database}'}
+
+
+@pytest.fixture(scope='module')
+def app(config):
+    return create_app(config)
+
+
+@pytest.fixture(scope='module')
+def test_client(app):
+    init_db()
     testing_client = app.test_client()
     ctx = app.app_context()
     ctx.push()
@@ -206,6 +230,25 @@ def test_rate_movie_error(test_client):
     assert response.status_code == HTTPStatus.BAD_REQUEST
 
 
+def test_rate_movie_invalid_rating(test_client):
+    headers = {
+        'Authorization': 'Basic ' + base64.b64encode(b'user:pass').decode('utf-8')
+    }
+    for rating in (11, -1, 7.5, 'x', '', True, [5]):
+        response = test_client.post(
+            '/movies/1/ratings', json={'rating': rating}, headers=headers
+        )
+        assert response.status_code == HTTPStatus.BAD_REQUEST, rating
+    response = test_client.post(
+        '/movies/1/ratings', json={'rating': '5'}, headers=headers
+    )
+    assert response.status_code == HTTPStatus.CREATED
+    assert json.loads(response.data) == {'name': 'film', 'rating': 5, 'review': 'good'}
+    with create_session() as session:
+        assert session.query(MovieRating.rating).filter_by(movie_id=1).scalar() == 5
+        assert session.query(MovieStats.rating_sum).filter_by(movie_id=1).scalar() == 5
+
+
 def test_search_movie_top(test_client):
     response = test_client.get(
         '/movies?top=1',
@@ -333,3 +376,737 @@ def get_rating_error(test_client):
         },
     )
     assert response.status_code == HTTPStatus.BAD_REQUEST
+
+
+def test_get_movie_rating_stats(test_client):
+    headers = {
+        'Authorization': 'Basic ' + base64.b64encode(b'user:pass').decode('utf-8')
+    }
+    response = test_client.get('/movies/1/ratings?avg=true', headers=headers)
+    assert json.loads(response.data) == {'Movie': 'film', 'Average rating': 5}
+    response = test_client.get('/movies/1/ratings?rates=true', headers=headers)
+    assert json.loads(response.data) == {'Movie': 'film', 'Number of rates': 1}
+    response = test_client.get('/movies/1/ratings?reviews=true', headers=headers)
+    assert json.loads(response.data) == {'Movie': 'film', 'Number of reviews': 1}
+    test_client.post('/movies/1/ratings', json={'rating': 7}, headers=headers)
+    response = test_client.get('/movies/1/ratings?avg=true', headers=headers)
+    assert json.loads(response.data) == {'Movie': 'film', 'Average rating': 7}
+
+
+def test_rebuild_stats(app, test_client):
+    result = app.test_cli_runner().invoke(args=['rebuild-stats'])
+    assert result.exit_code == 0
+    assert 'Rebuilt rating stats' in result.output
+    response = test_client.get(
+        '/movies/1/ratings?avg=true',
+        headers={
+            'Authorization': 'Basic ' + base64.b64encode(b'user:pass').decode('utf-8')
+        },
+    )
+    assert json.loads(response.data) == {'Movie': 'film', 'Average rating': 7}
+
+
+def test_missing_stats_are_rebuilt(test_client):
+    headers = {
+        'Authorization': 'Basic ' + base64.b64encode(b'user:pass').decode('utf-8')
+    }
+    with create_session() as session:
+        session.query(MovieStats).delete()
+    response = test_client.get('/movies/1/ratings?rates=true', headers=headers)
+    assert json.loads(response.data) == {'Movie': 'film', 'Number of rates': 1}
+    with create_session() as session:
+        session.query(MovieStats).delete()
+    test_client.post('/movies/1/ratings', json={'rating': 9}, headers=headers)
+    response = test_client.get('/movies/1/ratings?avg=true', headers=headers)
+    assert json.loads(response.data) == {'Movie': 'film', 'Average rating': 9}
+
+
+def test_search_movie_cursor(test_client):
+    headers = {
+        'Authorization': 'Basic ' + base64.b64encode(b'user:pass').decode('utf-8')
+    }
+    ids, cursor = [], ''
+    while cursor is not None:
+        response = test_client.get(f'/movies?size=3&cursor={cursor}', headers=headers)
+        assert response.status_code == HTTPStatus.OK
+        data = json.loads(response.data)
+        ids.extend(movie['id'] for movie in data['Movies'])
+        cursor = data['next_cursor']
+    assert ids == [1, 2, 3, 4]
+    response = test_client.get('/movies?year=2020&size=1&cursor=', headers=headers)
+    data = json.loads(response.data)
+    assert [movie['id'] for movie in data['Movies']] == [1]
+    response = test_client.get(
+        f'/movies?year=2020&size=5&cursor={data["next_cursor"]}', headers=headers
+    )
+    data = json.loads(response.data)
+    assert [movie['id'] for movie in data['Movies']] == [2, 4]
+    assert data['next_cursor'] is None
+    response = test_client.get('/movies?filter=film_&cursor=', headers=headers)
+    assert [movie['id'] for movie in json.loads(response.data)['Movies']] == [3, 4]
+    response = test_client.get('/movies?top=1&size=1&cursor=', headers=headers)
+    data = json.loads(response.data)
+    assert data == {
+        'Movies': [{'id': 1, 'name': 'film', 'year': 2020}],
+        'next_cursor': None,
+    }
+
+
+def test_search_movie_cursor_error(test_client):
+    response = test_client.get('/movies?cursor=not-a-cursor')
+    assert response.status_code == HTTPStatus.BAD_REQUEST
+    response = test_client.get('/movies?top=1&cursor=WzFd')
+    assert response.status_code == HTTPStatus.BAD_REQUEST
+    for size in ('0', '-1', '1001', 'x'):
+        response = test_client.get(f'/movies?cursor=&size={size}')
+        assert response.status_code == HTTPStatus.BAD_REQUEST
+        response = test_client.get(f'/movies?top=1&cursor=&size={size}')
+        assert response.status_code == HTTPStatus.BAD_REQUEST
+
+
+def test_search_movie_page_total(test_client):
+    response = test_client.get('/movies?page=2&size=3&total=1')
+    assert json.loads(response.data) == {
+        'Movies': [{'id': 4, 'name': 'film_without_rating', 'year': 2020}],
+        'total': 4,
+    }
+    response = test_client.get('/movies?top=1&page=1&size=3&total=1')
+    assert json.loads(response.data)['total'] == 1
+    response = test_client.get('/movies?page=0&size=3')
+    assert response.status_code == HTTPStatus.BAD_REQUEST
+
+
+def test_search_movie_match(test_client):
+    response = test_client.get('/movies?filter=FILM&match=prefix')
+    assert [movie['id'] for movie in json.loads(response.data)['Movies']] == [1, 3, 4]
+    response = test_client.get('/movies?filter=film&match=ranked')
+    assert [movie['id'] for movie in json.loads(response.data)['Movies']] == [
+        1,
+        3,
+        4,
+        2,
+    ]
+    response = test_client.get('/movies?filter=film&match=fuzzy')
+    assert response.status_code == HTTPStatus.BAD_REQUEST
+    response = test_client.get('/movies?filter=film&match=ranked&cursor=')
+    assert response.status_code == HTTPStatus.BAD_REQUEST
+
+
+def test_rebuild_search_index(app, test_client):
+    result = app.test_cli_runner().invoke(args=['rebuild-search-index'])
+    assert result.exit_code == 0
+    assert 'Rebuilt search index for 4 movies' in result.output
+    response = test_client.get('/movies?filter=new')
+    assert json.loads(response.data) == {
+        'Movies': [{'id': 2, 'name': 'new_film', 'year': 2020}]
+    }
+
+
+def test_queries_use_indexes(test_client):
+    headers = {
+        'Authorization': 'Basic ' + base64.b64encode(b'user:pass').decode('utf-8')
+    }
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith(('SELECT', 'UPDATE', 'DELETE')):
+            statements.append((statement, parameters))
+
+    event.listen(database.get_engine(), 'before_cursor_execute', record)
+    try:
+        test_client.post(
+            '/movies', json={'name': 'film', 'year': 2020}, headers=headers
+        )
+        test_client.post('/movies/2/ratings', json={'rating': 3}, headers=headers)
+        test_client.get('/movies?year=2021', headers=headers)
+        test_client.get('/movies?filter=without', headers=headers)
+        test_client.get('/movies/1/ratings', headers=headers)
+        test_client.get('/movies/1/ratings?avg=true', headers=headers)
+        test_client.get('/ratings/1', headers=headers)
+    finally:
+        event.remove(database.get_engine(), 'before_cursor_execute', record)
+    assert statements
+    connection = database.get_engine().raw_connection()
+    try:
+        for statement, parameters in statements:
+            plan = connection.execute(f'EXPLAIN QUERY PLAN {statement}', parameters)
+            for row in plan.fetchall():
+                assert not re.match(r'SCAN (TABLE )?\w+$', row[-1]), statement
+    finally:
+        connection.close()
+
+
+def test_add_movies_bulk(test_client):
+    headers = {
+        'Authorization': 'Basic ' + base64.b64encode(b'user:pass').decode('utf-8')
+    }
+    response = test_client.post(
+        '/movies/bulk',
+        json=[{'name': 'film', 'year': 2020}, {'name': 'bulk_film', 'year': 2022}],
+        headers=headers,
+    )
+    assert response.status_code == HTTPStatus.OK
+    data = json.loads(response.data)
+    assert data['results'] == [
+        {'index': 0, 'status': 'exists', 'id': 1},
+        {'index': 1, 'status': 'created', 'id': 5},
+    ]
+    assert data['counts'] == {'exists': 1, 'created': 1}
+    assert data['rows_per_second'] > 0
+    response = test_client.post(
+        '/movies/bulk',
+        data=b'{"name": "bulk_film_2", "year": 2022}\n\nnot json\n',
+        content_type='application/x-ndjson',
+        headers=headers,
+    )
+    assert [item['status'] for item in json.loads(response.data)['results']] == [
+        'created',
+        'error',
+    ]
+    response = test_client.post('/movies/bulk', json={'name': 'x'}, headers=headers)
+    assert response.status_code == HTTPStatus.BAD_REQUEST
+
+
+def test_rate_movies_bulk(test_client):
+    headers = {
+        'Authorization': 'Basic ' + base64.b64encode(b'user:pass').decode('utf-8')
+    }
+    response = test_client.post(
+        '/ratings/bulk',
+        json=[
+            {'movie_id': 5, 'rating': 10},
+            {'movie_id': 5, 'user_id': 2, 'rating': 1},
+        ],
+        headers=headers,
+    )
+    assert [item['status'] for item in json.loads(response.data)['results']] == [
+        'created',
+        'error',
+    ]
+    response = test_client.get('/movies?top=1', headers=headers)
+    assert json.loads(response.data) == {
+        'Movies': [{'id': 5, 'name': 'bulk_film', 'year': 2022}]
+    }
+
+
+def test_search_movie_stream(test_client):
+    response = test_client.get('/movies')
+    expected = json.loads(response.data)
+    response = test_client.get('/movies?stream=1')
+    assert response.is_streamed
+    assert response.mimetype == 'application/json'
+    assert json.loads(response.data) == expected
+    response = test_client.get('/movies', headers={'Accept': 'application/x-ndjson'})
+    assert response.mimetype == 'application/x-ndjson'
+    lines = response.data.decode('utf-8').splitlines()
+    assert [json.loads(line) for line in lines] == expected['Movies']
+    response = test_client.get('/movies?year=2022&stream=ndjson')
+    assert [json.loads(line)['id'] for line in response.data.splitlines()] == [5, 6]
+
+
+def test_get_movie_rating_stream(test_client):
+    headers = {
+        'Authorization': 'Basic ' + base64.b64encode(b'user:pass').decode('utf-8')
+    }
+    expected = json.loads(test_client.get('/movies/1/ratings', headers=headers).data)
+    response = test_client.get('/movies/1/ratings?stream=1', headers=headers)
+    assert json.loads(response.data) == expected
+    response = test_client.get('/movies/4/ratings?stream=1', headers=headers)
+    assert json.loads(response.data) == {
+        'Movie': 'film_without_rating',
+        'Ratings and reviews': [],
+    }
+
+
+def test_stream_response_batches():
+    query = Query([Movie.id, Movie.name, Movie.year]).order_by(Movie.id)
+    response = stream_response(
+        query, lambda row: {'id': row.id}, 'application/json', 'Movies', batch_size=2
+    )
+    chunks = list(response.response)
+    assert len(chunks) == 5
+    assert json.loads(b''.join(chunks)) == {'Movies': [{'id': i} for i in range(1, 7)]}
+
+
+def test_response_cache_etag(test_client):
+    headers = {
+        'Authorization': 'Basic ' + base64.b64encode(b'user:pass').decode('utf-8')
+    }
+    response = test_client.get('/movies/5/ratings?avg=1', headers=headers)
+    etag = response.headers['ETag']
+    response = test_client.get(
+        '/movies/5/ratings?avg=1', headers={**headers, 'If-None-Match': etag}
+    )
+    assert response.status_code == HTTPStatus.NOT_MODIFIED
+    test_client.post('/movies/5/ratings', json={'rating': 6}, headers=headers)
+    response = test_client.get(
+        '/movies/5/ratings?avg=1', headers={**headers, 'If-None-Match': etag}
+    )
+    assert response.status_code == HTTPStatus.OK
+    assert json.loads(response.data)['Average rating'] == 6
+
+
+def test_instrumentation(app, test_client, tmp_path):
+    headers = {
+        'Authorization': 'Basic ' + base64.b64encode(b'user:pass').decode('utf-8')
+    }
+    response = test_client.get('/ratings/1', headers=headers)
+    assert 'Server-Timing' not in response.headers
+    assert test_client.get('/metrics').status_code == HTTPStatus.NOT_FOUND
+    app.config.update(
+        INSTRUMENTATION=True,
+        PROFILE_SAMPLE_RATE=1.0,
+        PROFILE_SLOW_SECONDS=0.0,
+        PROFILE_DIR=str(tmp_path),
+    )
+    try:
+        response = test_client.get('/ratings/1', headers=headers)
+        timing = response.headers['Server-Timing']
+        assert re.search(r'sql;dur=[\d.]+;desc="\d+ queries"', timing)
+        assert re.search(r'auth;dur=[\d.]+', timing)
+        assert re.search(r'serialize;dur=[\d.]+', timing)
+        assert re.search(r'total;dur=[\d.]+$', timing)
+        assert list(tmp_path.glob('get_rating-*.prof'))
+        response = test_client.get('/metrics')
+        assert response.mimetype == 'text/plain'
+        assert 'movies_requests_total{endpoint="get_rating",status="200"} 1' in (
+            response.data.decode('utf-8')
+        )
+    finally:
+        app.config.update(INSTRUMENTATION=False, PROFILE_SAMPLE_RATE=0.0)
+
+
+def test_asgi_parity(config, test_client):
+    headers = {
+        'Authorization': 'Basic ' + base64.b64encode(b'user:pass').decode('utf-8')
+    }
+    asgi_app = create_asgi_app(config)
+    requests = [
+        ('GET', '/users/1', None, headers),
+        ('GET', '/users/1', None, {}),
+        ('POST', '/users', {'username': 'user', 'password': 'pass'}, {}),
+        ('GET', '/movies/1', None, headers),
+        ('GET', '/movies?filter=film&match=ranked', None, {}),
+        ('GET', '/movies?top=2', None, {}),
+        ('GET', '/movies?stream=ndjson', None, {}),
+        ('GET', '/movies/1/ratings', None, headers),
+        ('GET', '/movies/1/ratings?avg=1', None, headers),
+        ('GET', '/ratings/1', None, headers),
+        ('GET', '/ratings/999', None, headers),
+    ]
+    try:
+        for method, path, body, request_headers in requests:
+            expected = test_client.open(
+                path, method=method, json=body, headers=request_headers
+            )
+            if body is not None:
+                request_headers = {
+                    **request_headers,
+                    'Content-Type': 'application/json',
+                }
+            status, response_headers, data = asyncio.run(
+                asgi_request(
+                    asgi_app,
+                    method,
+                    path,
+                    json.dumps(body).encode('utf-8') if body is not None else b'',
+                    request_headers,
+                )
+            )
+            assert status == expected.status_code, path
+            assert response_headers['content-type'] == expected.content_type, path
+            assert data == expected.data, path
+    finally:
+        asgi_app.shutdown()
+
+
+def test_password_hashing_overload(app, test_client):
+    headers = {
+        'Authorization': 'Basic ' + base64.b64encode(b'user:pass').decode('utf-8')
+    }
+    credential_cache.clear()
+    password_hasher.queue_size = 0
+    try:
+        response = test_client.get('/users/1', headers=headers)
+        assert response.status_code == HTTPStatus.SERVICE_UNAVAILABLE
+        assert response.headers['Retry-After'] == '1'
+    finally:
+        password_hasher.queue_size = app.config['HASH_QUEUE_SIZE']
+    assert test_client.get('/users/1', headers=headers).status_code == HTTPStatus.OK
+
+
+def test_password_rehash_on_login(app, test_client):
+    headers = {
+        'Authorization': 'Basic ' + base64.b64encode(b'user:pass').decode('utf-8')
+    }
+    credential_cache.clear()
+    configure_hasher({**app.config, 'HASH_ROUNDS': 1000})
+    try:
+        assert test_client.get('/users/1', headers=headers).status_code == HTTPStatus.OK
+    finally:
+        configure_hasher(app.config)
+    with create_session() as session:
+        assert '$rounds=1000$' in session.query(User).get(1).password_hash
+    credential_cache.clear()
+    assert test_client.get('/users/1', headers=headers).status_code == HTTPStatus.OK
+
+
+def test_bearer_tokens(test_client):
+    headers = {
+        'Authorization': 'Basic ' + base64.b64encode(b'user:pass').decode('utf-8')
+    }
+    response = test_client.post('/tokens', headers=headers)
+    assert response.status_code == HTTPStatus.CREATED
+    token = json.loads(response.data)['token']
+    bearer = {'Authorization': f'Bearer {token}'}
+    assert test_client.post('/tokens', headers=bearer).status_code == (
+        HTTPStatus.UNAUTHORIZED
+    )
+    credential_cache.clear()
+    assert test_client.get('/users/1', headers=bearer).status_code == HTTPStatus.OK
+    assert credential_cache.stats()['misses'] == 0
+    response = test_client.post('/movies/2/ratings', json={'rating': 7}, headers=bearer)
+    assert response.status_code == HTTPStatus.CREATED
+    response = test_client.get('/ratings/1', headers=bearer)
+    assert json.loads(response.data)['user'] == 'user'
+    assert test_client.delete('/tokens', headers=headers).status_code == (
+        HTTPStatus.UNAUTHORIZED
+    )
+    assert test_client.delete('/tokens', headers=bearer).status_code == (
+        HTTPStatus.NO_CONTENT
+    )
+    response = test_client.get('/users/1', headers=bearer)
+    assert response.status_code == HTTPStatus.UNAUTHORIZED
+    assert response.headers['WWW-Authenticate'].startswith('Bearer')
+    response = test_client.get('/users/1', headers={'Authorization': 'Bearer x.y'})
+    assert response.status_code == HTTPStatus.UNAUTHORIZED
+    token = json.loads(test_client.post('/tokens', headers=headers).data)['token']
+    forged = {'Authorization': f'Bearer {token.partition(".")[0]}.\u00e9\u00e9'}
+    response = test_client.get('/users/1', headers=forged)
+    assert response.status_code == HTTPStatus.UNAUTHORIZED
+
+
+def test_apps_do_not_share_state(app, config, test_client):
+    headers = {
+        'Authorization': 'Basic ' + base64.b64encode(b'user:pass').decode('utf-8')
+    }
+    token = json.loads(test_client.post('/tokens', headers=headers).data)['token']
+    other = create_app(config)
+    assert other.extensions['movies'] is not app.extensions['movies']
+    bearer = {'Authorization': f'Bearer {token}'}
+    assert test_client.get('/users/1', headers=bearer).status_code == HTTPStatus.OK
+    response = other.test_client().get('/users/1', headers=bearer)
+    assert response.status_code == HTTPStatus.UNAUTHORIZED
+    with other.app_context():
+        assert (
+            response_cache.backend
+            is not app.extensions['movies'].response_cache.backend
+        )
+
+
+@pytest.mark.parametrize(
+    'method, path, body, limit',
+    [
+        # Insert-if-missing, locked read, update, stats update and read.
+        ('POST', '/movies/1/ratings', {'rating': 4}, 5),
+        ('POST', '/movies/1/ratings', {'review': 'again'}, 5),
+        ('GET', '/ratings/1', None, 1),
+        ('GET', '/movies/1/ratings', None, 1),
+        ('GET', '/movies/1/ratings?avg=1', None, 1),
+        ('GET', '/movies/1', None, 1),
+        ('GET', '/movies?ids=1,2,100000', None, 2),
+    ],
+)
+def test_statement_count(test_client, method, path, body, limit):
+    headers = {
+        'Authorization': 'Basic ' + base64.b64encode(b'user:pass').decode('utf-8')
+    }
+    test_client.get('/users/1', headers=headers)
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    backend, response_cache.backend = response_cache.backend, None
+    event.listen(database.get_engine(), 'before_cursor_execute', record)
+    try:
+        response = test_client.open(path, method=method, json=body, headers=headers)
+    finally:
+        event.remove(database.get_engine(), 'before_cursor_execute', record)
+        response_cache.backend = backend
+    assert response.status_code in (HTTPStatus.OK, HTTPStatus.CREATED)
+    assert len(statements) <= limit, statements
+
+
+def test_rating_queue(app, test_client):
+    headers = {
+        'Authorization': 'Basic ' + base64.b64encode(b'user:pass').decode('utf-8')
+    }
+    app.config['RATING_QUEUE'] = True
+    try:
+        response = test_client.post(
+            '/movies/2/ratings', json={'rating': 9}, headers=headers
+        )
+        assert response.status_code == HTTPStatus.ACCEPTED
+        assert json.loads(response.data) == {
+            'name': 'new_film',
+            'rating': 9,
+            'review': None,
+        }
+        response = test_client.post(
+            '/movies/2/ratings', json={'review': 'queued'}, headers=headers
+        )
+        assert response.status_code == HTTPStatus.ACCEPTED
+        for body in ({'rating': 11}, {'rating': 'x'}):
+            response = test_client.post('/movies/2/ratings', json=body, headers=headers)
+            assert response.status_code == HTTPStatus.BAD_REQUEST
+        response = test_client.post(
+            '/movies/999/ratings', json={'rating': 1}, headers=headers
+        )
+        assert response.status_code == HTTPStatus.BAD_REQUEST
+        max_size, rating_queue.max_size = rating_queue.max_size, 0
+        try:
+            response = test_client.post(
+                '/movies/3/ratings', json={'rating': 1}, headers=headers
+            )
+        finally:
+            rating_queue.max_size = max_size
+        assert response.status_code == HTTPStatus.SERVICE_UNAVAILABLE
+    finally:
+        app.config['RATING_QUEUE'] = False
+    rating_queue.drain()
+    response = test_client.get('/movies/2/ratings', headers=headers)
+    assert {'Rating': 9, 'Review': 'queued'} in json.loads(response.data)[
+        'Ratings and reviews'
+    ]
+    assert rating_queue.stats()['flushed'] >= 1
+
+
+@pytest.mark.parametrize(
+    'path',
+    [
+        '/movies',
+        '/movies?year=2020',
+        '/movies?year=1999',
+        '/movies?size=2&page=2',
+        '/movies?year=2020&size=1&page=1',
+        '/movies?cursor=&size=2',
+        '/movies?cursor=WzJd&size=2&year=2020',
+        '/movies?cursor=bad',
+        '/movies?cursor=&size=0',
+        '/movies?cursor=&size=-1',
+        '/movies?cursor=&size=1001',
+        '/movies?size=0&page=1',
+        '/movies/2',
+        '/movies/999',
+    ],
+)
+def test_catalog_parity(app, test_client, path):
+    headers = {
+        'Authorization': 'Basic ' + base64.b64encode(b'user:pass').decode('utf-8')
+    }
+    backend, response_cache.backend = response_cache.backend, None
+    try:
+        expected = test_client.get(path, headers=headers)
+        app.config['CATALOG'] = True
+        catalog.invalidate()
+        try:
+            response = test_client.get(path, headers=headers)
+        finally:
+            app.config['CATALOG'] = False
+    finally:
+        response_cache.backend = backend
+    assert response.status_code == expected.status_code
+    assert response.data == expected.data
+
+
+def test_catalog_add_movie(app, test_client):
+    headers = {
+        'Authorization': 'Basic ' + base64.b64encode(b'user:pass').decode('utf-8')
+    }
+    with create_session() as session:
+        catalog.rebuild(session)
+    app.config['CATALOG'] = True
+    try:
+        count = len(catalog)
+        response = test_client.post(
+            '/movies', json={'name': 'catalog_film', 'year': 1999}, headers=headers
+        )
+        assert response.status_code == HTTPStatus.CREATED
+        movie_id = response.get_json()['id']
+        assert not catalog.stale
+        assert catalog.get(None, movie_id).name == 'catalog_film'
+        assert len(test_client.get('/movies').get_json()['Movies']) == count + 1
+        response = test_client.get('/movies?year=1999')
+        assert response.get_json()['Movies'] == [
+            {'id': movie_id, 'name': 'catalog_film', 'year': 1999}
+        ]
+    finally:
+        app.config['CATALOG'] = False
+
+
+@pytest.mark.parametrize(
+    'path',
+    [
+        '/movies',
+        '/movies?size=2&page=1&total=1',
+        '/movies?cursor=&size=1',
+        '/movies?top=2',
+        '/movies/1/ratings',
+    ],
+)
+def test_json_bytes_match_jsonify(test_client, path):
+    headers = {
+        'Authorization': 'Basic ' + base64.b64encode(b'user:pass').decode('utf-8')
+    }
+    response = test_client.get(path, headers=headers)
+    assert response.status_code == HTTPStatus.OK
+    assert response.mimetype == 'application/json'
+    assert response.data == jsonify(json.loads(response.data)).get_data()
+
+
+def test_rating_histogram(app, test_client, tmp_path):
+    headers = {
+        'Authorization': 'Basic ' + base64.b64encode(b'user:pass').decode('utf-8')
+    }
+    path = '/movies/1/ratings?histogram=1'
+    backend, response_cache.backend = response_cache.backend, None
+    try:
+        response = test_client.get(path, headers=headers)
+        assert response.status_code == HTTPStatus.OK
+        live = response.get_json()
+        ratings = test_client.get('/movies/1/ratings', headers=headers).get_json()
+        scores = [r['Rating'] for r in ratings['Ratings and reviews']]
+        assert live['Rating histogram'] == [scores.count(i) for i in range(11)]
+        response = test_client.get(
+            '/movies/100000/ratings?histogram=1', headers=headers
+        )
+        assert response.status_code == HTTPStatus.BAD_REQUEST
+
+        pytest.importorskip('numpy')
+        app.config['ANALYTICS_DIR'] = str(tmp_path)
+        try:
+            # No export yet, then one whose files are gone.
+            assert test_client.get(path, headers=headers).get_json() == live
+            (tmp_path / 'meta.json').write_text('{"generation": "gone"}')
+            assert test_client.get(path, headers=headers).get_json() == live
+            runner = app.test_cli_runner()
+            result = runner.invoke(args=['export-rating-stats', str(tmp_path)])
+            assert result.exit_code == 0, result.output
+            assert test_client.get(path, headers=headers).get_json() == live
+        finally:
+            app.config['ANALYTICS_DIR'] = None
+    finally:
+        response_cache.backend = backend
+
+
+def test_movie_lookup(test_client):
+    headers = {
+        'Authorization': 'Basic ' + base64.b64encode(b'user:pass').decode('utf-8')
+    }
+    assert test_client.get('/movies?ids=1,2').status_code == HTTPStatus.UNAUTHORIZED
+    response = test_client.get('/movies?ids=1,100000,1', headers=headers)
+    assert response.status_code == HTTPStatus.OK
+    items = response.get_json()['Movies']
+    assert items[0] == items[2]
+    assert items[1] == {'id': 100000, 'error': 'not found'}
+    # Earlier tests wrote ratings with the cache off, so skip it here.
+    backend, response_cache.backend = response_cache.backend, None
+    try:
+        movie = test_client.get('/movies/1', headers=headers).get_json()
+        average = test_client.get('/movies/1/ratings?avg=1', headers=headers)
+        rates = test_client.get('/movies/1/ratings?rates=1', headers=headers)
+    finally:
+        response_cache.backend = backend
+    assert items[0]['name'] == movie['movie']
+    assert items[0]['year'] == movie['year']
+    assert items[0]['average_rating'] == average.get_json()['Average rating']
+    assert items[0]['rating_count'] == rates.get_json()['Number of rates']
+
+    response = test_client.post(
+        '/movies/lookup', json={'ids': [1, 100000, 1]}, headers=headers
+    )
+    assert response.get_json()['Movies'] == items
+    for body in ({'ids': []}, {'ids': ['x']}, [1], {'ids': list(range(1001))}):
+        response = test_client.post('/movies/lookup', json=body, headers=headers)
+        assert response.status_code == HTTPStatus.BAD_REQUEST
+    response = test_client.get('/movies?ids=1,x', headers=headers)
+    assert response.status_code == HTTPStatus.BAD_REQUEST
+
+
+def test_user_ratings(test_client):
+    headers = {
+        'Authorization': 'Basic ' + base64.b64encode(b'user:pass').decode('utf-8')
+    }
+    with create_session() as session:
+        expected = [
+            (row.id, row.movie_id, row.rating, row.review)
+            for row in session.query(MovieRating)
+            .filter(MovieRating.user_id == 1)
+            .order_by(MovieRating.id)
+        ]
+    assert len(expected) > 1
+    backend, response_cache.backend = response_cache.backend, None
+    try:
+        pages, cursor = [], ''
+        while cursor is not None:
+            response = test_client.get(
+                f'/users/1/ratings?size=1&cursor={cursor}', headers=headers
+            )
+            assert response.status_code == HTTPStatus.OK
+            body = response.get_json()
+            assert body['User'] == 'user'
+            pages.append(body['Ratings'])
+            cursor = body['next_cursor']
+        response = test_client.get('/users/1/ratings?stream=ndjson', headers=headers)
+        streamed = [json.loads(line) for line in response.data.splitlines()]
+    finally:
+        response_cache.backend = backend
+    assert [len(page) for page in pages] == [1] * len(expected)
+    items = [item for page in pages for item in page]
+    assert [
+        (item['id'], item['movie_id'], item['rating'], item['review']) for item in items
+    ] == expected
+    assert items[0]['movie'] == 'film'
+    assert streamed == items
+    for path in (
+        '/users/1/ratings?size=0',
+        '/users/1/ratings?size=1001',
+        '/users/1/ratings?cursor=x',
+        '/users/100000/ratings',
+    ):
+        assert test_client.get(path, headers=headers).status_code == (
+            HTTPStatus.BAD_REQUEST
+        )
+    assert test_client.get('/users/1/ratings').status_code == (HTTPStatus.UNAUTHORIZED)
+
+
+def test_similar_movies(app, test_client, tmp_path):
+    headers = {
+        'Authorization': 'Basic ' + base64.b64encode(b'user:pass').decode('utf-8')
+    }
+    response = test_client.get('/movies/1/similar', headers=headers)
+    assert response.status_code == HTTPStatus.SERVICE_UNAVAILABLE
+
+    pytest.importorskip('scipy')
+    app.config['SIMILARITY_DIR'] = str(tmp_path)
+    try:
+        response = test_client.get('/movies/1/similar', headers=headers)
+        assert response.status_code == HTTPStatus.SERVICE_UNAVAILABLE
+        runner = app.test_cli_runner()
+        result = runner.invoke(args=['build-similarity', str(tmp_path), '--k', '3'])
+        assert result.exit_code == 0, result.output
+        response = test_client.get('/movies/1/similar?k=2', headers=headers)
+        assert response.status_code == HTTPStatus.OK
+        body = response.get_json()
+        assert body['Movie'] == 'film'
+        assert len(body['Similar']) <= 2
+        for item in body['Similar']:
+            assert set(item) == {'id', 'name', 'year', 'score'}
+            assert 0 < item['score'] <= 1 + 1e-6
+        for path in ('/movies/1/similar?k=0', '/movies/100000/similar'):
+            assert test_client.get(path, headers=headers).status_code == (
+                HTTPStatus.BAD_REQUEST
+            )
+    finally:
+        app.config['SIMILARITY_DIR'] = None
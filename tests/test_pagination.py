@@ -0,0 +1,78 @@
+import pytest
+from movies.database import Base
+from movies.leaderboard import Leaderboard, top_movies_query
+from movies.models import Movie, MovieStats
+from movies.pagination import (
+    decode_cursor,
+    encode_cursor,
+    keyset_page,
+    seek_by_average,
+    seek_by_id,
+)
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+
+@pytest.fixture()
+def session():
+    engine = create_engine('sqlite://')
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+    for i in range(1, 21):
+        session.add(Movie(f'film_{i}', 2000 + i))
+        session.add(MovieStats(i, i % 4, 1, 0, float(i % 4) + 0.5))
+    session.commit()
+    yield session
+    session.close()
+
+
+def test_cursor_round_trip():
+    assert decode_cursor(encode_cursor([3.5, 7]), 2) == [3.5, 7]
+    assert decode_cursor('', 1) is None
+
+
+@pytest.mark.parametrize('cursor', ['!!!', 'e30', encode_cursor([1, 2]), 'WyJhIl0'])
+def test_malformed_cursor(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor, 1)
+
+
+def walk(fetch, key, size=3):
+    seen, after = [], None
+    while True:
+        rows, cursor = keyset_page(fetch(after, size + 1), size, key)
+        seen.extend(row.id for row in rows)
+        if cursor is None:
+            return seen
+        after = decode_cursor(cursor, len(key(rows[-1])))
+
+
+def test_seek_by_id(session):
+    query = session.query(Movie).filter(Movie.year > 2005)
+    ids = walk(
+        lambda after, limit: seek_by_id(query, after).limit(limit).all(),
+        lambda row: [row.id],
+    )
+    assert ids == list(range(6, 21))
+
+
+def test_seek_by_average_matches_offset_order(session):
+    expected = [row.id for row in top_movies_query(session)]
+    ids = walk(
+        lambda after, limit: seek_by_average(top_movies_query(session), after)
+        .limit(limit)
+        .all(),
+        lambda row: [row.average, row.id],
+    )
+    assert ids == expected
+
+
+def test_leaderboard_after(session):
+    expected = [row.id for row in top_movies_query(session)]
+    leaderboard = Leaderboard(capacity=8, max_age=None)
+    first = leaderboard.after(session, None, 4)
+    assert [movie.id for movie in first] == expected[:4]
+    last = first[-1]
+    rest = leaderboard.after(session, (-last.average, last.id), 4)
+    assert [movie.id for movie in rest] == expected[4:8]
+    assert leaderboard.after(session, (-last.average, last.id), 5) is None
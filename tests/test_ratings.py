@@ -0,0 +1,66 @@
+import pytest
+from movies.database import Base
+from movies.models import Movie, MovieRating, User
+from movies.ratings import insert_empty_ratings, update_ratings
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+
+@pytest.fixture()
+def session():
+    engine = create_engine('sqlite://')
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+    user = User('user')
+    user.password_hash = 'hash'
+    session.add_all([user, Movie('first', 2020), Movie('second', 2021)])
+    session.commit()
+    yield session
+    session.close()
+
+
+def ratings(session):
+    return [
+        (row.id, row.movie_id, row.rating, row.review)
+        for row in session.query(MovieRating).order_by(MovieRating.id)
+    ]
+
+
+def test_insert_empty_ratings(session):
+    insert_empty_ratings(
+        session,
+        [
+            {'user_id': 1, 'movie_id': 1},
+            {'user_id': 1, 'movie_id': 1},
+            {'user_id': 1, 'movie_id': 3},
+        ],
+    )
+    assert ratings(session) == [(1, 1, None, None)]
+    update_ratings(session, [{'rating_id': 1, 'new_rating': 5, 'new_review': 'fine'}])
+    insert_empty_ratings(session, [{'user_id': 1, 'movie_id': 1}])
+    insert_empty_ratings(session, [])
+    assert ratings(session) == [(1, 1, 5, 'fine')]
+
+
+def test_update_ratings(session):
+    insert_empty_ratings(
+        session, [{'user_id': 1, 'movie_id': 1}, {'user_id': 1, 'movie_id': 2}]
+    )
+    update_ratings(
+        session,
+        [
+            {'rating_id': 1, 'new_rating': 3, 'new_review': None},
+            {'rating_id': 2, 'new_rating': None, 'new_review': 'good'},
+        ],
+    )
+    update_ratings(session, [])
+    assert ratings(session) == [(1, 1, 3, None), (2, 2, None, 'good')]
+
+
+def test_relationships(session):
+    insert_empty_ratings(session, [{'user_id': 1, 'movie_id': 1}])
+    rating = session.query(MovieRating).one()
+    assert rating.movie.name == 'first'
+    assert rating.user.username == 'user'
+    assert session.query(User).one().ratings.count() == 1
+    assert session.query(Movie).get(2).ratings.all() == []
@@ -0,0 +1,246 @@
+import sqlite3
+
+import pytest
+from flask import Flask, jsonify
+from movies import database
+from movies.api import create_app
+from movies.database import Base, configure_engine, create_session, read_only
+from movies.replicas import WROTE_COOKIE, ReadYourWrites, ReplicaSet, route_reads
+from movies.response_cache import MemoryBackend, ResponseCache, cached
+from sqlalchemy import create_engine
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakePool:
+    def __init__(self, checkedout):
+        self.checkedout = lambda: checkedout
+
+
+class FakeEngine:
+    def __init__(self, checkedout=0):
+        self.pool = FakePool(checkedout)
+        self.disposed = False
+
+    def dispose(self):
+        self.disposed = True
+
+
+def test_round_robin():
+    engines = [FakeEngine(), FakeEngine()]
+    replica_set = ReplicaSet(engines)
+    assert [replica_set.choose() for _ in range(4)] == engines * 2
+    replica_set.dispose()
+    assert all(engine.disposed for engine in engines)
+
+
+def test_least_loaded():
+    busy, idle = FakeEngine(3), FakeEngine(1)
+    assert ReplicaSet([busy, idle], 'least_loaded').choose() is idle
+
+
+def test_unknown_policy():
+    assert not ReplicaSet([])
+    with pytest.raises(ValueError):
+        ReplicaSet([], 'random')
+
+
+def test_read_your_writes():
+    clock = Clock()
+    tracker = ReadYourWrites(5.0, clock)
+    tracker.wrote('alice')
+    assert tracker.pinned('alice')
+    assert not tracker.pinned('bob')
+    clock.now += 5.0
+    assert not tracker.pinned('alice')
+    tracker.wrote('bob')
+    assert len(tracker) == 1
+    assert tracker.pinned('carol', tracker.marker())
+    assert not tracker.pinned('carol', str(clock.now))
+    assert not tracker.pinned('carol', 'x')
+
+
+@pytest.fixture
+def databases(tmp_path):
+    urls = []
+    for name in ('primary', 'replica1', 'replica2'):
+        path = tmp_path / f'{name}.db'
+        with sqlite3.connect(path) as connection:
+            connection.execute('CREATE TABLE source (name TEXT)')
+            connection.execute('INSERT INTO source VALUES (?)', (name,))
+        urls.append(f'sqlite:///{path}')
+    previous = database.engine, database.replicas
+    try:
+        configure_engine({'DATABASE_URL': urls[0], 'DATABASE_REPLICA_URLS': urls[1:]})
+        yield
+    finally:
+        database.dispose_engine()
+        database.engine, database.replicas = previous
+        database.Session.configure(bind=database.engine)
+
+
+def _source(readonly=None):
+    with create_session(readonly) as session:
+        return session.execute('SELECT name FROM source').scalar()
+
+
+def test_create_session_routes_reads(databases):
+    assert _source() == 'primary'
+    assert [_source(True) for _ in range(3)] == ['replica1', 'replica2', 'replica1']
+    token = read_only.set(True)
+    try:
+        assert _source() == 'replica2'
+        assert _source(False) == 'primary'
+    finally:
+        read_only.reset(token)
+
+
+def test_replica_sessions_do_not_commit(databases):
+    with create_session(True) as session:
+        session.execute("INSERT INTO source VALUES ('written')")
+    with create_session(True) as session:
+        assert session.execute('SELECT count(*) FROM source').scalar() == 1
+
+
+def test_route_reads(databases):
+    clock = Clock()
+    app = Flask(__name__)
+    route_reads(app, ReadYourWrites(5.0, clock))
+
+    @app.route('/', methods=['GET', 'POST'])
+    def source():
+        return jsonify(_source())
+
+    client = app.test_client()
+    alice = {'Authorization': 'Basic YWxpY2U6cGFzcw=='}
+    assert client.get('/', headers=alice).get_json().startswith('replica')
+    assert client.post('/', headers=alice).get_json() == 'primary'
+    assert client.get('/', headers=alice).get_json() == 'primary'
+    assert app.test_client().get('/').get_json().startswith('replica')
+    clock.now += 5.0
+    assert client.get('/', headers=alice).get_json().startswith('replica')
+    assert not read_only.get()
+
+
+def test_read_your_writes_across_workers(databases):
+    # Each worker process tracks writers on its own; the cookie carries it over.
+    clock = Clock()
+    workers = [Flask(__name__), Flask(__name__)]
+    for worker in workers:
+        route_reads(worker, ReadYourWrites(5.0, clock))
+        worker.add_url_rule(
+            '/', 'source', lambda: jsonify(_source()), methods=['GET', 'POST']
+        )
+    response = workers[0].test_client().post('/')
+    assert response.get_json() == 'primary'
+    cookie = response.headers['Set-Cookie']
+    assert cookie.startswith(f'{WROTE_COOKIE}=1005.000;')
+    assert 'Max-Age=5' in cookie
+    other = workers[1].test_client()
+    other.set_cookie('localhost', WROTE_COOKIE, '1005.000')
+    assert other.get('/').get_json() == 'primary'
+    clock.now += 5.0
+    assert other.get('/').get_json().startswith('replica')
+    other.set_cookie('localhost', WROTE_COOKIE, 'garbage')
+    assert other.get('/').get_json().startswith('replica')
+
+
+class RecordingBackend(MemoryBackend):
+    def __init__(self):
+        super().__init__()
+        self.expiries = {}
+
+    def set(self, key, value, ex=None):
+        self.expiries[key] = ex
+        super().set(key, value, ex)
+
+
+def test_cached_reads_from_lagging_replicas(databases):
+    clock = Clock()
+    app = Flask(__name__)
+    route_reads(app, ReadYourWrites(5.0, clock))
+    backend = RecordingBackend()
+    cache = ResponseCache(backend, ttl=300, replica_ttl=5)
+
+    @app.route('/', methods=['GET'])
+    @cached(cache, lambda args: ['source'])
+    def source():
+        return jsonify(_source())
+
+    @app.route('/', methods=['POST'])
+    def write():
+        # The replicas have not caught up with this write yet.
+        with create_session() as session:
+            session.execute("UPDATE source SET name = 'written'")
+        cache.invalidate('source')
+        return jsonify('ok')
+
+    client = app.test_client()
+    alice = {'Authorization': 'Basic YWxpY2U6cGFzcw=='}
+    assert client.post('/', headers=alice).status_code == 200
+    # Another client's read is cached only for as long as replicas may lag.
+    assert app.test_client().get('/').get_json().startswith('replica')
+    assert list(backend.expiries.values()) == [5]
+    # The writer reads the primary rather than that entry.
+    assert client.get('/', headers=alice).get_json() == 'written'
+    assert client.get('/', headers=alice).get_json() == 'written'
+    assert len(backend.expiries) == 1
+    clock.now += 5.0
+    assert client.get('/', headers=alice).get_json().startswith('replica')
+
+
+def test_cached_reads_without_replicas():
+    backend = RecordingBackend()
+    cache = ResponseCache(backend, ttl=300, replica_ttl=5)
+    app = Flask(__name__)
+
+    @app.route('/')
+    @cached(cache, lambda args: ['source'])
+    def source():
+        return jsonify('primary')
+
+    token = read_only.set(True)
+    try:
+        assert app.test_client().get('/').get_json() == 'primary'
+    finally:
+        read_only.reset(token)
+    assert list(backend.expiries.values()) == [300]
+
+
+def test_rebuilds_read_the_primary(tmp_path):
+    # The replica has not caught up with a new, rated movie yet.
+    urls = [f'sqlite:///{tmp_path}/{name}.db' for name in ('primary', 'replica')]
+    for url, rows in zip(urls, ([(1, 'fresh', 2020)], [])):
+        engine = create_engine(url)
+        Base.metadata.create_all(bind=engine)
+        engine.execute("INSERT INTO users VALUES (1, 'user', 'hash')")
+        for row in rows:
+            engine.execute('INSERT INTO movies (id, name, year) VALUES (?, ?, ?)', row)
+            engine.execute('INSERT INTO moviestats VALUES (?, 9, 1, 0, 9.0)', row[0])
+        engine.dispose()
+    previous = database.engine, database.replicas
+    try:
+        app = create_app(
+            {
+                'DATABASE_URL': urls[0],
+                'DATABASE_REPLICA_URLS': urls[1:],
+                'CATALOG': True,
+            }
+        )
+        token, _ = app.extensions['movies'].token_signer.issue(1, 'user')
+        client = app.test_client()
+        client.environ_base['HTTP_AUTHORIZATION'] = f'Bearer {token}'
+        movies = {'Movies': [{'id': 1, 'name': 'fresh', 'year': 2020}]}
+        assert client.get('/movies').get_json() == movies
+        assert client.get('/movies?top=1').get_json() == movies
+        assert client.get('/movies/1').get_json() == {'movie': 'fresh', 'year': 2020}
+    finally:
+        database.dispose_engine()
+        database.engine, database.replicas = previous
+        database.Session.configure(bind=database.engine)
@@ -0,0 +1,120 @@
+from http import HTTPStatus
+
+import pytest
+from flask import Flask, jsonify
+from movies.response_cache import (
+    MemoryBackend,
+    RedisBackend,
+    ResponseCache,
+    cached,
+    make_backend,
+)
+
+
+class FakeRedis:
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value, ex=None):
+        self.data[key] = value
+
+    def incr(self, key):
+        self.data[key] = str(int(self.data.get(key, 0)) + 1).encode('ascii')
+        return int(self.data[key])
+
+
+@pytest.fixture(params=['memory', 'redis'])
+def cache(request):
+    if request.param == 'memory':
+        return ResponseCache(MemoryBackend(maxsize=2))
+    return ResponseCache(RedisBackend(FakeRedis()))
+
+
+@pytest.fixture()
+def client(cache):
+    app = Flask(__name__)
+    calls = []
+
+    @app.route('/items/<int:id>')
+    @cached(cache, lambda args, id: [f'item:{id}'])
+    def get_item(id):
+        calls.append(id)
+        if id == 0:
+            return jsonify({}), HTTPStatus.BAD_REQUEST
+        return jsonify({'id': id, 'calls': len(calls)})
+
+    client = app.test_client()
+    client.calls = calls
+    return client
+
+
+def test_cached_response(client, cache):
+    first = client.get('/items/1?b=2&a=1')
+    second = client.get('/items/1?a=1&b=2')
+    assert first.data == second.data
+    assert second.headers['ETag'] == first.headers['ETag']
+    assert second.headers['Last-Modified']
+    assert client.calls == [1]
+    assert cache.stats() == {'hits': 1, 'misses': 1}
+
+
+def test_not_modified(client):
+    etag = client.get('/items/1').headers['ETag']
+    response = client.get('/items/1', headers={'If-None-Match': etag})
+    assert response.status_code == HTTPStatus.NOT_MODIFIED
+    assert response.data == b''
+
+
+def test_invalidate(client, cache):
+    client.get('/items/1')
+    client.get('/items/2')
+    cache.invalidate('item:1')
+    client.get('/items/1')
+    client.get('/items/2')
+    assert client.calls == [1, 2, 1]
+
+
+def test_errors_and_streams_are_not_cached(client):
+    assert client.get('/items/0').status_code == HTTPStatus.BAD_REQUEST
+    assert client.get('/items/0').status_code == HTTPStatus.BAD_REQUEST
+    client.get('/items/1?stream=1')
+    client.get('/items/1?stream=1')
+    assert client.calls == [0, 0, 1, 1]
+
+
+def test_memory_backend_eviction_and_expiry():
+    backend = MemoryBackend(maxsize=2)
+    backend.incr('tag:x')
+    for key in ('a', 'b', 'c'):
+        backend.set(key, key.encode('ascii'))
+    assert backend.get('a') is None
+    assert backend.get('c') == b'c'
+    assert backend.get('tag:x') == b'1'
+    backend.set('d', b'd', ex=-1)
+    assert backend.get('d') is None
+
+
+def test_make_backend():
+    assert make_backend({}) is None
+    assert isinstance(make_backend({'RESPONSE_CACHE': 'memory'}), MemoryBackend)
+    with pytest.raises(ValueError):
+        make_backend({'RESPONSE_CACHE': 'disk'})
+
+
+def test_redis_backend_from_url():
+    redis = pytest.importorskip('redis')
+    backend = make_backend(
+        {'RESPONSE_CACHE': 'redis', 'RESPONSE_CACHE_URL': 'redis://localhost/0'}
+    )
+    assert isinstance(backend.client, redis.Redis)
+
+
+def test_disabled_cache(client, cache):
+    cache.backend = None
+    client.get('/items/1')
+    client.get('/items/1')
+    cache.invalidate('item:1')
+    assert client.calls == [1, 1]
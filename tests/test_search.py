@@ -0,0 +1,80 @@
+import pytest
+from movies.database import Base
+from movies.models import Movie, MovieTrigram
+from movies.search import (
+    ensure_search_index,
+    index_movie,
+    rebuild_search_index,
+    search_movies,
+    trigrams,
+)
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+NAMES = ['The Matrix', 'Matrix Reloaded', 'Mat', 'the thing', '50% off', 'Amatrix']
+
+
+@pytest.fixture()
+def session():
+    engine = create_engine('sqlite://')
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+    for name in NAMES:
+        movie = Movie(name, 2000)
+        session.add(movie)
+        session.flush()
+        index_movie(session, movie)
+    session.commit()
+    yield session
+    session.close()
+
+
+def names(query):
+    return [movie.name for movie in query.order_by(Movie.id)]
+
+
+def test_trigrams():
+    assert trigrams('Mat') == {'mat'}
+    assert trigrams('ab') == set()
+    assert trigrams('Matrix') == {'mat', 'atr', 'tri', 'rix'}
+    assert trigrams('ma%rix') == {'rix'}
+
+
+@pytest.mark.parametrize(
+    'substring', ['matrix', 'Mat', 'the', 'ma', 'x', 'rix re', '0%', 'm_t', 'zzz']
+)
+def test_substring_matches_scan(session, substring):
+    expected = names(session.query(Movie).filter(Movie.name.contains(substring)))
+    assert names(search_movies(session.query(Movie), substring)) == expected
+
+
+def test_prefix(session):
+    query = search_movies(session.query(Movie), 'mat', 'prefix')
+    assert names(query) == ['Matrix Reloaded', 'Mat']
+
+
+def test_ranked(session):
+    query = search_movies(session.query(Movie), 'mat', 'ranked')
+    assert [movie.name for movie in query] == [
+        'Mat',
+        'Matrix Reloaded',
+        'Amatrix',
+        'The Matrix',
+    ]
+
+
+def test_unknown_match(session):
+    with pytest.raises(ValueError):
+        search_movies(session.query(Movie), 'mat', 'fuzzy')
+
+
+def test_rebuild_search_index(session):
+    session.query(MovieTrigram).delete()
+    assert names(search_movies(session.query(Movie), 'matrix')) == []
+    ensure_search_index(session)
+    assert names(search_movies(session.query(Movie), 'matrix')) == [
+        'The Matrix',
+        'Matrix Reloaded',
+        'Amatrix',
+    ]
+    assert rebuild_search_index(session) == len(NAMES)
@@ -0,0 +1,67 @@
+import datetime
+
+import pytest
+from flask import Flask, jsonify
+from movies.serialization import JsonWriter, compatible
+
+PAYLOADS = [
+    {'Movies': [{'id': 1, 'name': 'film', 'year': 2020}], 'total': 1},
+    {'Movie': 'Amélie', 'Ratings and reviews': [{'Rating': 7, 'Review': None}]},
+    {'Movie': 'film', 'Average rating': 6.333333333333333, 'b': [True, 1e16, 0.5]},
+    {'when': datetime.date(2020, 1, 2), 'tab': 'a\tb"c', 'emoji': '\U0001f3ac'},
+    [],
+]
+
+
+@pytest.fixture(scope='module')
+def app():
+    return Flask(__name__)
+
+
+def _jsonify(app, payload):
+    with app.app_context():
+        return jsonify(payload).get_data()
+
+
+@pytest.fixture(params=['json', 'orjson'])
+def writer(request):
+    if request.param == 'orjson':
+        pytest.importorskip('orjson')
+    return JsonWriter(request.param, 16)
+
+
+@pytest.mark.parametrize('payload', PAYLOADS)
+def test_same_bytes_as_jsonify(app, writer, payload):
+    assert writer.dumps(payload) + b'\n' == _jsonify(app, payload)
+
+
+def test_document_from_fragments(app, writer):
+    movies = [
+        {'id': 1, 'name': 'film', 'year': 2020},
+        {'id': 2, 'name': 'Ça', 'year': 1},
+    ]
+    fragment = writer.fragment_encoder('id', 'name', 'year')
+    fragments = [fragment(*movie.values()) for movie in movies]
+    assert writer.fragment_encoder('id', 'name', 'year')(1, 'film', 2020) == (
+        fragments[0]
+    )
+    for fields in ({}, {'total': 2}, {'next_cursor': 'abc', 'A': None}):
+        expected = _jsonify(app, {**fields, 'Movies': movies})
+        assert writer.document(fields, 'Movies', fragments) + b'\n' == expected
+    assert writer.stats() == {'fragments': 2, 'hits': 1, 'misses': 2}
+
+
+def test_providers():
+    assert JsonWriter('json').provider == 'json'
+    with pytest.raises(ValueError):
+        JsonWriter('ujson')
+
+
+def test_compatible(app):
+    assert compatible(app.config)
+    assert not compatible(app.config, debug=True)
+    app.config['JSON_SORT_KEYS'] = False
+    try:
+        assert not compatible(app.config)
+    finally:
+        app.config['JSON_SORT_KEYS'] = True
@@ -0,0 +1,143 @@
+import json
+
+import pytest
+from movies.database import Base
+from movies.models import Movie, MovieRating, User
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+np = pytest.importorskip('numpy')
+pytest.importorskip('scipy')
+similarity = pytest.importorskip('movies.similarity')
+
+METHODS = similarity.SIMILARITY_METHODS
+
+
+def random_ratings(count=3000, users=200, movies=60, seed=0):
+    rng = np.random.default_rng(seed)
+    pairs = np.unique(
+        np.stack([rng.integers(1, users, count), rng.integers(1, movies, count)], 1),
+        axis=0,
+    )
+    return np.column_stack(
+        [np.arange(1, len(pairs) + 1), pairs, rng.integers(0, 11, len(pairs))]
+    )
+
+
+def brute_force(ratings, method):
+    # Dense similarities straight from the definition.
+    movie_ids = np.unique(ratings[:, 2])
+    user_ids = np.unique(ratings[:, 1])
+    dense = np.zeros((len(user_ids), len(movie_ids)))
+    rated = np.zeros(dense.shape, bool)
+    for _, user, movie, rating in ratings:
+        u, m = np.searchsorted(user_ids, user), np.searchsorted(movie_ids, movie)
+        dense[u, m], rated[u, m] = rating, True
+    if method == 'adjusted_cosine':
+        means = dense.sum(axis=1) / rated.sum(axis=1)
+        dense = np.where(rated, dense - means[:, None], 0.0)
+    norms = np.linalg.norm(dense, axis=0)
+    dense = dense / np.where(norms > 0, norms, 1.0)
+    return movie_ids, dense.T @ dense
+
+
+@pytest.mark.parametrize('method', METHODS)
+def test_matches_brute_force(method):
+    ratings = random_ratings()
+    movie_ids, scores = brute_force(ratings, method)
+    index = similarity.build_index(ratings, 5, method, chunk_size=7)
+    assert index.movie_ids.tolist() == movie_ids.tolist()
+    for row, movie_id in enumerate(movie_ids):
+        candidates = [
+            (scores[row, column], movie_ids[column])
+            for column in range(len(movie_ids))
+            if column != row and scores[row, column] > 1e-9
+        ]
+        expected = sorted(candidates, key=lambda item: (-item[0], item[1]))[:5]
+        found = index.neighbours[row][index.neighbours[row] != -1]
+        assert len(found) == len(expected)
+        assert index.scores[row][: len(found)] == pytest.approx(
+            [score for score, _ in expected], abs=1e-5
+        )
+
+
+@pytest.mark.parametrize('method', METHODS)
+def test_refresh_matches_build(method, monkeypatch):
+    ratings = random_ratings()
+    # Two new users, so only a few movies are affected.
+    last = len(ratings)
+    new = np.array(
+        [[last + 1, 500, 3, 9], [last + 2, 500, 7, 2], [last + 3, 501, 99, 8]]
+    )
+    both = np.concatenate([ratings, new])
+    index = similarity.build_index(ratings, 100, method)
+    expected = similarity.build_index(both, 100, method)
+    monkeypatch.setattr(similarity, 'build_index', None)
+    refreshed = similarity.refresh_index(index, both, last, method)
+    assert refreshed.movie_ids.tolist() == expected.movie_ids.tolist()
+    assert refreshed.neighbours.tolist() == expected.neighbours.tolist()
+    assert refreshed.scores == pytest.approx(expected.scores, abs=1e-5)
+    assert similarity.refresh_index(refreshed, both, last + 3, method) is refreshed
+
+
+def test_process_pool():
+    ratings = random_ratings(count=500, movies=20)
+    expected = similarity.build_index(ratings, 3)
+    index = similarity.build_index(ratings, 3, workers=2, chunk_size=4)
+    assert index.neighbours.tolist() == expected.neighbours.tolist()
+    assert index.scores == pytest.approx(expected.scores)
+
+
+@pytest.fixture()
+def session():
+    engine = create_engine('sqlite://')
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+    for i in range(1, 4):
+        user = User(f'user_{i}')
+        user.password_hash = 'x'
+        session.add(user)
+        session.add(Movie(f'film_{i}', 2000))
+    session.flush()
+    for user_id, movie_id, rating in [(1, 1, 9), (1, 2, 8), (2, 1, 2), (2, 2, 3)]:
+        session.add(MovieRating(user_id, movie_id, rating))
+    session.add(MovieRating(3, 3, None, 'review only'))
+    session.commit()
+    yield session
+    session.close()
+
+
+def test_build_and_load(session, tmp_path):
+    directory = str(tmp_path)
+    meta = similarity.build_similarity(session, directory, k=2, method='cosine')
+    assert json.loads((tmp_path / 'meta.json').read_text()) == meta
+    assert (meta['movies'], meta['ratings'], meta['refreshed']) == (2, 4, False)
+    similar = similarity.load_similar_movies(directory)
+    assert [movie_id for movie_id, _ in similar.similar(1, 5)] == [2]
+    assert similar.similar(3, 5) == []
+    assert similarity.load_similar_movies(directory) is similar
+
+    session.add(MovieRating(3, 1, 5))
+    session.add(MovieRating(2, 3, 5))
+    session.commit()
+    first = meta
+    meta = similarity.build_similarity(session, directory, k=2, method='cosine')
+    assert meta['refreshed']
+    assert meta['last_rating_id'] == 7
+    assert meta['previous_generation'] == first['generation']
+    # Loaded before the refresh, so it keeps reading the first generation.
+    assert similar.similar(3, 5) == []
+    similar = similarity.load_similar_movies(directory)
+    assert [movie_id for movie_id, _ in similar.similar(3, 5)] == [2, 1]
+    meta = similarity.build_similarity(session, directory, k=3, method='cosine')
+    assert not meta['refreshed']
+
+
+def test_empty(session, tmp_path):
+    session.query(MovieRating).delete()
+    session.commit()
+    meta = similarity.build_similarity(session, str(tmp_path))
+    assert meta['movies'] == 0
+    assert similarity.load_similar_movies(str(tmp_path)).similar(1, 5) == []
+    with pytest.raises(ValueError):
+        similarity.rating_matrix(random_ratings(), 'pearson')
@@ -0,0 +1,28 @@
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+PROBE = '''
+import json, sys
+import movies.api
+from movies import database
+print(json.dumps({
+    'modules': sorted(m for m in ('alembic', 'numpy', 'passlib.context', 'scipy') if m in sys.modules),
+    'engine': database.engine is not None,
+}))
+'''
+
+
+def test_import_is_lazy(tmp_path):
+    output = subprocess.run(
+        [sys.executable, '-c', PROBE],
+        cwd=tmp_path,
+        env={**os.environ, 'PYTHONPATH': str(Path(__file__).parents[1])},
+        check=True,
+        stdout=subprocess.PIPE,
+        universal_newlines=True,
+    ).stdout
+    assert json.loads(output) == {'modules': [], 'engine': False}
+    assert list(tmp_path.iterdir()) == []
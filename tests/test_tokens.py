@@ -0,0 +1,73 @@
+from movies.tokens import DenyList, TokenSigner
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_issue_and_verify():
+    clock = Clock()
+    signer = TokenSigner({'k1': 'secret'}, ttl=60, clock=clock)
+    token, expires = signer.issue(7, 'user')
+    assert expires == 1060
+    claims = signer.verify(token)
+    assert (claims.user_id, claims.username, claims.expires) == (7, 'user', 1060)
+    clock.now = 1060
+    assert signer.verify(token) is None
+
+
+def test_rejects_tampered_tokens():
+    signer = TokenSigner({'k1': 'secret'})
+    token, _ = signer.issue(7, 'user')
+    payload, signature = token.split('.')
+    other, _ = TokenSigner({'k1': 'other'}).issue(8, 'admin')
+    assert signer.verify(other.split('.')[0] + '.' + signature) is None
+    assert signer.verify(other) is None
+    assert signer.verify(payload + '.' + signature[::-1]) is None
+    assert signer.verify(payload + '.\u00e9\u00e9') is None
+    assert signer.verify(payload) is None
+    assert signer.verify('') is None
+    assert signer.verify('!!!.abc') is None
+    assert signer.verify('W10.abc') is None
+
+
+def test_key_rotation():
+    signer = TokenSigner({'k1': 'first'})
+    old, _ = signer.issue(1, 'user')
+    signer.rotate('k2', b'second')
+    assert signer.key_ids == ['k2', 'k1']
+    new, _ = signer.issue(1, 'user')
+    assert signer.verify(old) is not None
+    assert signer.verify(new) is not None
+    signer.rotate('k3', b'third')
+    assert signer.verify(old) is None
+    assert signer.verify(new) is not None
+    signer.configure({'k3': 'third', 'k2': 'second'}, 900)
+    assert signer.verify(new) is not None
+
+
+def test_revoke():
+    clock = Clock()
+    signer = TokenSigner(clock=clock)
+    token, _ = signer.issue(1, 'user')
+    other, _ = signer.issue(1, 'user')
+    signer.revoke(signer.verify(token))
+    assert signer.verify(token) is None
+    assert signer.verify(other) is not None
+
+
+def test_deny_list_prunes_expired():
+    clock = Clock()
+    deny_list = DenyList(clock)
+    deny_list.add('a', 1010)
+    deny_list.add('b', 1020)
+    deny_list.add('old', 900)
+    assert len(deny_list) == 2
+    clock.now = 1015
+    deny_list.add('c', 1030)
+    assert 'a' not in deny_list
+    assert len(deny_list) == 2
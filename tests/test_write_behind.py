@@ -0,0 +1,124 @@
+import threading
+
+import pytest
+from movies.write_behind import QueueFull, RatingQueue
+
+
+class Writer:
+    def __init__(self, fail=0, rejected=0):
+        self.batches = []
+        self.fail = fail
+        self.rejected = rejected
+        self.release = threading.Event()
+        self.release.set()
+
+    def __call__(self, batch):
+        self.release.wait()
+        if self.fail:
+            self.fail -= 1
+            raise RuntimeError('database is locked')
+        self.batches.append(batch)
+        return self.rejected
+
+
+def test_coalesces_and_drains():
+    writer = Writer()
+    writer.release.clear()
+    queue = RatingQueue(writer, batch_size=2, interval=60)
+    queue.submit(1, 10, {'rating': 5})
+    queue.submit(1, 10, {'review': 'good'})
+    queue.submit(2, 10, {'rating': 3})
+    queue.submit(1, 11, {'rating': 7})
+    writer.release.set()
+    queue.drain()
+    assert writer.batches == [
+        [
+            {'user_id': 1, 'movie_id': 10, 'rating': 5, 'review': 'good'},
+            {'user_id': 2, 'movie_id': 10, 'rating': 3},
+        ],
+        [{'user_id': 1, 'movie_id': 11, 'rating': 7}],
+    ]
+    stats = queue.stats()
+    assert stats['queue_depth'] == 0
+    assert (stats['submitted'], stats['coalesced'], stats['flushed']) == (4, 1, 3)
+    assert stats['batches'] == 2
+
+
+def test_worker_flushes_in_background():
+    writer = Writer()
+    queue = RatingQueue(writer, interval=0.01)
+    queue.submit(1, 10, {'rating': 5})
+    for _ in range(500):
+        if writer.batches:
+            break
+        threading.Event().wait(0.01)
+    assert writer.batches == [[{'user_id': 1, 'movie_id': 10, 'rating': 5}]]
+    assert queue.stats()['last_flush_seconds'] >= 0
+    queue.drain()
+    queue.submit(1, 10, {'rating': 6})
+    queue.drain()
+    assert len(writer.batches) == 2
+
+
+def test_bounded():
+    writer = Writer()
+    writer.release.clear()
+    queue = RatingQueue(writer, max_size=1, interval=60)
+    queue.submit(1, 10, {'rating': 5})
+    queue.submit(1, 10, {'rating': 6})
+    with pytest.raises(QueueFull):
+        queue.submit(2, 10, {'rating': 5})
+    assert queue.stats()['rejected'] == 1
+    assert len(queue) == 1
+    writer.release.set()
+    queue.drain()
+
+
+def test_failed_batches_are_retried():
+    writer = Writer(fail=2)
+    queue = RatingQueue(writer, interval=60, retry_delay=0)
+    queue.submit(1, 10, {'rating': 5})
+    queue.submit(2, 10, {'rating': 6})
+    queue.drain()
+    assert writer.batches == [
+        [
+            {'user_id': 1, 'movie_id': 10, 'rating': 5},
+            {'user_id': 2, 'movie_id': 10, 'rating': 6},
+        ]
+    ]
+    stats = queue.stats()
+    assert (stats['failed'], stats['flushed'], stats['retried']) == (0, 2, 4)
+    assert stats['batches'] == 3
+
+
+def test_requeued_ratings_merge_with_newer_ones():
+    writer = Writer(fail=1)
+    queue = RatingQueue(writer, interval=60, retry_delay=0)
+    queue.submit(1, 10, {'rating': 5, 'review': 'good'})
+    queue._flush_next()
+    queue.submit(1, 10, {'rating': 7})
+    queue.submit(1, 11, {'rating': 1})
+    queue.drain()
+    assert writer.batches == [
+        [
+            {'user_id': 1, 'movie_id': 10, 'rating': 7, 'review': 'good'},
+            {'user_id': 1, 'movie_id': 11, 'rating': 1},
+        ]
+    ]
+
+
+def test_failed_batches_are_dropped_after_retries():
+    queue = RatingQueue(Writer(fail=10), interval=60, retries=2, retry_delay=0)
+    queue.submit(1, 10, {'rating': 5})
+    queue.drain()
+    assert len(queue) == 0
+    stats = queue.stats()
+    assert (stats['failed'], stats['flushed'], stats['retried']) == (1, 0, 2)
+
+
+def test_rejected_ratings_are_failed():
+    queue = RatingQueue(Writer(rejected=1), interval=60)
+    queue.submit(1, 10, {'rating': 5})
+    queue.submit(1, 11, {'rating': 5})
+    queue.drain()
+    assert (queue.stats()['failed'], queue.stats()['flushed']) == (1, 1)